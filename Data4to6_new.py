@@ -1,185 +1,422 @@
 import datetime as dt
 import numpy as np
 import warnings
+import collections
 import random
 import matplotlib.pyplot as plt
 from pyorbital.geoloc import ScanGeometry, compute_pixels, get_lonlatalt
 import pyorbital.orbital as orb
 import pyorbital.astronomy as astro
 from find_tle import *
+from tap_words import *
+from tap_records import *
+from lagrange import *
+from sat_geometry import *
+from geolocation import *
+from instrument import *
 import pdb
 
 # make change to show git diff
 # TODO: check data type of every object attribute: are they what you expect?
 
+def make_parity_table():
+    """Output:
+        - table; a boolean array with one entry for each of the 256 possible byte values
+    Works out the Nimbus 4 parity check once for every possible byte, so that whole scan blocks can be checked by
+    indexing into the table (see Data.parity). The parity bit (0b1000000) should be on when an even number of the
+    six least significant bits are on, and off otherwise."""
+    table = np.zeros(256, dtype=bool)
+    for byte in range(256):
+        bits = bin(byte & 0b111111).count('1')
+        table[byte] = (bits % 2 == 0) == (byte & 0b1000000 != 0)
+    return table
+
+PARITY_TABLE = make_parity_table()
+
+def channel_of(dref):
+    """Returns the name of the THIR channel ('window', 'vapour' or 'unknown') given by the dref word of the orbit
+    doc."""
+    retval = 'unknown'
+    if dref == 115:
+        retval = 'window'
+    elif dref == 67:
+        retval = 'vapour'
+    return retval
+
+def geographic_lats(lats):
+    """Returns the latitudes lats, stored plus 90 as in Swath_Data, in degrees north (-999 is kept)."""
+    lats = np.array(lats, dtype=np.float64)
+    lats[lats!=-999] -= 90
+    return lats
+
+def geographic_lons(lons):
+    """Returns the longitudes lons, stored positive to the west from 0 to 360 as in Swath_Data, in degrees east
+    from -180 to 180 (-999 is kept)."""
+    lons = np.array(lons, dtype=np.float64)
+    lons[lons!=-999] = 360 - lons[lons!=-999]
+    lons[(lons!=-999)&(lons>180)] -= 360
+    return lons
+
+def in_bbox(lats, lons, bbox):
+    """Inputs:
+        - lats, lons; arrays of geographic coordinates, in degrees north and east (-999 where missing)
+        - bbox; a (min_lat, max_lat, min_lon, max_lon) box in degrees north and east. A box with min_lon greater
+          than max_lon runs east from min_lon across the dateline to max_lon
+    Outputs:
+        - inside; a boolean array - True where the point is in the box"""
+    min_lat, max_lat, min_lon, max_lon = bbox
+    inside = (lats != -999) & (lons != -999) & (lats >= min_lat) & (lats <= max_lat)
+    if min_lon <= max_lon:
+        return inside & (lons >= min_lon) & (lons <= max_lon)
+    return inside & ((lons >= min_lon) | (lons <= max_lon))
+
 class Data:
-    def __init__(self, the_file):
+    def __init__(self, the_file, use_mmap=True, use_index=False, record_numbers=None, lazy=False, cache_size=64,
+                 time_range=None, bbox=None, full_coords=True, stats=None):
         """Inputs:
             - the_file; a string representing a path to a .TAP file
-        Opens the file to read in binary mode. The file is read and stored in
+            - use_mmap; a boolean - True memory-maps the file, False reads it in one bulk call (default=True)
+            - use_index; a boolean - True reads the record positions from the sidecar index file (see
+              tap_records.load_index), building and saving the index first if it is missing or out of date
+              (default=False)
+            - record_numbers; the indices in records of the data records to decode (record 0 is the orbit doc).
+              None decodes all of them (default=None)
+            - lazy; a boolean - True decodes only the orbit doc straight away, and each data record when it is
+              first asked for (see Lazy_Data_Recs), False decodes every record now (default=False)
+            - cache_size; the largest number of decoded records kept by a lazy Data object (default=64)
+            - time_range; a (t0, t1) window in seconds since 1970/01/01 00:00:00 - only swaths in the window are
+              kept (default=None, i.e. every swath)
+            - bbox; a (min_lat, max_lat, min_lon, max_lon) box, in degrees north and east - only swaths whose
+              subsatellite point is in the box are kept (default=None, i.e. every swath). A box with min_lon
+              greater than max_lon crosses the dateline (see in_bbox)
+            - full_coords; a boolean - True interpolates the full coordinates of each swath from its anchor points,
+              False leaves them out (-999) when they are not wanted (default=True, see Fields.products)
+            - stats; the instrument.Stats object to time the stages and count the bad data in (default=None, i.e. a
+              new one, kept as stats)
+        Loads the whole file at once and scans its record framing (see tap_records.scan_records) to find
+        where each record is. The file is read and stored in
             - od; the orbit document record (1x per file) containing metadata
               relevant to the whole file
-            - dr(s); the data records (arbitrary number per file, usually O(100))
-              containing metadata relevant to the upcoming scan block. Each dr contains
-              six swath data records (although any number of these may be filled).
-        The reader stops when one of several end conditions (in read_header) are met."""
-        pointer = open(the_file, 'rb')
-        header, end, skip = self.get_header(pointer) # headers are not written on tape, so no endian-ness
-        bang = self.zip_bytes_and_goodness(pointer, header)
+            - columns; a Swath_Columns object holding every data record (arbitrary number per file, usually
+              O(100)) and swath as arrays. Each data record contains metadata relevant to the upcoming scan block
+              and six swath data records (although any number of these may be filled).
+            - dr(s); a sequence of views of the data records in columns, with the attributes of Data_Rec and
+              Swath_Data objects
+        Each record is decoded into a Data_Rec object, copied into the columns and then dropped. Records with the
+        skip flag set in their header are left out of dr. With an index, the framing is not scanned again, and
+        with a time_range the records outside it are dropped by their indexed times before any of their swaths
+        are looked at (see find_window). The reader stops when one of several end conditions (in
+        tap_records.read_header) are met.
+        In lazy mode dr is a Lazy_Data_Recs sequence of Data_Rec objects, and columns is only made (by decoding
+        every record) if it is used. The columns of a lazy Data object hold no scanlines, so that only the
+        records in use are held in full (see Fields.set_big_arrays).
+        With a time_range or bbox, the swaths are chosen before any record is decoded (see select_swaths). Records
+        without a chosen swath are left out altogether, and the swaths of the other records which were not chosen
+        are not interpolated or copied into the columns, so Fields never sees them."""
         self.filename = the_file
-        self.od = self.get_orbit_doc(bang, the_file)
-        self.dr = []
-        footer = self.get_footer(pointer, header)
-        i = 0
-        while not end:
-            header, end, skip = self.get_header(pointer)
-            i += 1
-            if not end:
-                bang = self.zip_bytes_and_goodness(pointer, header)
-                footer = self.get_footer(pointer, header)
-                if skip:
-                    continue
-                self.dr.append(self.get_data_rec(bang))
-            print i
-    def get_header(self, pointer, prev=0):
-        """Input:
-            - pointer; pointer to the open file
-            - prev; indicates the number of zeros encountered already (2x is an EOF mark)
-        Output:
-            - header; an integer representing the length of the next block to be read
-            - EOF; a boolean - True stops the reader, False carries on
-            - skip; a boolean - True skips the upcoming data record (including the swath data blocks), False doesn't
-        Reads 32 bits from the file as a header. Checks the signbit of the header - if this is on then the upcoming
-        block is bad and should be skipped. If the header is zero valued (sometimes happens at the start of the file)
-        then another should be read. If two headers are consecutively zero valued then the EOF has been reached. EOF
-        can also be reached within a scan block. If this happens, header will read no bytes and return []. This is
-        another EOF condition."""
-        EOF = False
-        skip = False
-        raw_header = np.fromfile(pointer, dtype=np.int32, count=1)
-        header = raw_header & ((2**31)-1)
-        if header != raw_header:
-            skip = True
-        if header == 0:
-            header, EOF, skip = self.get_header(pointer, prev=1)
-            if prev == 1:
-                EOF = True
-        elif len(header) == 0:
-            EOF = True
-        return header, EOF, skip
-    def zip_bytes_and_goodness(self, pointer, header):
+        self.full_coords = full_coords
+        if stats is None:
+            stats = Stats()
+        self.stats = stats
+        timer = stats.start('framing')
+        self.buffer = load_file(the_file, use_mmap)
+        self.records = None
+        if use_index:
+            self.records = load_index(the_file, stats)
+        index_is_new = self.records is None
+        if index_is_new:
+            mismatches = stats.counters['header_footer_mismatches']
+            self.records = scan_records(self.buffer, stats)
+            mismatches = stats.counters['header_footer_mismatches'] - mismatches
+        stats.stop(timer)
+        if len(self.records) == 0:
+            raise ValueError('No records found in ' + the_file)
+        stats.count('records_read', len(self.records) - 1)
+        stats.count('records_skipped', np.sum(self.records['skip'][1:]))
+        the_bytes, goodness = self.get_bytes_and_goodness(record_bytes(self.buffer, self.records, 0))
+        self.od = self.get_orbit_doc(the_bytes, goodness, the_file)
+        if use_index and index_is_new:
+            self.set_record_times()
+            save_index(the_file, self.records, mismatches)
+        if record_numbers is None:
+            record_numbers = range(1, len(self.records))
+        record_numbers = [i for i in record_numbers if not self.records['skip'][i]]
+        self.swath_keep = {}
+        self.counted = set() # the records whose bad data has been counted in stats (see decode_record)
+        if (time_range is not None) or (bbox is not None):
+            timer = stats.start('selection')
+            if use_index and (time_range is not None):
+                record_numbers = self.find_window(record_numbers, time_range)
+            record_numbers = self.select_swaths(record_numbers, time_range, bbox)
+            stats.stop(timer)
+        if lazy:
+            self.dr = Lazy_Data_Recs(self, record_numbers, cache_size)
+        else:
+            self.columns = self.decode_columns(record_numbers)
+            self.dr = Data_Rec_Views(self.columns)
+    def __getattr__(self, name):
+        """Makes the columns of a lazy Data object the first time they are used."""
+        if name == 'columns' and isinstance(self.__dict__.get('dr'), Lazy_Data_Recs):
+            self.columns = self.decode_columns(self.dr.record_numbers, scanlines=False)
+            return self.columns
+        raise AttributeError(name)
+    def decode_columns(self, record_numbers, scanlines=True):
+        """Inputs:
+            - record_numbers; the indices in records of the data records to decode
+            - scanlines; a boolean - False leaves the scanlines out of the columns, so that only the headers and
+              anchor points of each record are decoded and the full coordinates are not interpolated (default=True)
+        Outputs:
+            - columns; a Swath_Columns object holding the records
+        Each record is decoded into a Data_Rec object, copied into the columns and then dropped."""
+        timer = self.stats.start('decoding')
+        columns = Swath_Columns(len(record_numbers), self.od, scanlines)
+        for i in record_numbers:
+            columns.add_record(self.decode_record(i, self.full_coords and scanlines, scanlines))
+        self.stats.stop(timer)
+        return columns
+    def decode_record(self, i, full_coords=None, scanlines=True):
+        """Returns the Data_Rec object for record i of records, keeping only the swaths chosen by select_swaths.
+        Its full coordinates are interpolated if full_coords (default: the full_coords of this object) is True,
+        and the data of its swaths are only decoded if scanlines is True.
+        The bad bytes of the record and its swaths with a bad data population are counted in stats, the first time
+        the record is decoded only (a lazy Data object may decode a record again once it has left the cache)."""
+        if full_coords is None:
+            full_coords = self.full_coords
+        the_bytes, goodness = self.get_bytes_and_goodness(record_bytes(self.buffer, self.records, i))
+        data_rec = self.get_data_rec(the_bytes, goodness, self.swath_keep.get(i), full_coords, scanlines)
+        if i not in self.counted:
+            self.counted.add(i)
+            self.stats.count('bad_parity_bytes', len(goodness) - np.count_nonzero(goodness))
+            self.stats.count('bad_pop_swaths', len([sd for sd in data_rec.sds if sd.data_pop == 0]))
+        return data_rec
+    def find_window(self, record_numbers, time_range):
+        """Inputs:
+            - record_numbers; the indices in records of the data records to choose from
+            - time_range; a (t0, t1) window in seconds since 1970/01/01 00:00:00
+        Outputs:
+            - inside; the record_numbers which may hold a swath in the window
+        Uses the record times of the index (see set_record_times and tap_records.find_records), so that
+        select_swaths need not decode the swaths of records outside the window. Records whose time could not be
+        read are kept for select_swaths to decide on."""
+        found = set(find_records(self.records, time_range[0], time_range[1]))
+        return [i for i in record_numbers if (i in found) or (self.records['time'][i] == -999)]
+    def select_swaths(self, record_numbers, time_range=None, bbox=None):
+        """Inputs:
+            - record_numbers; the indices in records of the data records to choose from
+            - time_range; a (t0, t1) window in seconds since 1970/01/01 00:00:00, or None
+            - bbox; a (min_lat, max_lat, min_lon, max_lon) box in degrees north and east (see in_bbox), or None
+        Outputs:
+            - selected; the indices of the records holding at least one chosen swath
+        A swath is chosen if its time is in the window and its subsatellite point is in the box. Swaths without a
+        time (or subsatellite point) are never chosen by a window (or box). Only the time and subsatellite words are
+        decoded (see get_swath_track), and the times are those of Fields.get_swath_times, before the Nimbus 5
+        correction. The subsatellite points are made geographic as in Fields.set_big_arrays before they are
+        compared with the box. The swaths chosen in each record are kept in swath_keep, for decode_record."""
+        selected = []
+        for i in record_numbers:
+            times, subsat_lats, subsat_lons = self.get_swath_track(i)
+            keep = np.ones(len(times), dtype=bool)
+            if time_range is not None:
+                keep &= (times != -999) & (times >= time_range[0]) & (times <= time_range[1])
+            if bbox is not None:
+                keep &= in_bbox(geographic_lats(subsat_lats), geographic_lons(subsat_lons), bbox)
+            if any(keep):
+                self.swath_keep[i] = keep
+                selected.append(i)
+        if len(selected) == 0:
+            raise ValueError('No swaths selected in ' + self.filename)
+        return selected
+    def set_record_times(self):
+        """Fills in the time field of records with the time of the first swath of each data record, in seconds
+        since 1970/01/01 00:00:00 (as in Fields.get_time_lims). The orbit doc and records whose time cannot be
+        read are given -999."""
+        for i in range(1, len(self.records)):
+            the_bytes, goodness = self.get_bytes_and_goodness(record_bytes(self.buffer, self.records, i))
+            self.records['time'][i] = self.get_record_time(the_bytes, goodness)
+    def get_record_time(self, the_bytes, goodness):
         """Inputs:
-            - pointer; a pointer to the open TAP file
-            - header; an integer representing the number of bytes to be read
+            - the_bytes; the array of bytes for a data record
+            - goodness; the boolean array of goodness, parallel to the_bytes
         Outputs:
-            - bang; Bytes ANd Goodness - a list of the bytes in the upcoming scan block
-              zipped together with a boolean representing whether or not each byte passed a check
-        A number of bytes is read in, and each byte is put through a parity_check. If the check passes,
-        and if the sign bit is off, then the byte is uncorrupted - corrupted otherwise. Returns the list
-        of bytes with a second dimension indicating whether or not each byte is OK."""
-        head_bytes = np.fromfile(pointer, np.int8, count=header) # reads the whole rest of the file in as bytes
-        parity_arr = self.parity(head_bytes) # a companion array for each byte: True if parity is good, else False
-        bang = zip(head_bytes, (head_bytes>0)&parity_arr) # zips bytes together with two checks of goodness
-        return bang
-    def get_footer(self, pointer, header):
+            - time; the time of the first swath in the record, in seconds since 1970/01/01 00:00:00
+        Decodes only the time words of the data record and the seconds of its first swath, rather than
+        the whole record. The swaths start after the 7 + locator_no words read in Data_Rec.make_words."""
+        marker = 6*(7+self.od.locator_no)
+        head = interleave_half_words(read_words_n4(the_bytes[:12], goodness[:12], 2))
+        seconds = split_half_words(read_words_n4(the_bytes[marker:marker+6], goodness[marker:marker+6], 1))[1][0]
+        return self.make_record_time(head, seconds)
+    def make_record_time(self, head, seconds):
         """Inputs:
-            - pointer; a pointer to the open TAP file
-            - header; an integer representing the number of bytes in a scan block
+            - head; the nday, hour, minute and second words of a data record
+            - seconds; the seconds word of its first swath
         Outputs:
-            - footer; essentially the same as a header, but referring to the previous scan block
-        Uses the get_header method to find the footer. Because headers describe the byte length
-        of the upcoming scan block, and footers do so for the previous scan block, each footer should
-        match the previous header. If this is not the case the user is warned."""
-        footer, end, skip = self.get_header(pointer)
-        if header != footer:
-            warnings.warn('header and footer do not match')
-        return footer
-    def parity(self, the_bytes): # could this be sped up?
+            - time; the time of the first swath in seconds since 1970/01/01 00:00:00 (-999 if a word is bad)"""
+        if (-999 in head) or (seconds == -999):
+            return -999
+        nday, hour, minute, second = head
+        return self.od.get_tbase(nday, hour, minute, second) + seconds/512. - second
+    def get_swath_times(self, i):
+        """Inputs:
+            - i; the index in records of a data record
+        Outputs:
+            - times; the time of each swath in the record, in seconds since 1970/01/01 00:00:00 (-999 for swaths
+              without a time)
+        The times are the same as those from Fields.get_swath_times (see get_swath_track)."""
+        return self.get_swath_track(i)[0]
+    def get_swath_track(self, i):
+        """Inputs:
+            - i; the index in records of a data record
+        Outputs:
+            - times; the time of each swath in the record, in seconds since 1970/01/01 00:00:00
+            - subsat_lats, subsat_lons; the subsatellite point of each swath, as in Swath_Data
+        Decodes only the time words of the record and the first two words (time, data population and subsatellite
+        point) of each swath, rather than the whole record. Swaths with a bad word, or which Swath_Data would fill
+        because of their data population, are -999."""
+        the_bytes, goodness = self.get_bytes_and_goodness(record_bytes(self.buffer, self.records, i))
+        head, swath_words = self.get_head_words(the_bytes, goodness)
+        pops, seconds = split_half_words(swath_words[:, 0])
+        subsat_lons, subsat_lats = split_half_words(swath_words[:, 1])
+        times = self.od.get_tbase(*head) + seconds/512. - head[3]
+        subsat_lats = np.where(subsat_lats != -999, subsat_lats/64., -999)
+        subsat_lons = np.where(subsat_lons != -999, subsat_lons/64., -999)
+        filled = (pops <= 0) | (pops >= 600)
+        times[filled | (seconds == -999)] = -999
+        subsat_lats[filled] = -999
+        subsat_lons[filled] = -999
+        return times, subsat_lats, subsat_lons
+    def get_head_words(self, the_bytes, goodness):
+        """Inputs:
+            - the_bytes; the array of bytes for a data record
+            - goodness; the boolean array of goodness, parallel to the_bytes
+        Outputs:
+            - head; the nday, hour, minute and second words of the record
+            - swath_words; an (n_swaths, 2) array of the first two words of each swath in the record
+        The swaths start after the 7 + locator_no words read in Data_Rec.make_words, and each is swath_block
+        words long (see Data_Rec.set_swaths)."""
+        marker = 6*(7+self.od.locator_no)
+        size = 6*self.od.swath_block
+        head = interleave_half_words(read_words_n4(the_bytes[:12], goodness[:12], 2))
+        swath_words = [read_words_n4(the_bytes[j:j+12], goodness[j:j+12], 2)
+                       for j in range(marker, marker + self.od.swaths_per_rec*size, size)]
+        return head, np.array(swath_words, dtype=np.int64).reshape(-1, 2)
+    def get_bytes_and_goodness(self, head_bytes):
+        """Inputs:
+            - head_bytes; the array of bytes in the upcoming scan block (a view into the file)
+        Outputs:
+            - head_bytes; the same array of bytes
+            - goodness; a boolean array parallel to head_bytes, True where the byte passed its checks
+        The whole block is put through the parity check at once. If the check passes, and if the sign bit is off,
+        then the byte is uncorrupted - corrupted otherwise. The bytes and their goodness are returned as two
+        parallel arrays, so that downstream readers can slice them together."""
+        goodness = (head_bytes>0) & self.parity(head_bytes) # two checks of goodness for every byte
+        return head_bytes, goodness
+    def parity(self, the_bytes):
         """Input:
             - the_bytes; array of 8-bit numbers from the file
         Output:
             - parity_array; array of booleans, corresponding to the_bytes,
               True if the byte passes a parity check, False otherwise
         For each byte, checks to see how many of the least significant six bits are on.
-        If the number is even, then the parity bit should be off.
-        If the number is odd, then the parity bit should be on.
-        If the parity bit is incorrectly assigned, the boolean will be False."""
-        parity_array = []
-        for byte in the_bytes:
-            bits = 0
-            good = True
-            for bit in range(6):
-                if byte & (2**bit) != 0:
-                    bits += 1
-            if bits % 2 == 0:
-                if byte & 0b1000000 == 0:
-                    good = False
-            else:
-                if byte & 0b1000000 != 0:
-                    good = False
-            parity_array.append(good)
-        return parity_array
-    def get_orbit_doc(self, bang, the_file):
+        If the number is even, then the parity bit should be on.
+        If the number is odd, then the parity bit should be off.
+        If the parity bit is incorrectly assigned, the boolean will be False. The answer for every possible byte
+        is held in PARITY_TABLE, so the whole array is checked with a single lookup."""
+        return PARITY_TABLE[np.asarray(the_bytes, dtype=np.int8).view(np.uint8)]
+    def get_orbit_doc(self, the_bytes, goodness, the_file):
         """Inputs:
-            - bang; the 2D array of bytes (index 0) and goodness (index 1)
+            - the_bytes; the array of bytes for the orbit documentation record
+            - goodness; the boolean array of goodness, parallel to the_bytes
             - the_file; a string representing the complete path to the TAP file
         Outputs:
             - Orbit_Doc; an orbit documentation record object for Nimbus 4
         Passes the bytes, their goodness and the filename to the od constructor.
         This method was added because it needs to be overridden in Data2."""
-        return Orbit_Doc(bang, the_file)
-    def get_data_rec(self, bang):
+        return Orbit_Doc(the_bytes, goodness, the_file)
+    def get_data_rec(self, the_bytes, goodness, keep=None, full_coords=True, scanlines=True):
         """Inputs:
-            - bang; the 2D array of bytes (index 0) and goodness (index 1)
+            - the_bytes; the array of bytes for the data record
+            - goodness; the boolean array of goodness, parallel to the_bytes
+            - keep; which swaths of the record to keep (default=None, i.e. all of them)
+            - full_coords; a boolean - False does not interpolate the full coordinates (default=True)
+            - scanlines; a boolean - False does not decode the data of the swaths (default=True)
         Outputs:
             - Data_Rec; a data record object for Nimbus 4
         Passes the bytes and their goodness to the dr constructor.
         This function was added because it needs to be overridden in Data2."""
-        return Data_Rec(bang, self.od)
+        return Data_Rec(the_bytes, goodness, self.od, keep, full_coords, scanlines)
 
 class Data2(Data):
-    def __init__(self, the_file):
+    def __init__(self, the_file, use_mmap=True, use_index=False, record_numbers=None, lazy=False, cache_size=64,
+                 time_range=None, bbox=None, full_coords=True, stats=None):
         """Inherits from the Data object. Required for Nimbus 5 and 6."""
-        Data.__init__(self, the_file)
-    def zip_bytes_and_goodness(self, pointer, header):
+        Data.__init__(self, the_file, use_mmap, use_index, record_numbers, lazy, cache_size, time_range, bbox,
+                      full_coords, stats)
+    def get_bytes_and_goodness(self, head_bytes):
         """Overrides the method in Data.
         Inputs:
-            - pointer; a pointer to the open TAP file
-            - header; an integer representing the number of bytes to be read
+            - head_bytes; the array of bytes in the upcoming scan block (a view into the file)
         Outputs:
-            - bang; a list of the bytes in the upcoming scan block
-        In the Nimbus 5/6 TAP file, parity and check bits do not exist for each byte. Hence this method
-        simply returns the bytes in the upcoming scan block."""
-        head_bytes = np.fromfile(pointer, np.int8, count=header) # reads the whole rest of the file in as bytes
-        return head_bytes
-    def get_orbit_doc(self, bang, the_file):
+            - head_bytes; the same array of bytes
+            - goodness; a boolean array parallel to head_bytes, all True
+        In the Nimbus 5/6 TAP file, parity and check bits do not exist for each byte. Hence every byte in
+        the upcoming scan block is treated as good."""
+        return head_bytes, np.ones(len(head_bytes), dtype=bool)
+    def get_record_time(self, the_bytes, goodness):
+        """Overrides the method in Data
+        The first pair of words holds the time words of the data record, and the swaths start after the
+        whole word pairs read in Data_Rec2.make_words."""
+        marker = 9*(4 + max(0, -(-(self.od.locator_no-1) // 2)))
+        head = interleave_half_words(read_words_n56(the_bytes[:9], 2))
+        seconds = split_half_words(read_words_n56(the_bytes[marker:marker+9], 1))[1][0]
+        return self.make_record_time(head, seconds)
+    def get_head_words(self, the_bytes, goodness):
+        """Overrides the method in Data
+        The swaths come in pairs (see Data_Rec2.set_swaths). The first swath of a pair starts with the first word
+        of its bytes, and the second starts with the second word of the pair half way through them (see
+        Swath_Data3.make_words)."""
+        marker = 9*(4 + max(0, -(-(self.od.locator_no-1) // 2)))
+        size = 9*self.od.swath_block
+        head = interleave_half_words(read_words_n56(the_bytes[:9], 2))
+        swath_words = []
+        for j in range(marker, marker + (self.od.swaths_per_rec/2)*size, size):
+            pair_bytes = the_bytes[j:j+size]
+            swath_words.append(read_words_n56(pair_bytes[:9], 2))
+            swath_words.append(read_words_n56(pair_bytes[max(len(pair_bytes)/2-(9/2), 0):][:18], 4)[1:3])
+        return head, np.array(swath_words, dtype=np.int64).reshape(-1, 2)
+    def get_orbit_doc(self, the_bytes, goodness, the_file):
         """Overrides the method in Data
         Inputs:
-            - bang; the array of bytes
+            - the_bytes; the array of bytes
+            - goodness; the boolean array of goodness (unused for Nimbus 5 and 6)
             - the_file; a string representing the complete path to the TAP file
         Outputs:
             - Orbit_Doc2; an orbit documentation record object for Nimbus 5 and 6
         Passes the bytes and the filename to the od constructor."""
-        return Orbit_Doc2(bang, the_file)
-    def get_data_rec(self, bang):
+        return Orbit_Doc2(the_bytes, goodness, the_file)
+    def get_data_rec(self, the_bytes, goodness, keep=None, full_coords=True, scanlines=True):
         """Overrides the method in Data
         Inputs:
-            - bang; the array of bytes
+            - the_bytes; the array of bytes
+            - goodness; the boolean array of goodness (unused for Nimbus 5 and 6)
+            - keep; which swaths of the record to keep (default=None, i.e. all of them)
+            - full_coords; a boolean - False does not interpolate the full coordinates (default=True)
+            - scanlines; a boolean - False does not decode the data of the swaths (default=True)
         Outputs:
             - Data_Rec2; a data record object for Nimbus 5 and 6
         Passes the bytes and their goodness to the dr constructor."""
-        return Data_Rec2(bang, self.od)
+        return Data_Rec2(the_bytes, goodness, self.od, keep, full_coords, scanlines)
 
 class Orbit_Doc: # working
-    def __init__(self, od_bytes, filename):
+    def __init__(self, od_bytes, od_good, filename):
         """Inputs:
-            - od_bytes; the 2D array of bytes (index 0) and goodness (index 1) for the upcoming scan block
+            - od_bytes; the array of bytes for the upcoming scan block
+            - od_good; the boolean array of goodness, parallel to od_bytes
             - filename; a string representing a path to a .TAP file
         Creates an orbit documentation record for the file. The od_bytes are made into 36 bit TAP words in the
         make_words method. Each of these words is then assigned to the relevant attribute of the file.
         Some words must be divided by a scaling factor. The filename is also used in the attribution of the
         file start- and end datetimes, as the bytes passed in have no information on the year of the record."""
-        words = self.make_words(od_bytes)
+        words = self.make_words(od_bytes, od_good)
         self.dref = words[0]
         self.nday_start = int(words[2])
         self.start_hour = int(words[3])
@@ -236,106 +473,64 @@ class Orbit_Doc: # working
             end_datetime += dt.timedelta(days=(self.nday_end-1), hours=self.end_hour,
                                       minutes=self.end_minute, seconds=self.end_second)
         return end_datetime
-    def make_words(self, the_bytes):
+    def get_tbase(self, nday, hour, minute, second):
         """Inputs:
-            - the_bytes; the 2D array of bytes (index 0) and goodness (index 1)
-              for the upcoming scan block
+            - nday, hour, minute, second; the time words of a data record
         Outputs:
-            - words; a list of TAP words made from the bytes
-        Each word is made from 36 bits (4.5 bytes) contained within 48 bits (6 bytes).
-        This process is outlined in the docstring for the read_word method."""
-        words = []
-        for i in range(len(the_bytes)/6):
-            words.append(self.read_word(the_bytes[6*i:(6*i)+6]))
-        return words
-    def read_word(self, word_bytes):
+            - tbase; the time of the data record in seconds since 1970/01/01 00:00:00
+        The data record time is taken relative to the start of the file. The second is repeated in the
+        swath seconds, so it should be subtracted again when the swath seconds are added to tbase."""
+        day_diff = nday - self.nday_start
+        hour_diff = hour - self.start_hour
+        min_diff = minute - self.start_minute
+        sec_diff = second - self.start_second
+        seconds = (86400*day_diff) + (3600*hour_diff) + (60*min_diff) + sec_diff
+        delta = self.start_datetime - dt.datetime(1970, 01, 01)
+        tbase = (delta.days*86400) + (delta.seconds + seconds) + (delta.microseconds/1000000.)
+        return tbase
+    def make_words(self, the_bytes, goodness):
         """Inputs:
-            - word_bytes; the six bytes within which a word is buried
+            - the_bytes; the array of bytes for the upcoming scan block
+            - goodness; the boolean array of goodness, parallel to the_bytes
         Outputs:
-            - word; the word unearthed from the word_bytes
-        The THIR recorded data in a six-bit-native-byte machine - hence when read by a modern
-        (eight-bit-native-byte) machine two bits are extraneous. These bits are utilised as a check- and parity
-        bit, and were handled in the get_bytes_and_goodness method of Data. If the goodness is OK then this method
-        proceeds to read the word (otherwise an error value is returned). The six least significant bits from each byte
-        are read, and shifted left to make room for the next six. This is occurs a total of six times. The resultant
-        word is then returned.
-        NOTE: During this process, the endianness of the word is also changed. This is because the THIR machine was
-        of opposite endianness to the machine on which this code was written. If this is not the case for the machine
-        you are using, this method may need replacing."""
-        word = np.int64(0)
-        for i in range(len(word_bytes)):
-            if not word_bytes[i][1]: # if the goodness is bad for any bit
-                word = -999
-                break
-            else:
-                word = word << 6
-                mask = word_bytes[i][0] & 0b111111
-                word = word | mask
-        return word
+            - words; an array of TAP words made from the bytes
+        Each word is made from 36 bits (4.5 bytes) contained within 48 bits (6 bytes).
+        The whole record is decoded at once; this process is outlined in the docstring for tap_words.read_words_n4."""
+        return read_words_n4(the_bytes, goodness, len(the_bytes)/6)
 
 class Orbit_Doc2(Orbit_Doc): # working
-    def __init__(self, od_bytes, filename):
+    def __init__(self, od_bytes, od_good, filename):
         """Inherits from the Orbit_Doc object. Required for Nimbus 5 and 6."""
-        Orbit_Doc.__init__(self, od_bytes, filename)
-    def make_words(self, the_bytes):
+        Orbit_Doc.__init__(self, od_bytes, od_good, filename)
+    def make_words(self, the_bytes, goodness):
         """Overrides the method in Orbit_Doc
         Inputs:
             - the_bytes; the array of bytes for the upcoming scan block
+            - goodness; the boolean array of goodness (unused for Nimbus 5 and 6)
         Outputs:
-            - words; a list of TAP words made from the bytes
-        Each word is made from 36 bits (4.5 bytes). Contrary to the Nimbus 4 TAP files, all bits are
-        used for data storage in Nimbus 5 and 6 (hence there is no 'goodness' check). Because 4.5 bytes
-        cannot be read, we have no choice but to read 9 bytes and process this as two words back to back.
-        This process is outlined in the docstring for the read_word method."""
-        words = []
-        while len(the_bytes) % 9 != 0:
-            the_bytes = np.hstack((the_bytes, [0]))
-        for i in range(len(the_bytes)/9):
-            word1, word2 = self.read_word(the_bytes[9*i:(9*i)+9])
-            words.append(word1)
-            words.append(word2)
-        return words
-    def read_word(self, word_bytes):
-        """Overrides the method in Orbit_Doc.
-        Inputs:
-            - word_bytes; the six bytes within which two words are buried
-        Outputs:
-            - word1; the word unearthed from the most significant bits in word_bytes
-            - word2; the word unearthed from the least significant bits in word_bytes
-        See docstring for Orbit_Doc.read_words method. The bytes are added until the word is 40 bits long,
-        then shifted back by four bits to produce the first 36 bit word. Then the second 36 bit word is produced
-        by picking the 36 least significant bits of the last 40 bits. The resultant words are then returned.
-        NOTE: During this process, the endianness of the word is also changed. This is because the THIR machine was
-        of opposite endianness to the machine on which this code was written. If this is not the case for the machine
-        you are using, this method may need replacing."""
-        if len(word_bytes) != 9:
-            word1 = -999
-            word2 = -999
-        else:
-            word = np.int64(0)
-            for i in range(5):
-                word = word << 8
-                mask = word_bytes[i] & 0b11111111
-                word = word | mask
-            word1 = word >> 4
-            word = np.int64(0)
-            for i in range(4, 9):
-                word = word << 8
-                mask = word_bytes[i] & 0b11111111
-                word = word | mask
-            word2 = word & ((2**36)-1)
-        return word1, word2
+            - words; an array of TAP words made from the bytes
+        Each word is made from 36 bits (4.5 bytes), so the words come in pairs of nine bytes. The bytes are padded
+        with zeros to a whole number of pairs and decoded at once; this process is outlined in the docstring for
+        tap_words.read_words_n56."""
+        padding = np.zeros(-len(the_bytes) % 9, dtype=np.int8)
+        return read_words_n56(np.concatenate((the_bytes, padding)))
 
 class Data_Rec:
-    def __init__(self, dr_bytes, od):
+    def __init__(self, dr_bytes, dr_good, od, keep=None, full_coords=True, scanlines=True):
         """Inputs:
-            - dr_bytes; the 2D array of bytes (index 0) and goodness (index 1) for the upcoming scan block
+            - dr_bytes; the array of bytes for the upcoming scan block
+            - dr_good; the boolean array of goodness, parallel to dr_bytes
             - od; the Orbit_Doc object for this file, containing important metadata
+            - keep; a boolean for each swath - False swaths are not interpolated, and are left out of the columns
+              (default=None, i.e. every swath is kept)
+            - full_coords; a boolean - False leaves the full coordinates of the swaths empty (default=True)
+            - scanlines; a boolean - False leaves the data of the swaths empty, so that only the headers and anchor
+              points are decoded (default=True)
         Creates a data record, containing six swaths. The make_words method returns a list of words to
         use in the definition as well as a marker for when the words should be passed to the Swath_Data constructor.
         Some attributes are set directly (with and without scaling factors), whilst others (namely anchor_nadir_angles
         and sds) are set by methods."""
-        words, marker = self.make_words(dr_bytes, od)
+        words, marker = self.make_words(dr_bytes, dr_good, od)
         self.nday = words[0]
         self.hour = words[1]
         self.minute = words[2]
@@ -360,52 +555,27 @@ class Data_Rec:
         self.ref_c = words[12]
         self.ref_d = words[13]
         self.anchor_nadir_angles = self.set_nadir_angles(words[14:])
-        self.sds = self.set_swaths(dr_bytes[marker:], od)
-    def make_words(self, the_bytes, od):
+        self.scanlines = scanlines
+        self.sds = self.set_swaths(dr_bytes[marker:], dr_good[marker:], od)
+        if keep is None:
+            keep = [True] * len(self.sds)
+        self.keep = keep
+        if full_coords:
+            self.set_full_coords()
+    def make_words(self, the_bytes, goodness, od):
         """Inputs:
-            - the_bytes; the 2D array of bytes (index 0) and goodness (index 1) for the upcoming scan block
+            - the_bytes; the array of bytes for the upcoming scan block
+            - goodness; the boolean array of goodness, parallel to the_bytes
             - od; the Orbit_Doc object for this file, containing important metadata
         Outputs:
-            - words; the list of TAP words made from the bytes
-            - 6*i+6; the end of the indexes used in the reading of the final word
-        Uses the read_half_words and read_full_word methods to produce the list of words. Loops dictate whether
-        full_ or half_ words methods are used - this is outlined in the README for the THIR."""
-        words = []
-        for i in range(7):
-            wordA, wordD = self.read_half_words(the_bytes[6*i:(6*i)+6])
-            words.append(wordD)
-            words.append(wordA)
-        for i in range(7, 7+od.locator_no):
-            words.append(self.read_full_word(the_bytes[6*i:(6*i)+6]))
-        return words, 6*i+6
-    def read_half_words(self, some_bytes):
-        """Inputs:
-            - some_bytes; an array of six bytes to be interpreted
-        Outputs:
-            - wordA; the least significant 18 bits of a 36 bit word
-            - wordD; the most significant 18 bits of a 36 bit word
-        Creates a 36 bit word with the read_full_word method, and selects the bits from this to
-        make two 18 bit words."""
-        word = self.read_full_word(some_bytes)
-        if word == -999:
-            wordA = -999
-            wordD = -999
-        else:
-            wordA = word & 0x3FFFF
-            wordD = word >> 18
-        return wordA, wordD
-    def read_full_word(self, word_bytes):
-        """See docstring for Orbit_Doc.read_word"""
-        word = np.int64(0)
-        for i in range(len(word_bytes)):
-            if not word_bytes[i][1]: # if the goodness is bad for any bit
-                word = -999
-                break
-            else:
-                word = word << 6
-                mask = word_bytes[i][0] & 0b111111
-                word = word | mask
-        return word
+            - words; the array of TAP words made from the bytes
+            - marker; the end of the indexes used in the reading of the final word
+        Decodes all of the words in one go with read_words_n4, then splits the first seven into their half words.
+        Which words are full and which are half words is outlined in the README for the THIR."""
+        n_words = 7 + od.locator_no
+        full_words = read_words_n4(the_bytes, goodness, n_words)
+        words = np.concatenate((interleave_half_words(full_words[:7]), full_words[7:]))
+        return words, 6*n_words
     def set_nadir_angles(self, words):
         """Inputs:
             - words; a bunch of words chosen to contain the nadir angles
@@ -424,9 +594,24 @@ class Data_Rec:
             else:
                 nadangs[i] = (-64*999) # implicit -999
         return np.array(nadangs)/64.
-    def set_swaths(self, sd_bytes, od):
+    def set_full_coords(self):
+        """Interpolates the full latitude and longitude arrays of every filled swath in the record from its anchor
+        points. The anchor nadir angles are shared by all swaths of the record, so swaths with the same data
+        population share their Lagrange weights and are interpolated together (see lagrange.interp_anchor_coords).
+        Swaths which are not kept are not interpolated."""
+        kept = [self.sds[j] for j in range(len(self.sds)) if self.keep[j]]
+        pops = set([sd.data_pop for sd in kept]) - set([0])
+        for pop in pops:
+            group = [sd for sd in kept if sd.data_pop == pop]
+            lats, lons = interp_anchor_coords(self.anchor_nadir_angles, [sd.anchor_lats for sd in group],
+                                              [sd.anchor_lons for sd in group], pop)
+            for k in range(len(group)):
+                group[k].full_lats = lats[k]
+                group[k].full_lons = lons[k]
+    def set_swaths(self, sd_bytes, sd_good, od):
         """Inputs:
-            - sd_bytes; the 2D array of bytes (index 0) and goodness (index 1)
+            - sd_bytes; the array of bytes for the swaths in this record
+            - sd_good; the boolean array of goodness, parallel to sd_bytes
             - od; the Orbit_Doc object for this file, containing important metadata
         Outputs:
             - swaths; a list of swath data objects for Nimbus 4
@@ -435,97 +620,35 @@ class Data_Rec:
         swaths = []
         for i in range(od.swaths_per_rec):
             index = i*od.swath_block*6
-            swaths.append(Swath_Data(sd_bytes[index:index + (od.swath_block * 6)], od, self))
+            swaths.append(Swath_Data(sd_bytes[index:index + (od.swath_block * 6)],
+                                     sd_good[index:index + (od.swath_block * 6)], od, self))
         return swaths
 
 class Data_Rec2(Data_Rec):
-    def __init__(self, dr_bytes, od):
+    def __init__(self, dr_bytes, dr_good, od, keep=None, full_coords=True, scanlines=True):
         """Inherits from the Data_Rec object. Required for Nimbus 5 and 6."""
-        Data_Rec.__init__(self, dr_bytes, od)
-    def make_words(self, the_bytes, od):
+        Data_Rec.__init__(self, dr_bytes, dr_good, od, keep, full_coords, scanlines)
+    def make_words(self, the_bytes, goodness, od):
         """Overrides the method in Data_Rec
         Inputs:
             - the_bytes; the array of bytes for the upcoming scan block
+            - goodness; the boolean array of goodness (unused for Nimbus 5 and 6)
             - od; the Orbit_Doc object for this file, containing important metadata
         Outputs:
-            - words; the list of TAP words made from the bytes
-            - 9*i; the end of the indexes used in the reading of the final word
-        Uses the read_half_words and read_full_word methods to produce the list of words. Loops dictate whether
-        full_ or half_ words methods are used - this is outlined in the README for the THIR."""
-        words = []
-        for i in range(3):
-            word1A, word1D, word2A, word2D = self.read_half_words(the_bytes[9*i:(9*i)+9])
-            words.append(word1D)
-            words.append(word1A)
-            words.append(word2D)
-            words.append(word2A)
-        # need two more half-words
-        word1A, word1D, word2A, word2D = self.read_half_words(the_bytes[27:36])
-        words.append(word1D)
-        words.append(word1A)
-        word1, word2 = self.read_full_word(the_bytes[27:36])
-        words.append(word2)
-        i = 4
-        while len(words) < (14+od.locator_no):
-            word1, word2 = self.read_full_word(the_bytes[9*i:(9*i)+9])
-            words.append(word1)
-            words.append(word2)
-            i += 1
-        return words, 9*i
-    def read_half_words(self, some_bytes):
-        """Overrides the method in Data_Rec
-        Inputs:
-            - some_bytes; an array of nine bytes to be interpreted
-        Outputs:
-            - word1A; the least significant 18 bits of a 36 bit word
-            - word1D; the most significant 18 bits of a 36 bit word
-            - word2A; the least significant 18 bits of a 36 bit word
-            - word2D; the most significant 18 bits of a 36 bit word
-        Creates two 36 bit words with the read_full_word method, and selects the bits from these to
-        make four 18 bit words."""
-        word1, word2 = self.read_full_word(some_bytes)
-        if word1 == -999:
-            word1A = -999
-            word1D = -999
-        else:
-            word1A = word1 & 0x3FFFF
-            word1D = word1 >> 18
-        if word2 == -999:
-            word2A = -999
-            word2D = -999
-        else:
-            word2A = word2 & 0x3FFFF
-            word2D = word2 >> 18
-        return word1A, word1D, word2A, word2D
-    def read_full_word(self, word_bytes):
-        """Overrides the method in Data_Rec
-        See docstring for Orbit_Doc2.read_word"""
-        if len(word_bytes) != 9:
-            word1 = -999
-            word2 = -999
-        else:
-            word = np.int64(0)
-            for i in range(5):
-                word = word << 8
-                mask = word_bytes[i] & 0b11111111
-                word = word | mask
-            word1 = word >> 4
-            if len(word_bytes) == 9:
-                word = np.int64(0)
-                mask = word_bytes[i] & 0b1111
-                word = word | mask
-                for i in range(5,9):
-                    word = word << 8
-                    mask = word_bytes[i] & 0b11111111
-                    word = word | mask
-                word2 = word & ((2**36)-1)
-            else:
-                word2 = -999
-        return word1, word2
-    def set_swaths(self, sd_bytes, od):
+            - words; the array of TAP words made from the bytes
+            - marker; the end of the indexes used in the reading of the final word
+        Decodes whole word pairs with read_words_n56, then splits the first seven words into their half words.
+        The nadir angles start with the second word of the fourth pair, and whole pairs are read until there are
+        enough of them - this is outlined in the README for the THIR."""
+        n_pairs = 4 + max(0, -(-(od.locator_no-1) // 2))
+        full_words = read_words_n56(the_bytes, 2*n_pairs)
+        words = np.concatenate((interleave_half_words(full_words[:7]), full_words[7:]))
+        return words, 9*n_pairs
+    def set_swaths(self, sd_bytes, sd_good, od):
         """Overrides method in Data_Rec
         Inputs:
             - sd_bytes; the array of bytes
+            - sd_good; the boolean array of goodness (unused for Nimbus 5 and 6)
             - od; the Orbit_Doc object for this file, containing important metadata
         Outputs:
             - swaths; a list of swath data objects for Nimbus 5 and 6
@@ -537,28 +660,30 @@ class Data_Rec2(Data_Rec):
         swaths = []
         for i in range(od.swaths_per_rec/2):
             index = i*od.swath_block*9
-            swaths.append(Swath_Data2(sd_bytes[index:index+(od.swath_block*9)], od, self))
-            swaths.append(Swath_Data3(sd_bytes[index:index+(od.swath_block*9)], od, self))
+            swaths.append(Swath_Data2(sd_bytes[index:index+(od.swath_block*9)], sd_good, od, self))
+            swaths.append(Swath_Data3(sd_bytes[index:index+(od.swath_block*9)], sd_good, od, self))
         return swaths
 
 class Swath_Data:
-    def __init__(self, sd_bytes, od, dr):
+    def __init__(self, sd_bytes, sd_good, od, dr):
         """Input:
             - sd_bytes; the bytes relevant for the construction of a swath data record
+            - sd_good; the boolean array of goodness, parallel to sd_bytes
             - od; the orbit document object for this file, containing important metadata
             - dr; the data record document for this block, containing important metadata
         Creates a swath data object. The make_words method returns a list of words to use in the definition. Some
         of these are set directly (with or without scaling factors), others are set using methods.
         NOTE: If the data population of a given swath is deemed erroneous, that swath will be filled. This should
         obviously be the case when data_pop is zero, but less obviously the data_pop attribute is sometimes corrupted
-        and hence enormous. In these cases it is also set to zero and the swath is treated as if it were zero."""
-        words = self.make_words(sd_bytes, od)
+        and hence enormous (or unreadable, -999). In these cases it is also set to zero and the swath is treated as
+        if it were zero."""
+        words = self.make_words(sd_bytes, sd_good, od)
         if words[0] != -999:
             self.seconds = words[0]/512.
         else:
             self.seconds = words[0]
         self.data_pop = words[1]
-        if (self.data_pop != 0) & (self.data_pop < 600):
+        if (self.data_pop > 0) & (self.data_pop < 600):
             if words[2] != -999:
                 self.subsat_lat = words[2]/64.
             else:
@@ -570,10 +695,12 @@ class Swath_Data:
             self.flags = self.get_flags(words[4])
             self.anchor_lats = self.get_anchor_lats(words[5:5+(2*od.locator_no):2])
             self.anchor_lons = self.get_anchor_lons(words[6:6+(2*od.locator_no):2])
-            self.data = self.get_data(words[6+(2*od.locator_no)-1:]) # need to step back by one because of double stepping in lines above
-            full_coords = self.get_full_coords(dr, od)
-            self.full_lats = full_coords[0]
-            self.full_lons = full_coords[1]
+            self.data = np.array([])
+            if dr.scanlines: # left out when only the headers and anchor points are wanted (see Data.decode_columns)
+                self.data = self.get_data(words[6+(2*od.locator_no)-1:]) # need to step back by one because of double stepping in lines above
+            # the full coordinates are interpolated for every swath in the record at once (Data_Rec.set_full_coords)
+            self.full_lats = np.array([])
+            self.full_lons = np.array([])
         else:
             self.data_pop = 0
             self.subsat_lat = -999
@@ -589,48 +716,18 @@ class Swath_Data:
             self.full_lats = np.array([])
             self.full_lons = np.array([])
             self.seconds = -999
-    def make_words(self, the_bytes, od):
+    def make_words(self, the_bytes, goodness, od):
         """Inputs:
             - the_bytes; the array of bytes for the upcoming swath
+            - goodness; the boolean array of goodness, parallel to the_bytes
             - od; the Orbit_Doc object for this file, containing important metadata
         Outputs:
-            - words; the list of TAP words made from the bytes
-        Uses the read_half_words and read_full_word methods to produce the list of words. Loops dictate whether
-        full_ or half_ words methods are used - this is outlined in the README for the THIR."""
-        words = []
-        for i in range(2):
-            wordA, wordD = self.read_half_words(the_bytes[6*i:(6*i)+6])
-            words.append(wordD)
-            words.append(wordA)
-        j = i+1
-        words.append(self.read_full_word(the_bytes[6*j:(6*j)+6]))
-        for i in range(j+1, len(the_bytes)):
-            wordA, wordD = self.read_half_words(the_bytes[6*i:(6*i)+6])
-            words.append(wordD)
-            words.append(wordA)
-        return words
-    def read_half_words(self, some_bytes):
-        """See docstring for Data_rec.read_half_words"""
-        word = self.read_full_word(some_bytes)
-        if word == -999:
-            wordA = -999
-            wordD = -999
-        else:
-            wordA = word & 0x3FFFF
-            wordD = word >> 18
-        return wordA, wordD
-    def read_full_word(self, word_bytes):
-        """See docstring for Data_rec.read_full_word"""
-        word = np.int64(0)
-        for i in range(len(word_bytes)):
-            if not word_bytes[i][1]: # if the goodness is bad for any bit
-                word = -999
-                break
-            else:
-                word = word << 6
-                mask = word_bytes[i][0] & 0b111111
-                word = word | mask
-        return word
+            - words; the array of TAP words made from the bytes
+        Decodes all of the words in one go with read_words_n4. The first two words and all words after the third
+        are split into half words - this is outlined in the README for the THIR. As in the original reader, one word
+        is made for every byte in the swath; words past the end of the swath block are zero."""
+        full_words = read_words_n4(the_bytes, goodness, max(len(the_bytes), 3))
+        return make_swath_words(full_words)
     def get_flags(self, number):
         """Inputs:
             - number; an integer to be decoded as flags
@@ -709,192 +806,284 @@ class Swath_Data:
         Outputs:
             - nplats; the interpolated latitudes array
             - nplons; the interpolated longitudes array
-        Applies a lagrangian interpolator with a number of points n=5. First, the mirror rotation rate is assumed to be
-        constant throughout the flight, and the first (last) anchor point is assumed to correspond to the first
-        (last) data point. Then the range of nadir angles is interpolated to provide a value for each data point.
-        The 'x' values for the interpolation are the anchor point nadir angles, and the 'y' values are the coordinates.
-        The aim is to map our known progression through the x's (the current nadir angle) to the progression through the
-        coordinates. For each nadir angle, the find_nearest_index method is used to find the index of the closest angle
-        in the anchor points array. Then the surrounding_n method is used to find the n points to use in the
-        interpolation. For the sake of interpolating along a smooth function, longitudes are added to/ subtracted from
-        if the inspected area crosses the dateline. Then the interp_lagrange method is applied to the relevant info,
-        and the output is appended to the array.
-        Finally, if longitudes fall within a tolerance of the upper/lower limit then they can be folded back into the
-        longitude domain. This compensates for the addition/ subtraction mentioned above. Other erroneous values
-        are set as such.
-        NOTE: The interpolator works fine for well behaved functions, but the raw anchor point arrays is known to
-        behave badly at extreme latitudes. It is this behaviou, not the behaviour of the interpolator, which causes
-        a mess in the fully extended coordinate arrays. It is my hope that by fixing the anchor points, the full
-        coordinate arrays will behave better and require less 'tolerance'."""
-        n = 5
-        anchor_nads = dr.anchor_nadir_angles
-        full_nads = np.linspace(np.min(anchor_nads), np.max(anchor_nads), self.data_pop)
-        lats = []
-        lons = []
-        for nad in full_nads:
-            ind = self.find_nearest_index(anchor_nads, nad)
-            relevant_inds = self.surrounding_n(ind, n, od)
-            relevant_anchors = anchor_nads[relevant_inds]
-            relevant_latitudes = self.anchor_lats[relevant_inds]
-            relevant_longitudes = self.anchor_lons[relevant_inds]
-            if abs(relevant_longitudes[0]-relevant_longitudes[-1]) > 180:  # i.e. the dateline is crossed
-                relevant_longitudes[relevant_longitudes<180]+=360
-            lats.append(self.interp_lagrange(nad, relevant_anchors, relevant_latitudes))
-            lons.append(self.interp_lagrange(nad, relevant_anchors, relevant_longitudes))
-        # deal with slight overshot during interpolation:
-        nplons = np.array(lons)
-        nplons[(nplons>360)&(nplons<360 + tolerance)] -= 360
-        nplons[nplons>360 + tolerance] = -999
-        nplons[(nplons>0 - tolerance)&(nplons<0)] += 360
-        nplons[nplons<0 - tolerance] = -999
-        nplats = np.array(lats)
-        nplats[nplats>180] = -999
-        nplats[nplats<0] = -999
-        return nplats, nplons
-    def find_nearest_index(self, the_array, value):
+        Applies a lagrangian interpolator with a number of points n=5 to this swath alone. The method is described
+        in lagrange.interp_anchor_coords; Data_Rec.set_full_coords does the same for all swaths of a record."""
+        nplats, nplons = interp_anchor_coords(dr.anchor_nadir_angles, [self.anchor_lats], [self.anchor_lons],
+                                              self.data_pop, tolerance)
+        return nplats[0], nplons[0]
+
+class Swath_Data2(Swath_Data):
+    def __init__(self, sd_bytes, sd_good, od, dr):
+        Swath_Data.__init__(self, sd_bytes, sd_good, od, dr)
+    def make_words(self, the_bytes, goodness, od):
+        """Overrides the method in Swath_Data
+        Inputs:
+            - the_bytes; the array of bytes for a pair of swaths
+            - goodness; the boolean array of goodness (unused for Nimbus 5 and 6)
+            - od; the Orbit_Doc object for this file, containing important metadata
+        Outputs:
+            - words; the array of TAP words made from the bytes
+        The first swath of a pair starts at the beginning of the bytes. See tap_words.read_swath_words_n56."""
+        return read_swath_words_n56(the_bytes, od.locator_no)
+
+class Swath_Data3(Swath_Data2):
+    def __init__(self, sd_bytes, sd_good, od, dr):
+        Swath_Data2.__init__(self, sd_bytes, sd_good, od, dr)
+    def make_words(self, the_bytes, goodness, od):
+        """Overrides the method in Swath_Data2
+        The second swath of a pair starts half way through the bytes, with the second word of a word pair.
+        The bytes before that pair are dropped and the swath is read with a one word offset."""
+        midlen = len(the_bytes)/2
+        the_other_bytes = the_bytes[max(midlen-(9/2), 0):]
+        return read_swath_words_n56(the_other_bytes, od.locator_no, offset=1)
+
+class Swath_Columns:
+    record_ints = ('nday', 'hour', 'minute', 'second', 'height', 'cell_temp', 'electro_temp',
+                   'ref_a', 'ref_b', 'ref_c', 'ref_d')
+    record_floats = ('roll_error', 'pitch_error', 'yaw_error')
+    swath_floats = ('seconds', 'subsat_lat', 'subsat_lon')
+    swath_lines = ('data', 'full_lats', 'full_lons')
+    def __init__(self, n_recs, od, scanlines=True):
         """Inputs:
-            - the_array; the array in which the index is to be found
-            - value; the value for which the nearest index in array is to be found
-        Output:
-            - i; the index where the array is closest to the value
-        Subtracts the value across the array and returns the index at which the differences produced are minimised."""
-        array = np.copy(the_array)
-        array -= value
-        i = 0
-        while abs(array[i]) != min(abs(array)):
-            i += 1
-        return i
-    def surrounding_n(self, index, n, od):
-        """Returns a list of indexes usable for the lagrangian interpolator, depending on the size of n."""
-        addresses = np.arange(index-(n/2), index+(n/2)+1)
-        while addresses[0] < 0:
-            addresses += 1
-        while addresses[-1] >= od.locator_no:
-            addresses -= 1
-        return addresses
-    def interp_lagrange(self, x, xs, ys):
+            - n_recs; the number of data records that will be added
+            - od; the Orbit_Doc object for this file, containing important metadata
+            - scanlines; a boolean - False leaves out the scanlines, which are then None (default=True)
+        Creates a columnar store for the decoded records and swaths of a file. Every record attribute is held in
+        an array indexed by record, and every swath attribute in an array indexed by swath, where the j-th swath of
+        the i-th record is swath i*swaths_per_rec + j. The scanlines (data, full_lats and full_lons) are held in
+        (n_swaths, width) arrays padded with -999. All arrays are allocated up front and filled by add_record.
+        Without the scanlines, the columns only grow with the number of swaths and anchor points, and the
+        scanlines are read from the records a block at a time (see Fields.set_big_arrays)."""
+        self.scanlines = scanlines
+        self.swaths_per_rec = od.swaths_per_rec
+        self.locator_no = od.locator_no
+        self.n_recs = 0
+        n_swaths = n_recs * self.swaths_per_rec
+        for name in self.record_ints:
+            setattr(self, name, self.filled((n_recs,), np.int64))
+        for name in self.record_floats:
+            setattr(self, name, self.filled((n_recs,), np.float64))
+        self.anchor_nadir_angles = self.filled((n_recs, od.locator_no), np.float64)
+        self.swaths_in_rec = np.zeros(n_recs, dtype=np.int64)
+        self.kept = np.zeros(n_swaths, dtype=bool)
+        for name in self.swath_floats:
+            setattr(self, name, self.filled((n_swaths,), np.float64))
+        self.data_pop = np.zeros(n_swaths, dtype=np.int64)
+        self.flags = self.filled((n_swaths, 9), np.int64)
+        self.anchor_lats = self.filled((n_swaths, od.locator_no), np.float64)
+        self.anchor_lons = self.filled((n_swaths, od.locator_no), np.float64)
+        width = max(0, 2*(od.swath_block - 3 - od.locator_no)) # the most data that fits in a swath block
+        for name in self.swath_lines:
+            setattr(self, name, self.filled((n_swaths, width), np.float64) if scanlines else None)
+    def filled(self, shape, dtype):
+        """Returns an array of the given shape and dtype, filled with -999."""
+        array = np.empty(shape, dtype=dtype)
+        array.fill(-999)
+        return array
+    def add_record(self, dr):
         """Inputs:
-            - x; the value at which to evaluate the interpolating polynomial
-            - xs; the x coordinates of the discrete data points we are trying to interpolate
-            - ys; the y coordinates of the discrete data points we are trying to interpolate
-        Finds the value of the Lagrange interpolating polynomial through the points
-        (xs[i], ys[i]) at x, where 0<=i<=n and n is the length of xs (and therefore of ys).
-        Lagrange polynomials which are highly constrained (i.e. n is too large) exhibit
-        highly oscillatory behaviour. As such it is recommended that the polynomial be constructed
-        based on a few points in the neighborhood."""
-        # testing of the function can be done by calling it on a series of points between x_min and x_max and
-        # plotting the result alongside a scatter of the original points
-        val = 0
-        for i in range(len(ys)):
-            poly = self.lagrange_poly(x, xs, i)
-            val += ys[i]*poly
-        return val
-    def lagrange_poly(self, x, xs, i):
+            - dr; a decoded Data_Rec object
+        Copies the record and its kept swaths into the next free row of the columns. The Data_Rec and its
+        Swath_Data objects are not kept."""
+        i = self.n_recs
+        for name in self.record_ints + self.record_floats:
+            getattr(self, name)[i] = getattr(dr, name)
+        self.anchor_nadir_angles[i] = dr.anchor_nadir_angles[:self.locator_no]
+        self.swaths_in_rec[i] = len(dr.sds)
+        for j in range(len(dr.sds)):
+            self.kept[i*self.swaths_per_rec + j] = dr.keep[j]
+            if dr.keep[j]:
+                self.add_swath(i*self.swaths_per_rec + j, dr.sds[j])
+        self.n_recs += 1
+    def add_swath(self, k, sd):
         """Inputs:
-            - x; the x coordinate of the value which interp_lagrange() aims to interpolate
-            - xs; the x coordinates of the data points being interpolated by interp_lagrange()
-            - i; the index referring to the point in xs about which to create the basis polynomial
-            Returns the value of the basis polynomial centred on the i-th coordinate of xs evaluated at x."""
-        poly = 1
-        for xm in xs[xs!=xs[i]]:
-            poly *= (x-xm)/(xs[i]-xm)
-        return poly
+            - k; the index of the swath
+            - sd; a decoded Swath_Data object
+        Copies the swath into row k of the columns, widening the scanline arrays if it holds more data than
+        they have room for."""
+        for name in self.swath_floats:
+            getattr(self, name)[k] = getattr(sd, name)
+        self.flags[k] = sd.flags
+        self.anchor_lats[k] = sd.anchor_lats
+        self.anchor_lons[k] = sd.anchor_lons
+        pop = len(sd.data)
+        self.data_pop[k] = sd.data_pop
+        if not self.scanlines:
+            return
+        if pop > self.data.shape[1]:
+            for name in self.swath_lines:
+                line = getattr(self, name)
+                padding = self.filled((line.shape[0], pop - line.shape[1]), np.float64)
+                setattr(self, name, np.hstack((line, padding)))
+        self.data[k, :pop] = sd.data
+        self.full_lats[k, :len(sd.full_lats)] = sd.full_lats
+        self.full_lons[k, :len(sd.full_lons)] = sd.full_lons
+    def record_of(self):
+        """Returns the index of the record that each swath belongs to."""
+        return np.arange(len(self.data_pop)) // self.swaths_per_rec
+    def swath_exists(self):
+        """Returns a boolean array, True for each swath that was read from its record and kept."""
+        read = (np.arange(len(self.data_pop)) % self.swaths_per_rec) < self.swaths_in_rec[self.record_of()]
+        return read & self.kept
 
-class Swath_Data2(Swath_Data):
-    def __init__(self, sd_bytes, od, dr):
-        Swath_Data.__init__(self, sd_bytes, od, dr)
-    def make_words(self, the_bytes, od):
-        words = []
-        word1A, word1D, word2A, word2D = self.read_half_words(the_bytes[:9])
-        words.append(word1D)
-        words.append(word1A)
-        words.append(word2D)
-        words.append(word2A)
-        word1, word2 = self.read_full_word(the_bytes[9:18])
-        words.append(word1)
-        word1A, word1D, word2A, word2D = self.read_half_words(the_bytes[9:18])
-        words.append(word2D)
-        words.append(word2A)
-        i = 2
-        while len(words) < (5+(2*od.locator_no)+words[1]):
-            word1A, word1D, word2A, word2D = self.read_half_words(the_bytes[9*i:(9*i)+9])
-            words.append(word1D)
-            words.append(word1A)
-            words.append(word2D)
-            words.append(word2A)
-            i += 1
-        return words
-    def read_half_words(self, some_bytes):
-        word1, word2 = self.read_full_word(some_bytes)
-        if word1 == -999:
-            word1A = -999
-            word1D = -999
-        else:
-            word1A = word1 & 0x3FFFF
-            word1D = word1 >> 18
-        if word2 == -999:
-            word2A = -999
-            word2D = -999
-        else:
-            word2A = word2 & 0x3FFFF
-            word2D = word2 >> 18
-        return word1A, word1D, word2A, word2D
-    def read_full_word(self, word_bytes):
-        if len(word_bytes) != 9:
-            word1 = -999
-            word2 = -999
+class Data_Rec_View:
+    def __init__(self, columns, i):
+        """Inputs:
+            - columns; the Swath_Columns object holding the file
+            - i; the index of the record
+        A compatibility view of one record in a Swath_Columns object, with the same attributes as Data_Rec.
+        The values are read from the columns when they are asked for."""
+        self.columns = columns
+        self.index = i
+        self.sds = [Swath_Data_View(columns, i*columns.swaths_per_rec + j) for j in range(columns.swaths_in_rec[i])]
+    def __getattr__(self, name):
+        if name in Swath_Columns.record_ints + Swath_Columns.record_floats + ('anchor_nadir_angles',):
+            return getattr(self.columns, name)[self.index]
+        raise AttributeError(name)
+
+class Swath_Data_View:
+    def __init__(self, columns, k):
+        """Inputs:
+            - columns; the Swath_Columns object holding the file
+            - k; the index of the swath
+        A compatibility view of one swath in a Swath_Columns object, with the same attributes as Swath_Data.
+        The values are read from the columns when they are asked for; the scanlines are cut to data_pop."""
+        self.columns = columns
+        self.index = k
+    def __getattr__(self, name):
+        if name in Swath_Columns.swath_lines:
+            return getattr(self.columns, name)[self.index, :self.columns.data_pop[self.index]]
+        if name in Swath_Columns.swath_floats + ('data_pop', 'flags', 'anchor_lats', 'anchor_lons'):
+            return getattr(self.columns, name)[self.index]
+        raise AttributeError(name)
+
+class Data_Rec_Views:
+    def __init__(self, columns):
+        """Inputs:
+            - columns; the Swath_Columns object holding the file
+        A sequence of Data_Rec_View objects, one for each record in columns, made the first time they are
+        indexed."""
+        self.columns = columns
+        self.views = [None] * columns.n_recs
+    def __len__(self):
+        return len(self.views)
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if self.views[i] is None:
+            self.views[i] = Data_Rec_View(self.columns, i % len(self))
+        return self.views[i]
+
+class Lazy_Data_Recs:
+    def __init__(self, data, record_numbers, cache_size=64):
+        """Inputs:
+            - data; the Data (or Data2) object for the file
+            - record_numbers; the indices in data.records of the data records in the sequence
+            - cache_size; the largest number of decoded records to keep (default=64)
+        A sequence of the data records of a file, each decoded into a Data_Rec object (with its swaths and their
+        full coordinates) the first time it is indexed. Decoded records are kept in a cache, and once it holds
+        cache_size records the one used least recently is dropped."""
+        self.data = data
+        self.record_numbers = record_numbers
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+    def __len__(self):
+        return len(self.record_numbers)
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('record index out of range')
+        if i in self.cache:
+            dr = self.cache.pop(i)
         else:
-            word = np.int64(0)
-            for i in range(5):
-                word = word << 8
-                mask = word_bytes[i] & 0b11111111
-                word = word | mask
-            word1 = word >> 4
-            if len(word_bytes) == 9:
-                word = np.int64(0)
-                mask = word_bytes[i] & 0b1111
-                word = word | mask
-                for i in range(4,9):
-                    word = word << 8
-                    mask = word_bytes[i] & 0b11111111
-                    word = word | mask
-                word2 = word & ((2**36)-1)
-            else:
-                word2 = -999
-        return word1, word2
+            timer = self.data.stats.start('decoding')
+            dr = self.data.decode_record(self.record_numbers[i])
+            self.data.stats.stop(timer)
+            if len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+        self.cache[i] = dr
+        return dr
 
-class Swath_Data3(Swath_Data2):
-    def __init__(self, sd_bytes, od, dr):
-        Swath_Data2.__init__(self, sd_bytes, od, dr)
-    def make_words(self, the_bytes, od):
-        words = []
-        midlen = len(the_bytes)/2
-        the_other_bytes = np.delete(the_bytes, np.arange(midlen-(9/2)))
-        word1A, word1D, word2A, word2D = self.read_half_words(the_other_bytes[:9])
-        words.append(word2D)
-        words.append(word2A)
-        word1A, word1D, word2A, word2D = self.read_half_words(the_other_bytes[9:18])
-        words.append(word1D)
-        words.append(word1A)
-        word1, word2 = self.read_full_word(the_other_bytes[9:18])
-        words.append(word2)
-        i = 2
-        while len(words) < (5+(2*od.locator_no)+words[1]):
-            word1A, word1D, word2A, word2D = self.read_half_words(the_other_bytes[9*i:(9*i)+9])
-            words.append(word1D)
-            words.append(word1A)
-            words.append(word2D)
-            words.append(word2A)
-            i += 1
-        return words
+# the stages needed to make each of the scene products of Fields:
+PRODUCT_STAGES = {
+    'data': ('scanlines',),
+    'lats': ('full_coords',),
+    'lons': ('full_coords',),
+    'lats2': ('geolocation',),
+    'lons2': ('geolocation',),
+    'sol_zen': ('solar_angles',),
+    'sol_az': ('solar_angles',),
+    'sat_zen': ('satellite_angles',),
+    'sat_az': ('satellite_angles',),
+}
+# the stages that each stage needs in turn:
+STAGE_NEEDS = {
+    'scanlines': (), # the data and full coordinates of the swaths, put onto the truetime grid
+    'full_coords': ('scanlines',), # the coordinates interpolated from the anchor points (see Data_Rec)
+    'geolocation': (), # the pixel positions from pyorbital
+    'solar_angles': ('geolocation',),
+    'satellite_angles': ('geolocation',),
+}
+
+def needed_stages(products=None):
+    """Inputs:
+        - products; the names of the scene products wanted (see PRODUCT_STAGES), or None for all of them
+    Outputs:
+        - stages; the set of stages which must be run to make those products, following STAGE_NEEDS
+    Raises a ValueError if a product is not recognised."""
+    if products is None:
+        products = PRODUCT_STAGES.keys()
+    stages = set()
+    todo = []
+    for product in products:
+        if product not in PRODUCT_STAGES:
+            raise ValueError('Product not recognised: ' + str(product))
+        todo.extend(PRODUCT_STAGES[product])
+    while todo:
+        stage = todo.pop()
+        if stage not in stages:
+            stages.add(stage)
+            todo.extend(STAGE_NEEDS[stage])
+    return stages
 
 class Fields():
-    def __init__(self, file_data):
+    scene_names = ('data', 'lats', 'lats2', 'lons', 'lons2', 'sol_zen', 'sat_zen', 'sol_az', 'sat_az')
+    def __init__(self, file_data, ellipsoid=True, scene=True, workers=None, products=None, tie_points=None):
+        """Inputs:
+            - file_data; the Data (or Data2) object for the file
+            - ellipsoid; a boolean - True works out the satellite zenith and azimuth angles from the position of
+              the satellite on the WGS-84 ellipsoid, False uses the faster spherical approximation (default=True,
+              see sat_geometry.satellite_angles)
+            - scene; a boolean - True makes the (Y, X) scene arrays (data, coordinates and angles) for the whole
+              file, False leaves them out so that they can be made a block of scanlines at a time with scene_block
+              (default=True)
+            - workers; the number of processes to geolocate the scene with (default=None, i.e. this process only -
+              see geolocation.geolocate_scene)
+            - products; the scene arrays to make, out of scene_names (default=None, i.e. all of them)
+            - tie_points; a (line_step, pixel_step) pair - the pyorbital coordinates and the angles are only worked
+              out at tie points and interpolated to the other pixels (default=None, i.e. at every pixel - see
+              geolocation.geolocate_tie_points)
+        Only the stages needed by the products asked for are run (see needed_stages), so that e.g. the data and
+        the interpolated coordinates are made without calling pyorbital. The scene arrays which are not asked for
+        are not set. The per-scanline arrays are always made.
+        The stages are timed, and the fill scanlines counted, in the stats of file_data (see instrument.Stats)."""
+        self.stats = file_data.stats
+        timer = self.stats.start('fields')
+        self.stages = needed_stages(products)
+        self.tie_points = tie_points
+        self.products = tuple([name for name in self.scene_names if (products is None) or (name in products)])
+        if ('full_coords' in self.stages) and not file_data.full_coords:
+            raise ValueError('The full coordinates were not read (see Data)')
         self.channel = self.get_channel(file_data)
-        self.start_time, self.end_time = self.get_time_lims(file_data)
+        swath_times = self.get_swath_times(file_data)
+        self.start_time, self.end_time = self.get_time_lims(file_data, swath_times)
         self.swath_width, self.no_swaths = self.find_swath_dims(file_data)
-        self.truetime, self.trueinds, time = self.tdims(file_data) # test this on a more obviously gappy file
+        self.truetime, self.trueinds, time = self.tdims(file_data, swath_times) # test this on a more obviously gappy file
         # time is not for recording, but can be used to check that trueinds is working well
+        self.stats.count('fill_scanlines', len(self.truetime) - len(np.unique(self.trueinds[self.trueinds != -1])))
         temps = self.set_temps(file_data)
         self.cell_temps = temps[0]
         self.electro_temps = temps[1]
@@ -925,29 +1114,27 @@ class Fields():
         self.nadangs = small_arrays[0]
         self.anchor_lats = small_arrays[1]
         self.anchor_lons = small_arrays[2]
-        big_arrays = self.set_big_arrays(file_data)
-        lons, lats, alts, solzen, solaz, solalt, satzen, sataz = self.geoloc2(file_data)
-        self.data = big_arrays[0]
-        self.lats = big_arrays[1]
-        self.lats2 = lats
-        self.lons = big_arrays[2]
-        self.lons2 = lons
-        self.sol_zen = solzen
-        self.sat_zen = satzen
-        self.sol_az = solaz
-        self.sat_az = sataz
+        self.geometry = None
+        if 'geolocation' in self.stages:
+            self.geometry = self.line_geometry(file_data)
+        self.stats.stop(timer)
+        if scene:
+            block = self.scene_block(file_data, 0, len(self.truetime), ellipsoid, workers)
+            for name in self.products:
+                setattr(self, name, block[name])
     def find_swath_dims(self, fd):
-        widths = []
-        for i in range(len(fd.dr)):
-            for j in range(len(fd.dr[i].sds)):
-                widths.append(fd.dr[i].sds[j].data_pop)
+        cols = fd.columns
+        widths = cols.data_pop[cols.swath_exists()]
         swaths = len(widths)
         max_width = max(widths)
         return max_width, swaths
-    def tdims(self, fd):
+    def tdims(self, fd, swath_times=None):
         """Finds an array of truetime (len = no_scanlines) which holds the true time for the whole file (dummy times are
         inserted where necessary), as well as an array of trueinds (len = no_obs < no_scanlines) which holds the
-        index in truetime of each record in the file."""
+        index in truetime of each record in the file.
+        truetime is a uniform grid, so the nearest grid time to every swath is found at once with a binary search
+        (the earlier of two equally near grid times is used). The swath times can be passed in if they have
+        already been found by get_swath_times."""
         delta0 = self.start_time - dt.datetime(1970,01,01)
         delta1 = self.end_time - dt.datetime(1970,01,01)
         if ((delta0.days*86400) + delta0.seconds > 63072000) & ((delta1.days*86400) + delta1.seconds < 165542400): # then it's a Nimbus 5 file
@@ -957,83 +1144,123 @@ class Fields():
         t1 = (delta1.days*86400) + delta1.seconds + (delta1.microseconds/1000000.)
         scan_sep = 360/fd.od.mirror_rot
         truetime = np.arange(t0, t1+scan_sep, scan_sep)
-        trueinds = []
-        the_time = []
-        for i in range(len(fd.dr)):
-            t_base = self.get_tbase(fd, i)
-            for j in range(len(fd.dr[i].sds)):
-                if fd.dr[i].sds[j].seconds != -999:
-                    time = t_base+fd.dr[i].sds[j].seconds-fd.dr[i].second
-                    if (time > 63072000) & (time < 165542400): # then Nimbus 5
-                        time -= 12.5
-                    trueinds.append(np.where(abs(truetime - time)==min(abs(truetime-time)))[0][0])
-                    the_time.append(time)
-                else:
-                    trueinds.append(-1)
-                    the_time.append(-999)
+        if swath_times is None:
+            swath_times = self.get_swath_times(fd)
+        the_time = np.copy(swath_times)
+        good = the_time != -999
+        the_time[good & (the_time > 63072000) & (the_time < 165542400)] -= 12.5 # then Nimbus 5
+        after = np.clip(np.searchsorted(truetime, the_time[good]), 1, max(len(truetime) - 1, 1))
+        before = after - 1
+        if len(truetime) == 1:
+            after = before
+        nearest = np.where(the_time[good] - truetime[before] <= truetime[after] - the_time[good], before, after)
+        trueinds = np.zeros(len(the_time), dtype=np.int64)
+        trueinds.fill(-1)
+        trueinds[good] = nearest
         return truetime, trueinds, the_time
     def get_channel(self, obj):
-        retval = 'unknown'
-        if obj.od.dref == 115:
-            retval = 'window'
-        elif obj.od.dref == 67:
-            retval = 'vapour'
-        return retval
-    def get_time_lims(self, obj):
-        times = []
-        for i in range(len(obj.dr)):
-            t_base = self.get_tbase(obj, i)
-            for j in range(len(obj.dr[i].sds)):
-                if obj.dr[i].sds[j].seconds != -999: # times WILL NOT include all entries if there are bad entries!
-                    times.append(t_base+obj.dr[i].sds[j].seconds-obj.dr[i].second)
-                else:
-                    pass
+        return channel_of(obj.od.dref)
+    def get_swath_times(self, obj):
+        """Inputs:
+            - obj; the Data (or Data2) object for the file
+        Outputs:
+            - times; the time of every swath in the columns, in seconds since 1970/01/01 00:00:00. Swaths without a
+              time, or which were not read or kept (see Swath_Columns.swath_exists), are -999
+        The times are worked out for all swaths at once from the record base times. The Nimbus 5 correction is not
+        applied here (see tdims)."""
+        cols = obj.columns
+        rec = cols.record_of()
+        t_base = obj.od.get_tbase(cols.nday, cols.hour, cols.minute, cols.second)
+        times = t_base[rec] + cols.seconds - cols.second[rec]
+        times[(cols.seconds == -999) | ~cols.swath_exists()] = -999
+        return times
+    def get_time_lims(self, obj, swath_times=None):
+        if swath_times is None:
+            swath_times = self.get_swath_times(obj)
+        times = swath_times[swath_times != -999] # times WILL NOT include all entries if there are bad entries!
         t0 = min(times)
         time0 = dt.datetime(1970, 01, 01) + dt.timedelta(seconds=t0)
         t1 = max(times)
         time1 = dt.datetime(1970, 01, 01) + dt.timedelta(seconds=t1)
         return time0, time1
     def get_tbase(self, obj, ind):
-        day_diff = obj.dr[ind].nday - obj.od.nday_start
-        hour_diff = obj.dr[ind].hour - obj.od.start_hour
-        min_diff = obj.dr[ind].minute - obj.od.start_minute
-        sec_diff = obj.dr[ind].second - obj.od.start_second
-        # second is repeated in sd.second, so subtract it from tbase
-        seconds = (86400*day_diff) + (3600*hour_diff) + (60*min_diff) + sec_diff
-        delta = obj.od.start_datetime - dt.datetime(1970, 01, 01)
-        tbase = (delta.days*86400) + (delta.seconds + seconds) + (delta.microseconds/1000000.)
-        return tbase
+        return obj.od.get_tbase(obj.dr[ind].nday, obj.dr[ind].hour, obj.dr[ind].minute, obj.dr[ind].second)
+    def record_rows(self, fd):
+        """Returns the index in truetime of each record (the row of its first kept swath)."""
+        spr = fd.od.swaths_per_rec
+        n_recs = fd.columns.n_recs
+        first = np.argmax(fd.columns.swath_exists()[:n_recs*spr].reshape(n_recs, spr), axis=1)
+        return self.trueinds[spr*np.arange(n_recs) + first]
+    def swath_rows(self, fd, start=0, stop=None):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+            - start, stop; only the swaths in rows start to stop of truetime are returned (default: all rows)
+        Outputs:
+            - swaths; the index in fd.columns of each swath read from the file
+            - rows; the index in truetime of each of those swaths, counted from start
+        Swaths without a time (trueinds of -1) are put in the last row of truetime."""
+        if stop is None:
+            stop = len(self.truetime)
+        swaths = np.nonzero(fd.columns.swath_exists())[0]
+        rows = self.trueinds[swaths] % len(self.truetime)
+        keep = (rows >= start) & (rows < stop)
+        return swaths[keep], rows[keep] - start
+    def scene_block(self, fd, start, stop, ellipsoid=True, workers=None):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+            - start, stop; the rows of truetime to make
+            - ellipsoid, workers; passed to geoloc2 (default=True, None)
+        Outputs:
+            - block; a dictionary of the (stop-start, swath_width) scene arrays for those rows, keyed by the names
+              they are given in Fields (see scene_names). Only the products of this Fields object are made
+        Only the rows asked for are held in memory, so a file can be written a block of scanlines at a time.
+        The per-scanline values carried forward in geoloc2 are worked out once over the whole file (see
+        line_geometry), so the blocks are the same as the matching rows of the whole scene. With tie_points, each
+        block is interpolated from tie points of its own, so the geolocated arrays can differ slightly from those
+        of the whole scene."""
+        block = {}
+        if 'scanlines' in self.stages:
+            timer = self.stats.start('scanlines')
+            big_arrays = self.set_big_arrays(fd, start, stop, 'full_coords' in self.stages)
+            block.update({'data': big_arrays[0], 'lats': big_arrays[1], 'lons': big_arrays[2]})
+            self.stats.stop(timer)
+        if 'geolocation' in self.stages:
+            timer = self.stats.start('geolocation')
+            lons, lats, alts, solzen, solaz, solalt, satzen, sataz = self.geoloc2(fd, ellipsoid, start, stop, workers,
+                                                                                  'solar_angles' in self.stages,
+                                                                                  'satellite_angles' in self.stages)
+            self.stats.stop(timer)
+            block.update({'lats2': lats, 'lons2': lons, 'sol_zen': solzen, 'sat_zen': satzen, 'sol_az': solaz,
+                          'sat_az': sataz})
+        return dict([(name, block[name]) for name in self.products])
     def set_temps(self, fd):
+        cols = fd.columns
+        rows = self.record_rows(fd)
+        n = len(rows)
         array = np.zeros(len(self.truetime))
         array.fill(-999)
-        cell_temps = np.copy(array)
-        electro_temps = np.copy(array)
-        ref_a = np.copy(array)
-        ref_b = np.copy(array)
-        ref_c = np.copy(array)
-        ref_d = np.copy(array)
-        for i in range(len(fd.dr)):
-            ind = self.trueinds[(fd.od.swaths_per_rec*i)]
-            cell_temps[ind] = fd.dr[i].cell_temp
-            electro_temps[ind] = fd.dr[i].electro_temp
-            ref_a[ind] = fd.dr[i].ref_a
-            ref_b[ind] = fd.dr[i].ref_b
-            ref_c[ind] = fd.dr[i].ref_c
-            ref_d[ind] = fd.dr[i].ref_d
-        return (cell_temps, electro_temps, ref_a, ref_b, ref_c, ref_d)
+        temps = []
+        for name in ('cell_temp', 'electro_temp', 'ref_a', 'ref_b', 'ref_c', 'ref_d'):
+            temp = np.copy(array)
+            temp[rows] = getattr(cols, name)[:n]
+            temps.append(temp)
+        return tuple(temps)
     def set_errors(self, fd):
+        cols = fd.columns
+        rows = self.record_rows(fd)
+        n = len(rows)
         array = np.zeros(len(self.truetime))
         array.fill(-999)
-        roll_error = np.copy(array)
-        pitch_error = np.copy(array)
-        yaw_error = np.copy(array)
-        for i in range(len(fd.dr)):
-            ind = self.trueinds[(fd.od.swaths_per_rec*i)]
-            roll_error[ind] = fd.dr[i].roll_error
-            pitch_error[ind] = fd.dr[i].pitch_error
-            yaw_error[ind] = fd.dr[i].yaw_error
-        return (roll_error, pitch_error, yaw_error)
+        errors = []
+        for name in ('roll_error', 'pitch_error', 'yaw_error'):
+            error = np.copy(array)
+            error[rows] = getattr(cols, name)[:n]
+            errors.append(error)
+        return tuple(errors)
     def set_rest(self, fd):
+        cols = fd.columns
+        rec_rows = self.record_rows(fd)
+        swaths, rows = self.swath_rows(fd)
         array = np.zeros(len(self.truetime))
         array.fill(-999)
         height = np.copy(array)
@@ -1041,141 +1268,184 @@ class Fields():
         sslons = np.copy(array)
         dpops = np.copy(array)
         flags = np.zeros((len(self.truetime), 9))
-        for i in range(len(fd.dr)):
-            ind = self.trueinds[(fd.od.swaths_per_rec*i)]
-            height[ind] = fd.dr[i].height
-            for j in range(len(fd.dr[i].sds)):
-                ind = self.trueinds[(fd.od.swaths_per_rec*i)+j]
-                sslats[ind] = fd.dr[i].sds[j].subsat_lat
-                sslons[ind] = fd.dr[i].sds[j].subsat_lon
-                dpops[ind] = fd.dr[i].sds[j].data_pop
-                flags[ind] = fd.dr[i].sds[j].flags
+        height[rec_rows] = cols.height[:len(rec_rows)]
+        sslats[rows] = cols.subsat_lat[swaths]
+        sslons[rows] = cols.subsat_lon[swaths]
+        dpops[rows] = cols.data_pop[swaths]
+        flags[rows] = cols.flags[swaths]
         return height, sslats, sslons, flags, dpops
     def set_small_arrays(self, fd):
+        cols = fd.columns
+        swaths, rows = self.swath_rows(fd)
         array = np.zeros((len(self.truetime), fd.od.locator_no))
         array.fill(-999)
         nads = np.copy(array)
         lats = np.copy(array)
         lons = np.copy(array)
-        for i in range(len(fd.dr)):
-            for j in range(len(fd.dr[i].sds)):
-                ind = self.trueinds[(fd.od.swaths_per_rec*i)+j]
-                nads[ind] = fd.dr[i].anchor_nadir_angles
-                lats[ind] = fd.dr[i].sds[j].anchor_lats
-                lons[ind] = fd.dr[i].sds[j].anchor_lons
+        nads[rows] = cols.anchor_nadir_angles[cols.record_of()[swaths]]
+        lats[rows] = cols.anchor_lats[swaths]
+        lons[rows] = cols.anchor_lons[swaths]
         return nads, lats, lons
-    def set_big_arrays(self, fd):
-        array = np.zeros((len(self.truetime), self.swath_width))
+    def set_big_arrays(self, fd, start=0, stop=None, coords=True):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+            - start, stop; the rows of truetime to make (default: all rows)
+            - coords; a boolean - False leaves out the full coordinates, which are then None (default=True)
+        Outputs:
+            - data, lats, lons; the (stop-start, swath_width) arrays of the brightness temperatures and the
+              interpolated coordinates of those rows
+        If the columns of fd hold no scanlines (as those of a lazy Data object), only the records with a swath in
+        the rows are decoded, through fd.dr (see scanline_block)."""
+        cols = fd.columns
+        swaths, rows = self.swath_rows(fd, start, stop)
+        array = np.zeros((len(self.truetime[start:stop]), self.swath_width))
         array.fill(-999)
+        if cols.scanlines:
+            lines = {'data': cols.data[swaths], 'full_lats': cols.full_lats[swaths],
+                     'full_lons': cols.full_lons[swaths]}
+        else:
+            lines = self.scanline_block(fd, swaths, coords)
         data = np.copy(array)
+        data[rows] = self.make_fit(lines['data'], cols.data_pop[swaths])
+        if not coords:
+            return data, None, None
         lats = np.copy(array)
         lons = np.copy(array)
-        for i in range(len(fd.dr)):
-            for j in range(len(fd.dr[i].sds)):
-                ind = self.trueinds[(fd.od.swaths_per_rec*i)+j]
-                scanline = self.make_fit(fd.dr[i].sds[j].data)
-                latline = self.make_fit(fd.dr[i].sds[j].full_lats)
-                lonline = self.make_fit(fd.dr[i].sds[j].full_lons)
-                data[ind] = scanline
-                lats[ind] = latline
-                lons[ind] = lonline
-        lats[lats!=-999] -= 90
-        lons[lons!=-999] = 360 - lons[lons!=-999]
-        lons[(lons!=-999)&(lons>180)] -= 360
-        return data, lats, lons
-    def make_fit(self, line):
-        while len(line) < self.swath_width:
-            line = np.hstack((line, [-999]))
-        return line
-    def geoloc2(self, fd):
+        lats[rows] = self.make_fit(lines['full_lats'], cols.data_pop[swaths])
+        lons[rows] = self.make_fit(lines['full_lons'], cols.data_pop[swaths])
+        return data, geographic_lats(lats), geographic_lons(lons)
+    def scanline_block(self, fd, swaths, coords=True):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+            - swaths; the indices in fd.columns of the swaths wanted
+            - coords; a boolean - False leaves out the full coordinates (default=True)
+        Outputs:
+            - lines; a dictionary of the (len(swaths), swath_width) arrays of the data (and full_lats and
+              full_lons) of the swaths, as they would be held in Swath_Columns
+        Each record holding one of the swaths is decoded from fd.dr (through its cache, if it is lazy), so that only
+        the records of a block of scanlines are held in full at once."""
+        names = Swath_Columns.swath_lines if coords else ('data',)
+        lines = {}
+        for name in names:
+            lines[name] = np.zeros((len(swaths), self.swath_width))
+            lines[name].fill(-999)
+        spr = fd.od.swaths_per_rec
+        for k in range(len(swaths)):
+            sd = fd.dr[swaths[k] // spr].sds[swaths[k] % spr]
+            for name in names:
+                line = getattr(sd, name)[:self.swath_width]
+                lines[name][k, :len(line)] = line
+        return lines
+    def make_fit(self, lines, pops):
+        """Inputs:
+            - lines; an (n, width) array of scanlines
+            - pops; the data population of each scanline
+        Outputs:
+            - fitted; the (n, swath_width) array of the scanlines, with -999 past the data population of each"""
+        fitted = np.zeros((len(lines), self.swath_width))
+        fitted.fill(-999)
+        width = min(lines.shape[1], self.swath_width)
+        fitted[:, :width] = lines[:, :width]
+        fitted[np.arange(self.swath_width)[np.newaxis, :] >= np.asarray(pops)[:, np.newaxis]] = -999
+        return fitted
+    def geoloc2(self, fd, ellipsoid=True, start=0, stop=None, workers=None, solar=True, satellite=True):
+        geometry = self.block_geometry(fd, start, stop)
+        sol_alt = np.zeros((len(geometry[0]), self.swath_width))
+        sol_alt.fill(-999)
+        lons, lats, alts, sol_zen, sol_az, sat_zen, sat_az = geolocate_scene(*geometry + (self.swath_width, ellipsoid,
+                                                                                        workers, solar, satellite,
+                                                                                        self.tie_points))
+        lons[np.isnan(lons)] = -999
+        lats[np.isnan(lats)] = -999
+        alts[np.isnan(alts)] = -999
+        sat_zen[np.isnan(sat_zen)] = -999
+        sol_zen[np.isnan(sol_zen)] = -999
+        return lons, lats, alts, sol_zen, sol_az, sol_alt, sat_zen, sat_az
+    def tie_point_grid(self, fd, products, ellipsoid=True, workers=None):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+            - products; the geolocated products to make, out of 'lats2', 'lons2', 'sol_zen', 'sol_az', 'sat_zen'
+              and 'sat_az'
+            - ellipsoid, workers; as in geoloc2 (default=True, None)
+        Outputs:
+            - rows, cols; the scanline and pixel indices of the tie points
+            - grid; a dictionary of the (len(rows), len(cols)) arrays of the products at the tie points
+        Works out the pyorbital coordinates and angles at the tie points of self.tie_points only (see
+        geolocation.geolocate_tie_points), so that they can be stored without the full resolution arrays."""
+        stages = needed_stages(products)
+        if 'scanlines' in stages:
+            raise ValueError('Only the pyorbital coordinates and the angles can be made at tie points')
+        timer = self.stats.start('geolocation')
+        rows, cols, grid = geolocate_tie_points(*self.block_geometry(fd) + (self.swath_width, self.tie_points,
+                                                                           ellipsoid, workers,
+                                                                           'solar_angles' in stages,
+                                                                           'satellite_angles' in stages))
+        self.stats.stop(timer)
+        for name in ('lons', 'lats', 'sat_zen', 'sol_zen'):
+            grid[name][np.isnan(grid[name])] = -999
+        names = {'lats2': 'lats', 'lons2': 'lons', 'sol_zen': 'sol_zen', 'sol_az': 'sol_az', 'sat_zen': 'sat_zen',
+                 'sat_az': 'sat_az'}
+        return rows, cols, dict([(name, grid[names[name]]) for name in products])
+    def block_geometry(self, fd, start=0, stop=None):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+            - start, stop; the rows of truetime to geolocate (default: all rows)
+        Outputs:
+            - the line_geometry of those rows, sliced from self.geometry (which is made here if the products of
+              this Fields object did not need it)"""
+        if self.geometry is None:
+            self.geometry = self.line_geometry(fd)
+        t, line_pops, line_nads, line_rolls, line_pitches, line_yaws, nimbus, mirror = self.geometry
+        return (t[start:stop], line_pops[start:stop], line_nads[start:stop], line_rolls[start:stop],
+                line_pitches[start:stop], line_yaws[start:stop], nimbus, mirror)
+    def line_geometry(self, fd):
+        """Inputs:
+            - fd; the Data (or Data2) object for the file
+        Outputs:
+            - t, line_pops, line_nads, line_rolls, line_pitches, line_yaws, nimbus, mirror; the scanline inputs
+              of geolocation.geolocate_scene for every row of truetime
+        Scanlines without a good attitude, nadir angles or data population are given the latest good one before
+        them."""
         t = self.truetime
-        array = np.zeros((len(self.truetime), self.swath_width))
-        array.fill(-999)
-        lats = np.copy(array)
-        lons = np.copy(array)
-        alts = np.copy(array)
-        sat_zen = np.copy(array)
-        sol_zen = np.copy(array)
-        sat_az = np.copy(array)
-        sol_az = np.copy(array)
-        sol_alt = np.copy(array)
-        inds = self.trueinds
+        inds = self.trueinds[fd.columns.swath_exists()]
         roll = self.roll_errors
         pitch = self.pitch_errors
         yaw = self.yaw_errors
         nads = self.nadangs
         dpop = self.dpops
-        height = self.heights
         nimbus = fd.filename.split('/')[-1][0] + fd.filename.split('/')[-1][6]
         # find the first non-fill-valued entries for 
         # all relevant components in terms of increasing index:
-        current_roll = self.get_initial(roll, inds) - 90
-        current_pitch = self.get_initial(pitch, inds) - 90
-        current_yaw = self.get_initial(yaw, inds)  - 90
-        current_nads = self.get_initial(nads, inds)
-        current_pop = self.get_initial(dpop, inds)
-        current_height = self.get_initial(height, inds)
+        initial_roll = self.get_initial(roll, inds)
+        initial_pitch = self.get_initial(pitch, inds)
+        initial_yaw = self.get_initial(yaw, inds)
+        initial_nads = self.get_initial(nads, inds)
+        initial_pop = self.get_initial(dpop, inds)
         if fd.od.mirror_rot != -999:
             mirror = 360/fd.od.mirror_rot
         else:
             mirror = 1.25
-        for i in range(len(t)):
-            if roll[i]!=-999:
-                current_roll = roll[i] - 90
-            if pitch[i]!=-999:
-                current_pitch = pitch[i] - 90
-            if yaw[i]!=-999:
-                current_yaw = yaw[i] - 90
-            if all(nads[i]!=-999):
-                current_nads = nads[i]
-            if (dpop[i]!=-999) & (dpop[i]!=0):
-                current_pop = dpop[i]
-            if height[i]!=-999:
-                current_height = height[i]
-            if (i == -1) | (current_pop==0):
-                print 'shouldn\'t be here!'
-                pos_time = get_geoloc(t[i], current_pop, current_nads, current_roll, current_pitch, current_yaw, nimbus, mirror)
-                pos_time.fill(-999)
-            else:
-                pos_time = get_geoloc(t[i], current_pop, current_nads, current_roll, current_pitch, current_yaw, nimbus, mirror)
-            lon = pos_time[0]
-            lat = pos_time[1]
-            alt = pos_time[2]
-            while len(lon) < len(lons[0]):
-                lon = np.hstack((lon, -999))
-                lat = np.hstack((lat, -999))
-                alt = np.hstack((alt, -999))
-            lon[np.isnan(lon)] = -999
-            lat[np.isnan(lat)] = -999
-            alt[np.isnan(alt)] = -999
-            lons[i] = lon
-            lats[i] = lat
-            alts[i] = alt
-            print i
-            view_angs = np.linspace(current_nads[-1], current_nads[0], current_pop)
-            for j in range(len(lon)):
-                if (lon[j] == -999) | (lat[j] == -999) | (alt[j] == -999):
-                    sol_zen[i, j] = -999
-                    sat_zen[i, j] = -999
-                    sol_alt[i, j] = -999
-                    sol_az[i, j] = -999
-                    sat_az[i, j] = -999
-                else:
-                    now_dt = dt.datetime(1970, 01, 01) + dt.timedelta(seconds=t[i])
-                    sol_zen[i, j] = astro.sun_zenith_angle(now_dt, lon[j], lat[j])
-                    sol_az[i, j] = np.rad2deg(astro.get_alt_az(now_dt, lon[j], lat[j])[1])
-                    # assuming height should be in km
-                    the_ind = int(current_pop/2)
-                    az, el = orb.get_observer_look(lon[the_ind], lat[the_ind], 
-                                                   alt[the_ind], now_dt, lon[j], lat[j], alt[j])
-                    sat_zen[i, j] = self.totally_zen(view_angs[j], lat[the_ind], lon[the_ind], lat[j], lon[j])
-                    sat_az[i, j] = az
-        lons[np.isnan(lons)] = -999
-        lats[np.isnan(lats)] = -999
-        alts[np.isnan(alts)] = -999
-        sat_zen[np.isnan(sat_zen)] = -999
-        sol_zen[np.isnan(sol_zen)] = -999
-        return lons, lats, alts, sol_zen, sol_az, sol_alt, sat_zen, sat_az
+        # carry the latest good value of each component forward to the scanlines without one:
+        line_rolls = self.forward_fill(roll, roll!=-999, initial_roll) - 90
+        line_pitches = self.forward_fill(pitch, pitch!=-999, initial_pitch) - 90
+        line_yaws = self.forward_fill(yaw, yaw!=-999, initial_yaw) - 90
+        line_nads = self.forward_fill(nads, np.all(nads!=-999, axis=1), initial_nads)
+        line_pops = self.forward_fill(dpop, (dpop!=-999) & (dpop!=0), initial_pop)
+        if any(line_pops == 0):
+            warnings.warn('scanlines without a data population to geolocate with')
+        return t, line_pops, line_nads, line_rolls, line_pitches, line_yaws, nimbus, mirror
+    def forward_fill(self, var, valid, initial):
+        """Inputs:
+            - var; an array with one entry (or row) per scanline
+            - valid; a boolean array - True where the entry of var for that scanline is good
+            - initial; the value to use for the scanlines before the first good one
+        Outputs:
+            - filled; a copy of var in which every bad entry is replaced by the latest good entry before it"""
+        latest = np.where(valid, np.arange(len(var)), -1)
+        latest = np.maximum.accumulate(latest)
+        filled = np.array(var[np.maximum(latest, 0)], dtype=np.float64)
+        filled[latest < 0] = initial
+        return filled
     def get_initial(self, var, inds):
         i = 0
         if type(var[i]) != np.ndarray:
@@ -1192,17 +1462,6 @@ class Fields():
         - sslon; the longitude of the subsatellite point
         - lat; the latitude of the observed point
         - lon; the longitude of the observed point
-        Uses the haversine law to calculate the zenith angle, assuming a spherical earth."""
-        # convert to radians:
-        rsslat = np.deg2rad(sslat)
-        rsslon = np.deg2rad(sslon)
-        rlat = np.deg2rad(lat)
-        rlon = np.deg2rad(lon)
-        # find the angle subtended at the earth's centre using the haversine law:
-        term1 = np.sin((rlon-rsslon)/2)**2
-        term2 = np.cos(rlon)*np.cos(rsslon)*(np.sin((rlat-rsslat)/2)**2)
-        theta = 2*np.arcsin(np.sqrt((term1 + term2)))
-        dtheta = np.rad2deg(theta)
-        # find angle at observation point:
-        return (abs(view_ang) + theta)
+        Uses the haversine law to calculate the zenith angle, assuming a spherical earth (see sat_geometry)."""
+        return view_zenith(view_ang, sslat, sslon, lat, lon)
         
@@ -0,0 +1,166 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+from main import *
+
+def find_TAP_files(paths):
+    """Inputs:
+        - paths; a list of directories, TAP file paths and glob patterns
+    Outputs:
+        - filenames; the sorted list of every TAP file named by paths. Directories are searched recursively"""
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for name in files:
+                    if name.endswith('.TAP'):
+                        filenames.add(os.path.join(root, name))
+        else:
+            for name in glob.glob(path):
+                if os.path.isfile(name):
+                    filenames.add(name)
+    return sorted(filenames)
+
+def output_name(filename, output_dir=None):
+    """Returns the NetCDF4 file name for the TAP file filename - the name used by write_NC_file, moved into
+    output_dir if one is given."""
+    nc_filename = filename.replace('.TAP','_new.nc')
+    if output_dir is not None:
+        nc_filename = os.path.join(output_dir, os.path.basename(nc_filename))
+    return nc_filename
+
+def up_to_date(filename, nc_filename):
+    """Returns True if nc_filename exists and is newer than the TAP file filename."""
+    return os.path.exists(nc_filename) and os.path.getmtime(nc_filename) >= os.path.getmtime(filename)
+
+def read_manifest(manifest):
+    """Inputs:
+        - manifest; the path of a manifest written by convert_files
+    Outputs:
+        - entries; a dictionary of the latest manifest entry for each TAP file. Unreadable lines (e.g. the last
+          line of a run that was killed) are ignored"""
+    entries = {}
+    if manifest is None or not os.path.exists(manifest):
+        return entries
+    for line in open(manifest):
+        try:
+            entry = json.loads(line)
+            entries[entry['input']] = entry
+        except (ValueError, KeyError):
+            continue
+    return entries
+
+def convert_file(job):
+    """Inputs:
+        - job; a (filename, nc_filename, block_size, profile, use_index) tuple
+    Outputs:
+        - entry; a dictionary describing the outcome, as written to the manifest
+    Runs write_NC_file on one file, in a worker process. The output is written under a temporary name and only
+    renamed once it is complete, so a killed run never leaves an output that looks up to date. Errors are caught
+    and returned, so that one bad file does not stop the batch. The stage timings and bad data counts (see
+    instrument.Stats) are kept in the entry, under 'stats'."""
+    filename, nc_filename, block_size, profile, use_index = job
+    entry = {'input': filename, 'output': nc_filename, 'bytes': os.path.getsize(filename)}
+    part_filename = nc_filename + '.part'
+    t = time.time()
+    stats = Stats()
+    try:
+        write_NC_file(filename, part_filename, block_size, profile, stats=stats, use_index=use_index)
+        os.rename(part_filename, nc_filename)
+        entry['status'] = 'ok'
+    except Exception:
+        entry['status'] = 'failed'
+        entry['error'] = traceback.format_exc()
+        if os.path.exists(part_filename):
+            os.remove(part_filename)
+    entry['seconds'] = time.time() - t
+    entry['stats'] = stats.summary()
+    return entry
+
+def convert_files(paths, output_dir=None, workers=None, manifest=None, block_size=None, profile='default',
+                  force=False, use_index=False):
+    """Inputs:
+        - paths; a list of directories, TAP file paths and glob patterns
+        - output_dir; the directory to write the NetCDF4 files to (default: beside each TAP file)
+        - workers; the number of worker processes (default: the number of CPUs)
+        - manifest; the path of a manifest file, with one JSON line appended for each file converted or failed
+          (default: no manifest)
+        - block_size, profile; passed to write_NC_file
+        - force; a boolean - True converts every file, False skips files whose output is up to date (default=False)
+        - use_index; a boolean - True reads each file with its sidecar index, written beside it the first time
+          (see main.write_NC_file) (default=False)
+    Outputs:
+        - entries; the manifest entries for the files converted (or failed) in this run
+    Converts every TAP file in a pool of worker processes. A file is skipped if its output is newer than it and the
+    manifest (if there is one) does not record a failure for it. A run can therefore be stopped and started again,
+    and files which failed are retried. The throughput is reported at the end."""
+    filenames = find_TAP_files(paths)
+    previous = read_manifest(manifest)
+    jobs = []
+    skipped = 0
+    for filename in filenames:
+        nc_filename = output_name(filename, output_dir)
+        failed = previous.get(filename, {}).get('status') == 'failed'
+        if not force and not failed and up_to_date(filename, nc_filename):
+            skipped += 1
+            continue
+        jobs.append((filename, nc_filename, block_size, profile, use_index))
+    if output_dir is not None and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    print '%d files found, %d up to date, %d to convert' % (len(filenames), skipped, len(jobs))
+    entries = []
+    t = time.time()
+    if jobs:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for entry in pool.imap_unordered(convert_file, jobs):
+                entries.append(entry)
+                if manifest is not None:
+                    log = open(manifest, 'a')
+                    log.write(json.dumps(entry) + '\n')
+                    log.close()
+                print '%s %s (%.1f s)' % (entry['status'], entry['input'], entry['seconds'])
+        finally:
+            pool.close()
+            pool.join()
+    report_throughput(entries, time.time() - t)
+    return entries
+
+def report_throughput(entries, elapsed):
+    """Inputs:
+        - entries; the manifest entries for the files converted (or failed) in a run
+        - elapsed; the wall clock time (in seconds) taken by the run
+    Prints the number of files converted and failed, and the throughput in files per hour and (TAP) MB per second."""
+    done = [entry for entry in entries if entry['status'] == 'ok']
+    failed = len(entries) - len(done)
+    megabytes = sum([entry['bytes'] for entry in done]) / 1e6
+    if elapsed > 0:
+        print '%d converted, %d failed in %.1f s: %.1f files/hour, %.2f MB/s' % (len(done), failed, elapsed,
+                                                                                 3600*len(done)/elapsed,
+                                                                                 megabytes/elapsed)
+    else:
+        print '%d converted, %d failed' % (len(done), failed)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Convert Nimbus 4, 5 and 6 TAP files to NetCDF4.')
+    parser.add_argument('paths', nargs='+', help='TAP files, directories (searched recursively) or glob patterns')
+    parser.add_argument('-o', '--output-dir', help='directory for the NetCDF4 files (default: beside each TAP file)')
+    parser.add_argument('-j', '--workers', type=int, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-m', '--manifest', help='file to record each conversion in, one JSON line per file')
+    parser.add_argument('-b', '--block-size', type=int, help='write the scene this many scanlines at a time')
+    parser.add_argument('-p', '--profile', default='default', choices=sorted(OUTPUT_PROFILES),
+                        help='output storage profile (default: default)')
+    parser.add_argument('-f', '--force', action='store_true', help='convert files even if their output is up to date')
+    parser.add_argument('-i', '--index', action='store_true',
+                        help='read each file with a sidecar index of its records, written beside it the first time')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    convert_files(args.paths, args.output_dir, args.workers, args.manifest, args.block_size, args.profile,
+                  args.force, args.index)
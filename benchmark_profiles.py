@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+from main import *
+
+def time_reads(nc_filename):
+    """Inputs:
+        - nc_filename; the path of a NetCDF4 file written by write_NC_file
+    Outputs:
+        - whole; the time (in seconds) taken to read every variable in full
+        - lines; the time (in seconds) taken to read the brightness temperatures one scanline at a time"""
+    nc = Dataset(nc_filename, 'r')
+    t = time.time()
+    for name in nc.variables:
+        nc.variables[name][:]
+    whole = time.time() - t
+    bbt = nc.variables['BBT']
+    t = time.time()
+    for i in range(len(nc.dimensions['Y'])):
+        bbt[i]
+    lines = time.time() - t
+    nc.close()
+    return whole, lines
+
+def benchmark_profiles(filename, profiles=None, repeats=3):
+    """Inputs:
+        - filename; a string corresponding to the complete path to a Nimbus 4, 5 or 6 TAP file
+        - profiles; the names of the OUTPUT_PROFILES to compare (default: all of them)
+        - repeats; the number of times each write and read is timed - the fastest is kept (default=3)
+    Outputs:
+        - results; a list of (profile, write time, file size in bytes, whole-file read time, per-scanline read
+          time) tuples
+    The TAP file is decoded once, and the same Fields object is then written with each profile, so that the
+    write times only include the NetCDF output."""
+    if profiles is None:
+        profiles = sorted(OUTPUT_PROFILES)
+    file_data = read_TAP_file(filename)
+    data_fields = Fields(file_data)
+    out_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for profile in profiles:
+            nc_filename = os.path.join(out_dir, profile + '.nc')
+            writes = []
+            reads = []
+            for i in range(repeats):
+                t = time.time()
+                write_fields(file_data, data_fields, nc_filename, profile=profile)
+                writes.append(time.time() - t)
+                reads.append(time_reads(nc_filename))
+            results.append((profile, min(writes), os.path.getsize(nc_filename), min([r[0] for r in reads]),
+                            min([r[1] for r in reads])))
+    finally:
+        shutil.rmtree(out_dir)
+    return results
+
+if __name__ == '__main__':
+    for filename in sys.argv[1:]:
+        print filename
+        print '%-10s %10s %12s %10s %12s' % ('profile', 'write (s)', 'size (bytes)', 'read (s)', 'per-line (s)')
+        for result in benchmark_profiles(filename):
+            print '%-10s %10.3f %12d %10.3f %12.3f' % result
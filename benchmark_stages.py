@@ -0,0 +1,136 @@
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from main import *
+from synthetic_tap import *
+
+# the stages timed by benchmark_stages, in the order they are run:
+STAGES = ('framing', 'word_decoding', 'swath_construction', 'lagrange', 'fields', 'geolocation', 'netcdf')
+
+def time_stage(function, repeats=3):
+    """Inputs:
+        - function; a function of no arguments running one stage
+        - repeats; the number of times it is run (default=3)
+    Outputs:
+        - seconds; the fastest wall clock time taken
+        - result; what the function returned on its last run"""
+    times = []
+    for i in range(repeats):
+        t = time.time()
+        result = function()
+        times.append(time.time() - t)
+    return min(times), result
+
+def decode_words(data, record_numbers):
+    """Decodes every word of the data records record_numbers of data (a lazy Data or Data2 object) at once, as the
+    first step of making each Data_Rec, and returns the number of words made."""
+    n_words = 0
+    for i in record_numbers:
+        the_bytes, goodness = data.get_bytes_and_goodness(record_bytes(data.buffer, data.records, i))
+        if isinstance(data, Data2):
+            n_words += len(read_words_n56(the_bytes))
+        else:
+            n_words += len(read_words_n4(the_bytes, goodness))
+    return n_words
+
+def interpolate_records(records):
+    """Interpolates the full coordinates of every swath in records (a list of Data_Rec objects)."""
+    for record in records:
+        record.set_full_coords()
+
+def benchmark_stages(filename, repeats=3, workers=None):
+    """Inputs:
+        - filename; a string corresponding to the complete path to a Nimbus 4, 5 or 6 TAP file
+        - repeats; the number of times each stage is timed - the fastest is kept (default=3)
+        - workers; the number of processes to geolocate the scene with (default=None, i.e. this process only)
+    Outputs:
+        - result; a dictionary describing the file (its size, records, scanlines and pixels) and holding the
+          'seconds' taken by each of the STAGES
+    Each stage is timed on its own, with its inputs made beforehand:
+        - framing; loading the file and scanning its header/footer framing (tap_records.scan_records)
+        - word_decoding; making the 36 bit words of every data record (tap_words.read_words_n4/n56)
+        - swath_construction; making the Data_Rec and Swath_Data objects and the Swath_Columns, without the full
+          coordinates (Data.decode_columns)
+        - lagrange; interpolating the full coordinates of every record (Data_Rec.set_full_coords)
+        - fields; putting the records onto the scanline grid (Fields, without the scene, and
+          Fields.set_big_arrays)
+        - geolocation; the pyorbital coordinates and the angles (Fields.geoloc2)
+        - netcdf; writing every variable to a NetCDF4 file (write_fields)"""
+    seconds = {}
+    seconds['framing'], records = time_stage(lambda: scan_records(load_file(filename)), repeats)
+    data = read_TAP_file(filename, lazy=True)
+    record_numbers = data.dr.record_numbers
+    seconds['word_decoding'], n_words = time_stage(lambda: decode_words(data, record_numbers), repeats)
+    data.full_coords = False
+    seconds['swath_construction'], columns = time_stage(lambda: data.decode_columns(record_numbers), repeats)
+    data_recs = [data.decode_record(i) for i in record_numbers]
+    seconds['lagrange'] = time_stage(lambda: interpolate_records(data_recs), repeats)[0]
+    file_data = read_TAP_file(filename)
+    def make_fields():
+        data_fields = Fields(file_data, scene=False, workers=workers)
+        big_arrays = data_fields.set_big_arrays(file_data, 0, len(data_fields.truetime))
+        return data_fields, big_arrays
+    seconds['fields'], (data_fields, big_arrays) = time_stage(make_fields, repeats)
+    seconds['geolocation'], geolocated = time_stage(lambda: data_fields.geoloc2(file_data, workers=workers), repeats)
+    data_fields.data, data_fields.lats, data_fields.lons = big_arrays
+    (data_fields.lons2, data_fields.lats2, alts, data_fields.sol_zen, data_fields.sol_az, sol_alt,
+     data_fields.sat_zen, data_fields.sat_az) = geolocated
+    out_dir = tempfile.mkdtemp()
+    try:
+        nc_filename = os.path.join(out_dir, 'benchmark.nc')
+        seconds['netcdf'] = time_stage(lambda: write_fields(file_data, data_fields, nc_filename), repeats)[0]
+    finally:
+        shutil.rmtree(out_dir)
+    name = filename.split('/')[-1]
+    return {'filename': filename, 'nimbus': name[0] + name[6], 'bytes': os.path.getsize(filename),
+            'records': len(record_numbers), 'words': n_words, 'scanlines': len(data_fields.truetime),
+            'pixels': int(np.sum(data_fields.data != -999)), 'repeats': repeats, 'seconds': seconds}
+
+def benchmark_synthetic(nimbus=('N4', 'N5', 'N6'), n_records=100, data_pop=400, repeats=3, workers=None):
+    """Inputs:
+        - nimbus; the satellites to make synthetic files for (default=('N4', 'N5', 'N6'))
+        - n_records, data_pop; the size of each file (see synthetic_tap.write_synthetic_TAP_file) (default=100, 400)
+        - repeats, workers; as in benchmark_stages
+    Outputs:
+        - results; the benchmark_stages result for each file
+    Writes a synthetic TAP file for each satellite to a temporary directory and benchmarks it, so that the same
+    benchmark can be run anywhere without the archive."""
+    out_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for satellite in nimbus:
+            filename = write_synthetic_TAP_file(synthetic_filename(out_dir, satellite), n_records, data_pop)
+            results.append(benchmark_stages(filename, repeats, workers))
+    finally:
+        shutil.rmtree(out_dir)
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Time each stage of reading and converting TAP files, as JSON.')
+    parser.add_argument('paths', nargs='*', help='TAP files to benchmark (default: synthetic files)')
+    parser.add_argument('-n', '--nimbus', nargs='+', default=['N4', 'N5', 'N6'], choices=('N4', 'N5', 'N6'),
+                        help='satellites to make synthetic files for (default: all)')
+    parser.add_argument('--records', type=int, default=100, help='data records in each synthetic file (default: 100)')
+    parser.add_argument('--data-pop', type=int, default=400, help='pixels in each synthetic swath (default: 400)')
+    parser.add_argument('-r', '--repeats', type=int, default=3, help='times each stage is run (default: 3)')
+    parser.add_argument('-j', '--workers', type=int, help='number of processes to geolocate with')
+    parser.add_argument('-o', '--output', help='file to write the JSON results to (default: standard output)')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if args.paths:
+        results = [benchmark_stages(filename, args.repeats, args.workers) for filename in args.paths]
+    else:
+        results = benchmark_synthetic(args.nimbus, args.records, args.data_pop, args.repeats, args.workers)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output is None:
+        print text
+    else:
+        output = open(args.output, 'w')
+        output.write(text + '\n')
+        output.close()
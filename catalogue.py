@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import warnings
+import traceback
+import multiprocessing
+from main import *
+from batch import find_TAP_files
+
+CATALOGUE_COLUMNS = (
+    ('filename', 'TEXT PRIMARY KEY'),
+    ('size', 'INTEGER'),
+    ('mtime', 'REAL'),
+    ('status', 'TEXT'),
+    ('error', 'TEXT'),
+    ('nimbus', 'TEXT'),
+    ('channel', 'TEXT'),
+    ('dref', 'INTEGER'),
+    ('orbit_no', 'INTEGER'),
+    ('station_code', 'INTEGER'),
+    ('start_time', 'REAL'),
+    ('end_time', 'REAL'),
+    ('min_subsat_lat', 'REAL'), # the subsatellite track box, in degrees north and east (see main.find_track_box)
+    ('max_subsat_lat', 'REAL'),
+    ('min_subsat_lon', 'REAL'), # greater than max_subsat_lon if the track crosses the dateline
+    ('max_subsat_lon', 'REAL'),
+)
+CATALOGUE_VERSION = 2 # kept in the user_version of the database - 1 held the track box in the units of the TAP file
+COMMIT_EVERY = 100 # files catalogued between commits, so that little is lost if a build is stopped
+
+def open_catalogue(database):
+    """Inputs:
+        - database; the path of the SQLite catalogue (made if it does not exist)
+    Outputs:
+        - connection; an sqlite3 connection to the catalogue, with its table and indices in place
+    A catalogue made by an older version (see CATALOGUE_VERSION) is emptied, so that build_catalogue scans every
+    file again."""
+    connection = sqlite3.connect(database)
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    if version != CATALOGUE_VERSION:
+        tables = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'files'")
+        if tables.fetchall():
+            warnings.warn('emptying out of date catalogue %s - it must be built again' % database)
+            connection.execute('DROP TABLE files')
+        connection.execute('PRAGMA user_version = %d' % CATALOGUE_VERSION)
+    columns = ', '.join(['%s %s' % column for column in CATALOGUE_COLUMNS])
+    connection.execute('CREATE TABLE IF NOT EXISTS files (%s)' % columns)
+    connection.execute('CREATE INDEX IF NOT EXISTS files_time ON files (start_time, end_time)')
+    connection.execute('CREATE INDEX IF NOT EXISTS files_orbit ON files (nimbus, orbit_no)')
+    connection.commit()
+    return connection
+
+def seconds_since_1970(the_time):
+    """Returns the datetime the_time in seconds since 1970/01/01 00:00:00 (None if the_time is None)."""
+    if the_time is None:
+        return None
+    delta = the_time - dt.datetime(1970, 01, 01)
+    return (delta.days*86400) + delta.seconds + (delta.microseconds/1000000.)
+
+def catalogue_file(filename):
+    """Inputs:
+        - filename; the path of a TAP file
+    Outputs:
+        - entry; a dictionary of the CATALOGUE_COLUMNS for the file
+    Scans the file (see main.scan_TAP_file) in a worker process. The times are those of the first and last swaths
+    in the file, in seconds since 1970/01/01 00:00:00. Errors are caught and recorded in the entry, so that one bad
+    file does not stop the build."""
+    stat = os.stat(filename)
+    entry = dict([(name, None) for name, kind in CATALOGUE_COLUMNS])
+    entry.update({'filename': filename, 'size': stat.st_size, 'mtime': stat.st_mtime})
+    try:
+        summary = scan_TAP_file(filename, track=True)
+        for name in ('nimbus', 'channel', 'min_subsat_lat', 'max_subsat_lat', 'min_subsat_lon', 'max_subsat_lon'):
+            entry[name] = summary[name]
+        for name in ('dref', 'orbit_no', 'station_code'):
+            entry[name] = int(summary[name])
+        entry['start_time'] = seconds_since_1970(summary['first_time'])
+        entry['end_time'] = seconds_since_1970(summary['last_time'])
+        entry['status'] = 'ok'
+    except Exception:
+        entry['status'] = 'failed'
+        entry['error'] = traceback.format_exc()
+    return entry
+
+def build_catalogue(paths, database, workers=None, force=False):
+    """Inputs:
+        - paths; a list of directories, TAP file paths and glob patterns (see batch.find_TAP_files)
+        - database; the path of the SQLite catalogue
+        - workers; the number of worker processes (default: the number of CPUs)
+        - force; a boolean - True scans every file, False only scans files which are new, have changed size or
+          mtime since they were catalogued, or failed last time (default=False)
+    Outputs:
+        - entries; the entries for the files scanned in this run
+    Scans the TAP files in a pool of worker processes and records them in the catalogue. The catalogue is refreshed
+    incrementally: unchanged files are not opened, and files under paths which no longer exist are removed."""
+    connection = open_catalogue(database)
+    known = {}
+    for filename, size, mtime, status in connection.execute('SELECT filename, size, mtime, status FROM files'):
+        known[filename] = (size, mtime, status)
+    filenames = find_TAP_files(paths)
+    jobs = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        if force or known.get(filename) != (stat.st_size, stat.st_mtime, 'ok'):
+            jobs.append(filename)
+    roots = [os.path.abspath(path) for path in paths if os.path.isdir(path)]
+    gone = [filename for filename in known if not os.path.exists(filename) and
+            any([os.path.abspath(filename).startswith(os.path.join(root, '')) for root in roots])]
+    connection.executemany('DELETE FROM files WHERE filename = ?', [(filename,) for filename in gone])
+    print '%d files found, %d up to date, %d to scan, %d removed' % (len(filenames), len(filenames) - len(jobs),
+                                                                   len(jobs), len(gone))
+    names = [name for name, kind in CATALOGUE_COLUMNS]
+    insert = 'INSERT OR REPLACE INTO files (%s) VALUES (%s)' % (', '.join(names), ', '.join(['?']*len(names)))
+    entries = []
+    t = time.time()
+    if jobs:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for entry in pool.imap_unordered(catalogue_file, jobs, 16):
+                entries.append(entry)
+                connection.execute(insert, [entry[name] for name in names])
+                if len(entries) % COMMIT_EVERY == 0:
+                    connection.commit()
+                if entry['status'] != 'ok':
+                    print 'failed %s' % entry['filename']
+        finally:
+            pool.close()
+            pool.join()
+    connection.commit()
+    connection.close()
+    failed = len([entry for entry in entries if entry['status'] != 'ok'])
+    print '%d scanned, %d failed in %.1f s' % (len(entries) - failed, failed, time.time() - t)
+    return entries
+
+def query_catalogue(database, t0=None, t1=None, bbox=None, nimbus=None, channel=None):
+    """Inputs:
+        - database; the path of the SQLite catalogue
+        - t0, t1; the start and end of a time window, in seconds since 1970/01/01 00:00:00 (default: no limit)
+        - bbox; a (min_lat, max_lat, min_lon, max_lon) box, in degrees north and east. A box with min_lon greater
+          than max_lon crosses the dateline (default: no limit)
+        - nimbus; 'N4', 'N5' or 'N6' (default: any)
+        - channel; 'window', 'vapour' or 'unknown' (default: any)
+    Outputs:
+        - filenames; the sorted list of catalogued files which overlap the time window and whose subsatellite
+          track box overlaps bbox
+    Only the catalogue is read. Files which failed to scan, or have no swath times (or track) when a window (or
+    box) is given, are never returned. The latitudes and times are matched in SQL, and the longitudes (which
+    either box may wrap across the dateline) afterwards, with lon_ranges_overlap."""
+    conditions = ["status = 'ok'"]
+    values = []
+    if t0 is not None:
+        conditions.append('end_time >= ?')
+        values.append(t0)
+    if t1 is not None:
+        conditions.append('start_time <= ?')
+        values.append(t1)
+    if bbox is not None:
+        min_lat, max_lat, min_lon, max_lon = bbox
+        conditions.append('max_subsat_lat >= ? AND min_subsat_lat <= ?')
+        values.extend([min_lat, max_lat])
+    if nimbus is not None:
+        conditions.append('nimbus = ?')
+        values.append(nimbus)
+    if channel is not None:
+        conditions.append('channel = ?')
+        values.append(channel)
+    connection = open_catalogue(database)
+    try:
+        rows = connection.execute('SELECT filename, min_subsat_lon, max_subsat_lon FROM files WHERE %s ORDER BY '
+                                  'filename' % ' AND '.join(conditions), values).fetchall()
+    finally:
+        connection.close()
+    if bbox is not None:
+        rows = [row for row in rows if lon_ranges_overlap(row[1], row[2], min_lon, max_lon)]
+    return [row[0] for row in rows]
+
+def lon_intervals(min_lon, max_lon):
+    """Returns the range of longitudes running east from min_lon to max_lon (in degrees east from -180 to 180) as a
+    list of (start, end) intervals which do not cross the dateline."""
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.), (-180., max_lon)]
+
+def lon_ranges_overlap(min_lon1, max_lon1, min_lon2, max_lon2):
+    """Returns True if the longitude ranges (min_lon1, max_lon1) and (min_lon2, max_lon2) overlap. Either may cross
+    the dateline (see lon_intervals)."""
+    for start1, end1 in lon_intervals(min_lon1, max_lon1):
+        for start2, end2 in lon_intervals(min_lon2, max_lon2):
+            if (start1 <= end2) and (start2 <= end1):
+                return True
+    return False
+
+def parse_time(text):
+    """Returns the time given as YYYY-MM-DDTHH:MM:SS in seconds since 1970/01/01 00:00:00."""
+    return seconds_since_1970(dt.datetime.strptime(text, '%Y-%m-%dT%H:%M:%S'))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Catalogue Nimbus 4, 5 and 6 TAP files in an SQLite database.')
+    parser.add_argument('database', help='the SQLite catalogue')
+    commands = parser.add_subparsers(dest='command')
+    build = commands.add_parser('build', help='scan TAP files into the catalogue')
+    build.add_argument('paths', nargs='+', help='TAP files, directories (searched recursively) or glob patterns')
+    build.add_argument('-j', '--workers', type=int, help='number of worker processes (default: number of CPUs)')
+    build.add_argument('-f', '--force', action='store_true', help='scan files even if they are catalogued')
+    query = commands.add_parser('query', help='list the catalogued files matching a query')
+    query.add_argument('--start', type=parse_time, help='start of the time window (YYYY-MM-DDTHH:MM:SS)')
+    query.add_argument('--end', type=parse_time, help='end of the time window (YYYY-MM-DDTHH:MM:SS)')
+    query.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LAT', 'MAX_LAT', 'MIN_LON', 'MAX_LON'),
+                       help='subsatellite track box, in degrees north and east (MIN_LON > MAX_LON crosses the '
+                            'dateline)')
+    query.add_argument('--nimbus', choices=('N4', 'N5', 'N6'))
+    query.add_argument('--channel', choices=('window', 'vapour', 'unknown'))
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if args.command == 'build':
+        build_catalogue(args.paths, args.database, args.workers, args.force)
+    else:
+        for filename in query_catalogue(args.database, args.start, args.end, args.bbox, args.nimbus, args.channel):
+            print filename
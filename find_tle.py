@@ -1,57 +1,281 @@
-import datetime as dt
-import numpy as np
-import pdb
-from pyorbital.geoloc import ScanGeometry, compute_pixels, get_lonlatalt
-
-def get_tle(time, nimbus):
-	""""""
-	if nimbus == 'N4':
-		tle_file = "nimbus-4.txt"
-	elif nimbus == 'N5':
-		tle_file = "nimbus-5.txt"
-	elif nimbus == 'N6':
-		tle_file = "nimbus-6.txt"
-	else:
-		raise ValueError('Sensor not recognised')
-	f = open(tle_file)
-	lines = f.readlines()
-	lines1 = lines[::2]
-	lines2 = lines[1::2]
-	dts = []
-	for line in lines1:
-		epoch_year = int(line[18:20])
-		if epoch_year < 50:
-			epoch_year += 100
-		epoch_day = float(line[20:32])
-		true_year = 1900 + epoch_year
-		dts.append(dt.datetime(true_year,01,01) + dt.timedelta(days=epoch_day))
-	npdts = np.array(dts)
-	the_dt = get_dt(time)
-	tle_ind = np.where(abs(npdts-the_dt)==np.min(abs(npdts - the_dt)))[0][0]
-	tle1 = lines1[tle_ind][:69]
-	tle2 = lines2[tle_ind][:69]
-	return tle1, tle2
-		
-
-def get_dt(time, epoch=dt.datetime(1970,01,01)):
-	retval = epoch + dt.timedelta(seconds=time)
-	return retval
-	
-def get_geoloc(time, dpop, nads, roll, pitch, yaw, nimbus, rot=1.25):
-	# now works apart from last element (which is nan in demo)
-	t_scan_start = (rot/360.)*(180+nads[0])
-	t_scan_end = (rot/360.)*(180+nads[-1])
-	tle1, tle2 = get_tle(time, nimbus)
-	t = get_dt(time)
-	scan_points = np.arange(dpop)
-	x = np.deg2rad(np.linspace(nads[-1], nads[0], dpop))
-	thir = np.vstack((x, np.zeros((len(x),)))).transpose()
-	times = np.linspace(t_scan_start, t_scan_end, dpop)
-	sgeom = ScanGeometry(thir, times)
-	rpy = (roll, pitch, yaw)
-	s_times = sgeom.times(t)
-	pixels_pos = compute_pixels((tle1,tle2), sgeom, s_times, rpy)
-	pos_time = get_lonlatalt(pixels_pos, s_times)
-	return pos_time
-	
-	
+import datetime as dt
+import numpy as np
+import pdb
+import warnings
+from tap_records import file_key
+from pyorbital.geoloc import ScanGeometry, compute_pixels, get_lonlatalt
+
+TLE_FILES = {'N4': "nimbus-4.txt", 'N5': "nimbus-5.txt", 'N6': "nimbus-6.txt"}
+CATALOGUES = {}
+UNIX_EPOCH = dt.datetime(1970,01,01)
+
+class TLE_Catalogue:
+	"""Holds every two line element set in a TLE file, parsed once. The epochs are kept in a sorted array of
+	integer microseconds since 1970/01/01 00:00:00 (the resolution of datetime), so that the nearest TLE to
+	any number of times can be found with a binary search."""
+	def __init__(self, tle_file, use_cache=False):
+		"""Inputs:
+			- tle_file; a string representing a path to a file of two line element sets, ordered by epoch
+			- use_cache; a boolean - True keeps a parsed copy of the catalogue beside tle_file and reuses it while
+			  tle_file is unchanged, False parses tle_file every time (default=False)"""
+		self.tle_file = tle_file
+		cache = None
+		if use_cache:
+			cache = self.load_cache()
+		if cache is None:
+			self.epochs, self.lines1, self.lines2 = self.parse()
+			if use_cache:
+				self.save_cache()
+		else:
+			self.epochs, self.lines1, self.lines2 = cache
+	def parse(self):
+		"""Outputs:
+			- epochs; the epoch of each TLE in microseconds since 1970/01/01 00:00:00, in ascending order
+			- lines1; the first line of each TLE (69 characters)
+			- lines2; the second line of each TLE (69 characters)
+		The TLE year is two digits - years before 50 are taken to be in the 2000s. A stable sort is used so that,
+		of TLEs with equal epochs, the one appearing first in the file stays first."""
+		f = open(self.tle_file)
+		lines = f.readlines()
+		f.close()
+		lines1 = lines[::2]
+		lines2 = lines[1::2]
+		epochs = np.zeros(len(lines1), dtype=np.int64)
+		for i, line in enumerate(lines1):
+			epoch_year = int(line[18:20])
+			if epoch_year < 50:
+				epoch_year += 100
+			epoch_day = float(line[20:32])
+			true_year = 1900 + epoch_year
+			epochs[i] = get_microseconds(dt.datetime(true_year,01,01) + dt.timedelta(days=epoch_day))
+		order = np.argsort(epochs, kind='mergesort')
+		lines1 = np.array([line[:69] for line in lines1], dtype='S69')
+		lines2 = np.array([line[:69] for line in lines2], dtype='S69')
+		return epochs[order], lines1[order], lines2[order]
+	def cache_path(self):
+		return self.tle_file + '.npz'
+	def load_cache(self):
+		"""Outputs:
+			- (epochs, lines1, lines2) as saved by save_cache, or None if there is no cache or tle_file has changed
+			  since it was made"""
+		try:
+			cache = np.load(self.cache_path())
+			try:
+				key = cache['key']
+				catalogue = (cache['epochs'], cache['lines1'], cache['lines2'])
+			finally:
+				cache.close()
+		except (IOError, OSError, KeyError, ValueError):
+			return None
+		if not np.array_equal(key, file_key(self.tle_file)):
+			return None
+		return catalogue
+	def save_cache(self):
+		try:
+			np.savez(self.cache_path(), key=file_key(self.tle_file), epochs=self.epochs, lines1=self.lines1,
+					 lines2=self.lines2)
+		except (IOError, OSError) as e:
+			warnings.warn('could not save TLE catalogue: ' + str(e))
+	def __len__(self):
+		return len(self.epochs)
+	def nearest(self, times):
+		"""Inputs:
+			- times; a time, or an array of times, in seconds since 1970/01/01 00:00:00
+		Outputs:
+			- inds; the index of the TLE with the nearest epoch to each time. Where two epochs are equally near,
+			  the earlier is used (as is the first of several equal epochs)"""
+		times = np.asarray(times, dtype=np.float64)
+		us = seconds_to_microseconds(times.ravel())
+		after = np.clip(np.searchsorted(self.epochs, us), 1, len(self.epochs) - 1)
+		before = after - 1
+		nearest = np.where(us - self.epochs[before] <= self.epochs[after] - us, before, after)
+		if len(self.epochs) == 1:
+			nearest = np.zeros(len(us), dtype=np.int64)
+		inds = np.searchsorted(self.epochs, self.epochs[nearest])
+		return inds.reshape(times.shape)
+	def get_tle(self, ind):
+		"""Returns the two lines of TLE number ind."""
+		return str(self.lines1[ind].decode()), str(self.lines2[ind].decode())
+
+def get_catalogue(nimbus, use_cache=False):
+	"""Inputs:
+		- nimbus; the satellite ('N4', 'N5' or 'N6')
+		- use_cache; passed to TLE_Catalogue (default=False)
+	Outputs:
+		- catalogue; the TLE_Catalogue for the satellite. Each catalogue is only made once per process."""
+	if nimbus not in TLE_FILES:
+		raise ValueError('Sensor not recognised')
+	if nimbus not in CATALOGUES:
+		CATALOGUES[nimbus] = TLE_Catalogue(TLE_FILES[nimbus], use_cache)
+	return CATALOGUES[nimbus]
+
+def get_tle(time, nimbus):
+	"""Inputs:
+		- time; the time in seconds since 1970/01/01 00:00:00
+		- nimbus; the satellite ('N4', 'N5' or 'N6')
+	Outputs:
+		- tle1, tle2; the lines of the TLE with the nearest epoch to time"""
+	catalogue = get_catalogue(nimbus)
+	return catalogue.get_tle(catalogue.nearest(time))
+		
+
+def get_dt(time, epoch=UNIX_EPOCH):
+	retval = epoch + dt.timedelta(seconds=time)
+	return retval
+
+def get_microseconds(the_dt, epoch=UNIX_EPOCH):
+	"""Returns the whole number of microseconds from epoch to the datetime the_dt."""
+	delta = the_dt - epoch
+	return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+def seconds_to_microseconds(times):
+	"""Inputs:
+		- times; an array of times, in seconds since 1970/01/01 00:00:00
+	Outputs:
+		- us; the whole number of microseconds since 1970/01/01 00:00:00 of each time, as an int64 array
+	Does what get_microseconds(get_dt(time)) does for every time at once. Like timedelta, the fractions of a
+	microsecond are rounded half away from zero."""
+	times = np.asarray(times, dtype=np.float64)
+	sizes = abs(times)
+	whole = np.floor(sizes)
+	us = whole.astype(np.int64)*1000000 + np.floor((sizes - whole)*1e6 + 0.5).astype(np.int64)
+	return np.sign(times).astype(np.int64)*us
+	
+def get_geoloc(time, dpop, nads, roll, pitch, yaw, nimbus, rot=1.25):
+	# now works apart from last element (which is nan in demo)
+	t_scan_start = (rot/360.)*(180+nads[0])
+	t_scan_end = (rot/360.)*(180+nads[-1])
+	tle1, tle2 = get_tle(time, nimbus)
+	t = get_dt(time)
+	scan_points = np.arange(dpop)
+	x = np.deg2rad(np.linspace(nads[-1], nads[0], dpop))
+	thir = np.vstack((x, np.zeros((len(x),)))).transpose()
+	times = np.linspace(t_scan_start, t_scan_end, dpop)
+	sgeom = ScanGeometry(thir, times)
+	rpy = (roll, pitch, yaw)
+	s_times = sgeom.times(t)
+	pixels_pos = compute_pixels((tle1,tle2), sgeom, s_times, rpy)
+	pos_time = get_lonlatalt(pixels_pos, s_times)
+	return pos_time
+	
+	
+MAX_GEOLOC_PIXELS = 200000
+SCAN_GEOMETRIES = {}
+MAX_CACHED_GEOMETRIES = 64
+
+def get_scan_geometry(dpop, nads, rot=1.25):
+	"""Inputs:
+		- dpop; the number of data points in the scanline
+		- nads; the anchor nadir angles of the scanline
+		- rot; the time (in seconds) taken for one rotation of the scan mirror (default=1.25)
+	Outputs:
+		- x; the scan angle (in radians) of each data point
+		- tds; the time of each data point after the start of the scanline, as timedeltas
+	These are the same for every scanline with the same data population and nadir angles, so they are cached. The
+	cache is cleared once it holds MAX_CACHED_GEOMETRIES entries, so that it stays small in a long-lived process."""
+	key = (int(dpop), np.asarray(nads, dtype=np.float64).tostring(), rot)
+	if key not in SCAN_GEOMETRIES:
+		t_scan_start = (rot/360.)*(180+nads[0])
+		t_scan_end = (rot/360.)*(180+nads[-1])
+		x = np.deg2rad(np.linspace(nads[-1], nads[0], dpop))
+		times = np.linspace(t_scan_start, t_scan_end, dpop)
+		tds = np.array([dt.timedelta(seconds=i) for i in times])
+		if len(SCAN_GEOMETRIES) >= MAX_CACHED_GEOMETRIES:
+			SCAN_GEOMETRIES.clear()
+		SCAN_GEOMETRIES[key] = (x, tds)
+	return SCAN_GEOMETRIES[key]
+
+def get_geoloc_lines(times, dpops, nads, rolls, pitches, yaws, nimbus, rot=1.25, max_pixels=MAX_GEOLOC_PIXELS):
+	"""Inputs:
+		- times; the time of each scanline, in seconds since 1970/01/01 00:00:00
+		- dpops; the number of data points in each scanline
+		- nads; the (n_lines, locator_no) array of anchor nadir angles for each scanline
+		- rolls, pitches, yaws; the attitude of the satellite for each scanline
+		- nimbus; the satellite ('N4', 'N5' or 'N6')
+		- rot; the time (in seconds) taken for one rotation of the scan mirror (default=1.25)
+		- max_pixels; the largest number of pixels passed to pyorbital at once (default=MAX_GEOLOC_PIXELS)
+	Outputs:
+		- lons, lats, alts; (n_lines, max(dpops)) arrays of the position of each pixel. Pixels past the data
+		  population of a line are nan
+	Does what get_geoloc does for every scanline at once. The scanlines are grouped by the TLE nearest to their
+	time and cut into chunks of at most max_pixels pixels, to bound the memory used (see plan_geoloc_lines), and
+	each chunk is geolocated with a single call to pyorbital (see geoloc_chunk)."""
+	times = np.asarray(times, dtype=np.float64)
+	dpops = np.asarray(dpops).astype(int)
+	width = max(max(dpops), 0) if len(dpops) else 0
+	lons = np.zeros((len(times), width))
+	lons.fill(np.nan)
+	lats = np.copy(lons)
+	alts = np.copy(lons)
+	catalogue = get_catalogue(nimbus)
+	for tle_ind, lines in plan_geoloc_lines(times, dpops, nimbus, max_pixels):
+		rows, cols, pos_time = geoloc_chunk(catalogue.get_tle(tle_ind), lines, times, dpops, nads, rolls, pitches,
+											yaws, rot)
+		lons[rows, cols] = pos_time[0]
+		lats[rows, cols] = pos_time[1]
+		alts[rows, cols] = pos_time[2]
+	return lons, lats, alts
+
+def plan_geoloc_lines(times, dpops, nimbus, max_pixels=MAX_GEOLOC_PIXELS):
+	"""Inputs:
+		- times; the time of each scanline, in seconds since 1970/01/01 00:00:00
+		- dpops; the number of data points in each scanline
+		- nimbus; the satellite ('N4', 'N5' or 'N6')
+		- max_pixels; the largest number of pixels in a chunk (default=MAX_GEOLOC_PIXELS)
+	Outputs:
+		- chunks; a list of (tle_ind, lines) pairs - the index of a TLE in the satellite's catalogue, and the
+		  indices of the scanlines (with data) that are geolocated with it in one go
+	The scanlines are grouped by the TLE nearest to their time, and each group is cut into chunks of no more
+	than max_pixels pixels. The chunks depend only on the inputs, so they can be geolocated in any order (or
+	in different processes) with the same results."""
+	times = np.asarray(times, dtype=np.float64)
+	dpops = np.asarray(dpops).astype(int)
+	tle_inds = get_catalogue(nimbus).nearest(times)
+	chunks = []
+	for tle_ind in np.unique(tle_inds):
+		lines = np.nonzero((tle_inds == tle_ind) & (dpops > 0))[0]
+		line_chunks = np.cumsum(dpops[lines]) // max_pixels
+		for chunk in np.unique(line_chunks):
+			chunks.append((tle_ind, lines[line_chunks == chunk]))
+	return chunks
+
+def geoloc_chunk(tle, lines, times, dpops, nads, rolls, pitches, yaws, rot=1.25, columns=None):
+	"""Inputs:
+		- tle; the two lines of the TLE to use
+		- lines; the indices of the scanlines to geolocate
+		- times, dpops, nads, rolls, pitches, yaws, rot; as in get_geoloc_lines
+		- columns; a sorted array of the pixel indices to geolocate in each scanline (default=None, i.e. every
+		  pixel)
+	Outputs:
+		- rows, cols; the scanline and pixel index of each pixel that could be geolocated
+		- pos_time; the (lons, lats, alts) of those pixels
+	The pixels of every scanline are joined into one scan geometry (with the attitude given per pixel), so that
+	compute_pixels and get_lonlatalt are only called once."""
+	dpops = np.asarray(dpops).astype(int)
+	xs = []
+	s_times = []
+	pixels = []
+	for i in lines:
+		x, tds = get_scan_geometry(dpops[i], nads[i], rot)
+		if columns is None:
+			line_pixels = np.arange(dpops[i])
+		else:
+			line_pixels = columns[columns < dpops[i]]
+		xs.append(x[line_pixels])
+		s_times.append(tds[line_pixels] + get_dt(times[i]))
+		pixels.append(line_pixels)
+	x = np.concatenate(xs)
+	thir = np.vstack((x, np.zeros((len(x),)))).transpose()
+	sgeom = ScanGeometry(thir, np.zeros(len(x)))
+	n = np.array([len(line_pixels) for line_pixels in pixels], dtype=int)
+	rpy = (np.repeat(np.asarray(rolls, dtype=np.float64)[lines], n),
+		   np.repeat(np.asarray(pitches, dtype=np.float64)[lines], n),
+		   np.repeat(np.asarray(yaws, dtype=np.float64)[lines], n))
+	s_times = np.concatenate(s_times)
+	pixels_pos = compute_pixels(tle, sgeom, s_times, rpy)
+	# pixels whose line of sight misses the earth are nan, and would stop get_lonlatalt from converging
+	hit = np.all(np.isfinite(pixels_pos), axis=0)
+	pos_time = get_lonlatalt(pixels_pos[:, hit], s_times[hit])
+	rows = np.repeat(lines, n)[hit]
+	cols = np.concatenate(pixels)[hit]
+	return rows, cols, pos_time
@@ -0,0 +1,282 @@
+import datetime as dt
+import numpy as np
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import pyorbital.astronomy as astro
+import pyorbital.orbital as orb
+from find_tle import *
+from sat_geometry import *
+
+LINE_ARRAYS = ('times', 'pops', 'nads', 'rolls', 'pitches', 'yaws')
+SCENE_ARRAYS = ('lons', 'lats', 'alts', 'sol_zen', 'sol_az', 'sat_zen', 'sat_az')
+SHARED_ARRAYS = {} # in a worker process, views of the arrays shared by geolocate_scene
+# the SCENE_ARRAYS which wrap around, in degrees, and the lowest value each takes (lons and sol_az are signed,
+# as pyorbital gives them, and sat_az runs from 0 to 360, as sat_geometry gives it):
+CIRCULAR_ARRAYS = {'lons': -180, 'sol_az': -180, 'sat_az': 0}
+
+def solar_angles(now_dts, lons, lats, valid):
+    """Inputs:
+        - now_dts; a (Y, 1) array of the datetime of each scanline
+        - lons; the (Y, X) array of pixel longitudes
+        - lats; the (Y, X) array of pixel latitudes
+        - valid; a (Y, X) boolean array - True where the pixel has been geolocated
+    Outputs:
+        - sol_zen; the (Y, X) array of solar zenith angles (in degrees)
+        - sol_az; the (Y, X) array of solar azimuth angles (in degrees)
+    The scanline datetimes broadcast against the coordinate grids, so pyorbital works out the sun's position
+    once per scanline and the angles for the whole scene at once. Pixels which are not valid are set to -999."""
+    safe_lons = np.where(valid, lons, 0)
+    safe_lats = np.where(valid, lats, 0)
+    sol_zen = astro.sun_zenith_angle(now_dts, safe_lons, safe_lats)
+    sol_az = np.rad2deg(astro.get_alt_az(now_dts, safe_lons, safe_lats)[1])
+    sol_zen[~valid] = -999
+    sol_az[~valid] = -999
+    return sol_zen, sol_az
+
+def geolocate_chunk(arrays, tle_ind, lines, nimbus, rot, width, ellipsoid=True, solar=True, satellite=True,
+                    columns=None):
+    """Inputs:
+        - arrays; a dictionary holding the LINE_ARRAYS (inputs) and SCENE_ARRAYS (outputs) of geolocate_scene
+        - tle_ind, lines; a chunk of scanlines, as made by find_tle.plan_geoloc_lines
+        - nimbus, rot, width, ellipsoid, solar, satellite, columns; as in geolocate_scene
+    Geolocates the scanlines of the chunk and works out their solar and satellite angles, writing the results into
+    the rows of the output arrays belonging to the chunk. Nothing outside those rows is read or written."""
+    if columns is None:
+        columns = np.arange(width)
+    times = arrays['times'][lines]
+    tle = get_catalogue(nimbus).get_tle(tle_ind)
+    rows, cols, pos_time = geoloc_chunk(tle, lines, arrays['times'], arrays['pops'], arrays['nads'],
+                                        arrays['rolls'], arrays['pitches'], arrays['yaws'], rot, columns)
+    keep = cols < width
+    rows = np.searchsorted(lines, rows[keep])
+    cols = np.searchsorted(columns, cols[keep])
+    lons = np.zeros((len(lines), len(columns)))
+    lons.fill(-999)
+    lats = np.copy(lons)
+    alts = np.copy(lons)
+    lons[rows, cols] = pos_time[0][keep]
+    lats[rows, cols] = pos_time[1][keep]
+    alts[rows, cols] = pos_time[2][keep]
+    lons[np.isnan(lons)] = -999
+    lats[np.isnan(lats)] = -999
+    alts[np.isnan(alts)] = -999
+    valid = (lons != -999) & (lats != -999) & (alts != -999)
+    blocks = {'lons': lons, 'lats': lats, 'alts': alts}
+    now_dts = np.array([dt.datetime(1970, 01, 01) + dt.timedelta(seconds=time) for time in times])[:, np.newaxis]
+    if solar:
+        blocks['sol_zen'], blocks['sol_az'] = solar_angles(now_dts, lons, lats, valid)
+    if satellite:
+        # the satellite itself, from the same TLE, as seen from each pixel:
+        position = orb.Orbital('Nimbus', line1=tle[0], line2=tle[1]).get_lonlatalt(now_dts[:, 0])
+        position = tuple([np.asarray(part)[:, np.newaxis] for part in position])
+        blocks['sat_zen'], blocks['sat_az'] = satellite_angles(now_dts, position, lons, lats, alts, valid, ellipsoid)
+    for name in blocks:
+        arrays[name][lines] = blocks[name]
+
+def share_array(array):
+    """Returns a RawArray in shared memory holding a float64 copy of array, and a numpy view of it."""
+    raw = RawArray('d', max(array.size, 1))
+    view = np.frombuffer(raw, dtype=np.float64)[:array.size].reshape(array.shape)
+    view[...] = array
+    return raw, view
+
+def init_worker(shared):
+    """Pool initializer - makes numpy views of the shared arrays (given as name: (RawArray, shape))."""
+    for name in shared:
+        raw, shape = shared[name]
+        SHARED_ARRAYS[name] = np.frombuffer(raw, dtype=np.float64)[:int(np.prod(shape))].reshape(shape)
+
+def geolocate_shared_chunk(task):
+    """Runs geolocate_chunk in a worker process, on the shared arrays."""
+    geolocate_chunk(SHARED_ARRAYS, *task)
+
+def geolocate_scene(times, pops, nads, rolls, pitches, yaws, nimbus, rot, width, ellipsoid=True, workers=None,
+                    solar=True, satellite=True, tie_points=None, columns=None):
+    """Inputs:
+        - times; the time of each scanline, in seconds since 1970/01/01 00:00:00
+        - pops; the data population of each scanline
+        - nads; the (Y, locator_no) array of anchor nadir angles for each scanline
+        - rolls, pitches, yaws; the attitude of the satellite for each scanline
+        - nimbus; the satellite ('N4', 'N5' or 'N6')
+        - rot; the time (in seconds) taken for one rotation of the scan mirror
+        - width; the number of pixels in each row of the output arrays
+        - ellipsoid; passed to sat_geometry.satellite_angles (default=True)
+        - workers; the number of processes to use - None or 1 works in this process (default=None)
+        - solar, satellite; booleans - False skips the solar (satellite) angles, which are then left as -999
+          (default=True)
+        - tie_points; a (line_step, pixel_step) pair - the positions and angles are only worked out at tie points
+          and interpolated to the rest of the pixels (default=None, i.e. every pixel is worked out, see
+          geolocate_tie_points)
+        - columns; a sorted array of the only pixels to work out in each scanline (default=None, i.e. all of them)
+    Outputs:
+        - lons, lats, alts, sol_zen, sol_az, sat_zen, sat_az; the (Y, width) arrays of pixel positions and angles
+          (-999 where they could not be found). With columns, the arrays are (Y, len(columns))
+    The scanlines are cut into chunks by find_tle.plan_geoloc_lines and each chunk is handled by geolocate_chunk.
+    With more than one worker the chunks are shared out over a process pool. The inputs and outputs are then put
+    in shared memory, which the workers read from and write their rows into directly, so no arrays are pickled.
+    The chunks, and so the results, are the same whichever way they are worked out."""
+    if tie_points is not None:
+        rows, cols, grid = geolocate_tie_points(times, pops, nads, rolls, pitches, yaws, nimbus, rot, width,
+                                                tie_points, ellipsoid, workers, solar, satellite)
+        return interpolate_tie_points(rows, cols, grid, pops, width)
+    n_columns = width if columns is None else len(columns)
+    arrays = {'times': np.asarray(times, dtype=np.float64), 'pops': np.asarray(pops, dtype=np.float64),
+              'nads': np.asarray(nads, dtype=np.float64), 'rolls': np.asarray(rolls, dtype=np.float64),
+              'pitches': np.asarray(pitches, dtype=np.float64), 'yaws': np.asarray(yaws, dtype=np.float64)}
+    for name in SCENE_ARRAYS:
+        arrays[name] = np.zeros((len(arrays['times']), n_columns))
+        arrays[name].fill(-999)
+    chunks = plan_geoloc_lines(arrays['times'], arrays['pops'], nimbus)
+    tasks = [(tle_ind, lines, nimbus, rot, width, ellipsoid, solar, satellite, columns) for tle_ind, lines in chunks]
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            geolocate_chunk(arrays, *task)
+        return tuple([arrays[name] for name in SCENE_ARRAYS])
+    shared = {}
+    for name in LINE_ARRAYS + SCENE_ARRAYS:
+        raw, arrays[name] = share_array(arrays[name])
+        shared[name] = (raw, arrays[name].shape)
+    pool = multiprocessing.Pool(min(workers, len(tasks)), init_worker, (shared,))
+    try:
+        pool.map(geolocate_shared_chunk, tasks, 1)
+    finally:
+        pool.close()
+        pool.join()
+    return tuple([np.array(arrays[name]) for name in SCENE_ARRAYS])
+
+def tie_indices(n, step, extra=()):
+    """Returns the sorted indices 0, step, 2*step, ... below n, along with n-1 and any extra indices below n."""
+    inds = np.concatenate((np.arange(0, n, step), [n - 1], np.asarray(extra, dtype=int))).astype(int)
+    return np.unique(inds[(inds >= 0) & (inds < n)])
+
+def geolocate_tie_points(times, pops, nads, rolls, pitches, yaws, nimbus, rot, width, tie_points, ellipsoid=True,
+                         workers=None, solar=True, satellite=True):
+    """Inputs:
+        - times, pops, nads, rolls, pitches, yaws, nimbus, rot, width, ellipsoid, workers, solar, satellite; as in
+          geolocate_scene
+        - tie_points; a (line_step, pixel_step) pair
+    Outputs:
+        - rows, cols; the scanline and pixel indices of the tie points
+        - grid; a dictionary of the (len(rows), len(cols)) arrays of the SCENE_ARRAYS at the tie points
+    The tie points are on every line_step-th scanline and every pixel_step-th pixel, along with the last scanline
+    and pixel. The last and middle pixels of each tie scanline are added, so that the data of every scanline ends on
+    a tie point and its subsatellite point (see geolocate_chunk) is worked out."""
+    line_step, pixel_step = tie_points
+    times = np.asarray(times, dtype=np.float64)
+    pops = np.asarray(pops, dtype=np.float64)
+    rows = tie_indices(len(times), line_step)
+    line_pops = pops[rows].astype(int)
+    cols = tie_indices(width, pixel_step, np.concatenate((line_pops - 1, np.minimum(line_pops/2, width - 1))))
+    arrays = geolocate_scene(times[rows], pops[rows], np.asarray(nads)[rows], np.asarray(rolls)[rows],
+                             np.asarray(pitches)[rows], np.asarray(yaws)[rows], nimbus, rot, width, ellipsoid, workers,
+                             solar, satellite, columns=cols)
+    return rows, cols, dict(zip(SCENE_ARRAYS, arrays))
+
+def tie_weights(ties, n):
+    """Inputs:
+        - ties; the sorted indices of the tie points along one dimension
+        - n; the length of the dimension
+    Outputs:
+        - lower, upper; for each index, the positions in ties of the tie points either side of it
+        - weight; the weight of the upper tie point (0 on a tie point)"""
+    inds = np.arange(n)
+    lower = np.clip(np.searchsorted(ties, inds, 'right') - 1, 0, max(len(ties) - 2, 0))
+    upper = np.minimum(lower + 1, len(ties) - 1)
+    span = ties[upper] - ties[lower]
+    weight = np.where(span > 0, (inds - ties[lower]) / np.maximum(span, 1).astype(np.float64), 0)
+    return lower, upper, np.clip(weight, 0, 1)
+
+def fill_ties(values, valid, cols):
+    """Inputs:
+        - values; a (len(rows), len(cols)) array of values at the tie points
+        - valid; a boolean array parallel to values - True where the value is good
+        - cols; the pixel indices of the tie points
+    Outputs:
+        - values, valid; copies in which each bad tie point lying between good ones on its scanline is interpolated
+          along the scanline from the nearest good tie points either side of it
+    This keeps a single bad tie point (e.g. an azimuth at nadir, where it is not defined) from spoiling every pixel
+    interpolated from it. Bad tie points before the first or after the last good one are left bad."""
+    values = np.array(values, dtype=np.float64)
+    valid = np.array(valid, dtype=bool)
+    first = np.argmax(valid, axis=1)
+    last = valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    gaps = np.any(valid, axis=1) & (np.sum(valid, axis=1) < last - first + 1) # a bad tie point between good ones
+    for i in np.nonzero(gaps)[0]:
+        good = np.nonzero(valid[i])[0]
+        bad = np.arange(good[0], good[-1])[~valid[i, good[0]:good[-1]]]
+        values[i, bad] = np.interp(cols[bad], cols[good], values[i, good])
+        valid[i, bad] = True
+    return values, valid
+
+def interpolate_grid(values, valid, rows, cols, n_lines, width):
+    """Inputs:
+        - values; a (len(rows), len(cols)) array of values at the tie points
+        - valid; a boolean array parallel to values - True where the value is good
+        - rows, cols; the scanline and pixel indices of the tie points
+        - n_lines, width; the shape of the full grid
+    Outputs:
+        - full; the (n_lines, width) array interpolated bilinearly from the tie points
+        - ok; a boolean array parallel to full - False where a tie point used (with a non-zero weight) is bad
+    Bad tie points between good ones on the same scanline are first filled in from them (see fill_ties)."""
+    values, valid = fill_ties(np.where(valid, values, 0), valid, cols)
+    lower, upper, weight = tie_weights(rows, n_lines)
+    weight = weight[:, np.newaxis]
+    along = (1 - weight)*values[lower] + weight*values[upper]
+    ok = (valid[lower] | (weight == 1)) & (valid[upper] | (weight == 0))
+    lower, upper, weight = tie_weights(cols, width)
+    full = (1 - weight)*along[:, lower] + weight*along[:, upper]
+    ok = (ok[:, lower] | (weight == 1)) & (ok[:, upper] | (weight == 0))
+    return full, ok
+
+def interpolate_tie_points(rows, cols, grid, pops, width):
+    """Inputs:
+        - rows, cols, grid; the tie points, as made by geolocate_tie_points
+        - pops; the data population of every scanline
+        - width; the number of pixels in each row of the output arrays
+    Outputs:
+        - lons, lats, alts, sol_zen, sol_az, sat_zen, sat_az; the (Y, width) arrays of pixel positions and angles,
+          as made by geolocate_scene
+    Each array is interpolated bilinearly from the tie points. The CIRCULAR_ARRAYS (longitudes and azimuths) are
+    interpolated as unit vectors, so that they are right where they wrap around (e.g. at the dateline), and are
+    brought back into the range geolocate_scene gives them in. Pixels are -999 past the data population of their
+    scanline, or where a tie point they need could not be worked out."""
+    pops = np.asarray(pops, dtype=np.float64)
+    past_pop = np.arange(width)[np.newaxis, :] >= pops[:, np.newaxis]
+    outputs = []
+    for name in SCENE_ARRAYS:
+        values = grid[name]
+        valid = np.isfinite(values) & (values != -999)
+        if name in CIRCULAR_ARRAYS:
+            angles = np.deg2rad(values)
+            east, ok = interpolate_grid(np.sin(angles), valid, rows, cols, len(pops), width)
+            north, ok = interpolate_grid(np.cos(angles), valid, rows, cols, len(pops), width)
+            full = np.rad2deg(np.arctan2(east, north))
+            if CIRCULAR_ARRAYS[name] == 0: # arctan2 gives -180 to 180
+                full %= 360
+        else:
+            full, ok = interpolate_grid(values, valid, rows, cols, len(pops), width)
+        full[~ok | past_pop] = -999
+        outputs.append(full)
+    return tuple(outputs)
+
+def tie_point_errors(full, tied, circular=CIRCULAR_ARRAYS):
+    """Inputs:
+        - full; a dictionary of scene arrays worked out at every pixel
+        - tied; a dictionary of the same arrays interpolated from tie points
+        - circular; the names of the arrays which wrap around, in degrees (default=CIRCULAR_ARRAYS)
+    Outputs:
+        - errors; for each array, a dictionary of the 'max' and 'rms' absolute error over the pixels which are good
+          in both, and the number of pixels 'lost' (good in full but not in tied)
+    Differences in the circular arrays are wrapped into -180 to 180 degrees."""
+    errors = {}
+    for name in full:
+        good_full = np.isfinite(full[name]) & (full[name] != -999)
+        good_tied = np.isfinite(tied[name]) & (tied[name] != -999)
+        both = good_full & good_tied
+        diffs = tied[name][both] - full[name][both]
+        if name in circular:
+            diffs = (diffs + 180) % 360 - 180
+        errors[name] = {'max': float(np.max(abs(diffs))) if len(diffs) else 0.,
+                        'rms': float(np.sqrt(np.mean(diffs**2))) if len(diffs) else 0.,
+                        'lost': int(np.sum(good_full & ~good_tied))}
+    return errors
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import collections
+
+# the counters kept by Stats, in the order they are reported:
+COUNTER_NAMES = (
+    'records_read', # data records framed in the file, including skipped records
+    'records_skipped', # data records with the skip flag set in their header
+    'header_footer_mismatches', # records whose footer does not match their header (see tap_records.scan_records)
+    'bad_parity_bytes', # bytes of the decoded data records which failed their checks (Nimbus 4 only)
+    'fill_scanlines', # scanlines of truetime without a swath (see Fields.tdims)
+    'bad_pop_swaths', # swaths of the decoded data records filled because of their data population
+)
+
+def cpu_time():
+    """Returns the CPU time (user and system) used so far by this process and the child processes it has waited
+    for, in seconds, so that the work of a pool of geolocation workers is counted once the pool is joined."""
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+class Stats:
+    def __init__(self, callback=None):
+        """Inputs:
+            - callback; a function called as callback(kind, name, value) whenever a stage ends (kind 'stage', with
+              value the (wall, cpu) seconds it took) and whenever a counter is added to (kind 'count', with value
+              the amount added) (default=None, i.e. no callback - see logging_callback)
+        Collects the time taken by each stage of reading and writing a file, and counts of the data found to be
+        bad, to be read afterwards with summary. A Stats object is passed to Data (see main.read_TAP_file) and
+        shared by the Fields object made from it. Timers and counters are added to, so a stage run several times
+        (e.g. block by block) is reported in total. The stages are exclusive: a stage started while another is
+        running pauses it until it stops, so time is only counted against the innermost stage and the stages add
+        up to the time taken overall."""
+        self.callback = callback
+        self.running = [] # the tokens of the stages being timed, innermost last
+        self.timers = collections.OrderedDict()
+        self.counters = collections.OrderedDict([(name, 0) for name in COUNTER_NAMES])
+    def start(self, name):
+        """Starts timing the stage name, pausing the stage running before it. Returns the token to pass to stop."""
+        now = time.time(), cpu_time()
+        if self.running:
+            self.pause(self.running[-1], now)
+        token = [name, now[0], now[1], 0., 0.] # the name, when it was last resumed, and the time counted so far
+        self.running.append(token)
+        return token
+    def stop(self, token):
+        """Stops timing the stage started by start, adding its wall and CPU time to the timers, and resumes the
+        stage it paused."""
+        now = time.time(), cpu_time()
+        self.pause(token, now)
+        name, wall, cpu = token[0], token[3], token[4]
+        self.running.remove(token)
+        if self.running:
+            self.running[-1][1:3] = now
+        total = self.timers.get(name, (0., 0.))
+        self.timers[name] = (total[0] + wall, total[1] + cpu)
+        if self.callback is not None:
+            self.callback('stage', name, (wall, cpu))
+    def pause(self, token, now):
+        """Adds the time since token was last resumed (up to the (wall, cpu) time now) to the time counted."""
+        token[3] += now[0] - token[1]
+        token[4] += now[1] - token[2]
+        token[1:3] = now
+    def count(self, name, amount=1):
+        """Adds amount to the counter name (one of COUNTER_NAMES)."""
+        self.counters[name] += int(amount)
+        if (self.callback is not None) and amount:
+            self.callback('count', name, int(amount))
+    def summary(self):
+        """Outputs:
+            - summary; an ordered dictionary of the counters, followed by the wall and CPU time of each stage
+              (as <stage>_wall_seconds and <stage>_cpu_seconds)"""
+        summary = collections.OrderedDict(self.counters)
+        for name in self.timers:
+            summary[name + '_wall_seconds'] = self.timers[name][0]
+            summary[name + '_cpu_seconds'] = self.timers[name][1]
+        return summary
+    def write_attributes(self, dataset, prefix='stats_'):
+        """Writes the summary to the netCDF4 Dataset dataset as global attributes, each named with prefix."""
+        for name, value in self.summary().items():
+            dataset.setncattr(prefix + name, value)
+
+def logging_callback(logger=None, level=logging.INFO):
+    """Inputs:
+        - logger; the logging.Logger to report to (default: the 'tap_reader' logger)
+        - level; the level the stages are logged at - counters are logged at DEBUG (default=logging.INFO)
+    Outputs:
+        - callback; a callback for Stats which logs each stage and counter as it happens"""
+    if logger is None:
+        logger = logging.getLogger('tap_reader')
+    def callback(kind, name, value):
+        if kind == 'stage':
+            logger.log(level, '%s: %.3f s wall, %.3f s cpu', name, value[0], value[1])
+        else:
+            logger.debug('%s: +%d', name, value)
+    return callback
@@ -0,0 +1,94 @@
+import numpy as np
+
+WEIGHT_CACHE = {}
+MAX_CACHED_WEIGHTS = 64
+
+def nearest_indices(the_array, values):
+    """Inputs:
+        - the_array; the array in which the indices are to be found
+        - values; the values for which the nearest indices in the_array are to be found
+    Output:
+        - inds; for each value, the first index where the_array is closest to the value"""
+    return np.argmin(abs(the_array[np.newaxis, :] - values[:, np.newaxis]), axis=1)
+
+def surrounding_n(inds, n, length):
+    """Inputs:
+        - inds; the index of the nearest anchor point for each value being interpolated
+        - n; the number of points to use in the interpolation
+        - length; the number of anchor points
+    Outputs:
+        - addresses; an (len(inds), n) array of the anchor point indexes usable for the lagrangian interpolator
+    The n points are centred on each index, then moved along so that they do not fall off either end."""
+    starts = np.minimum(np.maximum(inds - (n/2), 0), length - n)
+    return starts[:, np.newaxis] + np.arange(n)[np.newaxis, :]
+
+def lagrange_weights(anchor_nads, data_pop, n=5):
+    """Inputs:
+        - anchor_nads; the nadir angles of the anchor points
+        - data_pop; the number of data points in the swath
+        - n; the number of points to use in the interpolation (default=5)
+    Outputs:
+        - full_nads; the nadir angle of each data point
+        - addresses; a (data_pop, n) array of the anchor points used for each data point
+        - weights; a (data_pop, n) array of the Lagrange basis polynomials for those anchor points, evaluated at
+          the nadir angle of each data point
+    Together, addresses and weights are the rows of the (data_pop x locator_no) Lagrange weight matrix, which has
+    only n non-zero entries per row. The mirror rotation rate is assumed to be constant throughout the flight, and
+    the first (last) anchor point is assumed to correspond to the first (last) data point. The anchor nadir angles
+    are shared by every swath of a record and rarely change, so the weights are cached by (anchor_nads, data_pop)."""
+    key = (np.asarray(anchor_nads, dtype=np.float64).tostring(), data_pop, n)
+    if key in WEIGHT_CACHE:
+        return WEIGHT_CACHE[key]
+    full_nads = np.linspace(np.min(anchor_nads), np.max(anchor_nads), data_pop)
+    addresses = surrounding_n(nearest_indices(anchor_nads, full_nads), n, len(anchor_nads))
+    xs = anchor_nads[addresses]
+    x = full_nads[:, np.newaxis]
+    weights = np.ones(addresses.shape)
+    for m in range(n):
+        # the basis polynomial for point i skips every point with the same x as point i
+        xm = xs[:, m:m+1]
+        same = xs == xm
+        weights *= np.where(same, 1, (x - xm) / np.where(same, 1, xs - xm))
+    if len(WEIGHT_CACHE) >= MAX_CACHED_WEIGHTS:
+        WEIGHT_CACHE.clear()
+    WEIGHT_CACHE[key] = (full_nads, addresses, weights)
+    return full_nads, addresses, weights
+
+def interp_anchor_coords(anchor_nads, anchor_lats, anchor_lons, data_pop, tolerance=15):
+    """Inputs:
+        - anchor_nads; the nadir angles of the anchor points
+        - anchor_lats; an (n_swaths, locator_no) array of anchor point latitudes
+        - anchor_lons; an (n_swaths, locator_no) array of anchor point longitudes
+        - data_pop; the number of data points in each of the swaths
+        - tolerance; a number describing the extent (in degrees) to which interpolated longitudes may overshoot
+          (default=15)
+    Outputs:
+        - nplats; the (n_swaths, data_pop) array of interpolated latitudes
+        - nplons; the (n_swaths, data_pop) array of interpolated longitudes
+    Applies a lagrangian interpolator with a number of points n=5 to every swath at once, using the weights
+    from lagrange_weights. For the sake of interpolating along a smooth function, longitudes are added to if the
+    points used for a data point cross the dateline. The terms are summed in the same order as the
+    point-by-point interpolator, so the results are identical to it.
+    Finally, if longitudes fall within a tolerance of the upper/lower limit then they can be folded back into the
+    longitude domain. This compensates for the addition mentioned above. Other erroneous values are set as such.
+    NOTE: The interpolator works fine for well behaved functions, but the raw anchor point arrays is known to
+    behave badly at extreme latitudes. It is this behaviour, not the behaviour of the interpolator, which causes
+    a mess in the fully extended coordinate arrays."""
+    full_nads, addresses, weights = lagrange_weights(anchor_nads, data_pop)
+    relevant_latitudes = np.asarray(anchor_lats)[:, addresses]
+    relevant_longitudes = np.asarray(anchor_lons)[:, addresses]
+    crossed = abs(relevant_longitudes[:, :, :1] - relevant_longitudes[:, :, -1:]) > 180 # i.e. the dateline is crossed
+    relevant_longitudes[crossed & (relevant_longitudes < 180)] += 360
+    nplats = np.zeros(relevant_latitudes.shape[:2])
+    nplons = np.zeros(relevant_longitudes.shape[:2])
+    for i in range(addresses.shape[1]):
+        nplats += relevant_latitudes[:, :, i] * weights[:, i]
+        nplons += relevant_longitudes[:, :, i] * weights[:, i]
+    # deal with slight overshot during interpolation:
+    nplons[(nplons>360)&(nplons<360 + tolerance)] -= 360
+    nplons[nplons>360 + tolerance] = -999
+    nplons[(nplons>0 - tolerance)&(nplons<0)] += 360
+    nplons[nplons<0 - tolerance] = -999
+    nplats[nplats>180] = -999
+    nplats[nplats<0] = -999
+    return nplats, nplons
@@ -1,33 +1,257 @@
 from Data4to6_new import *
 import glob
+import time
+import logging
 from netCDF4 import Dataset
 
-def read_TAP_file(filename):
+def read_TAP_file(filename, lazy=False, time_range=None, bbox=None, full_coords=True, stats=None, use_index=False):
     """Inputs:
         - filename; a string corresponding to the complete path to a Nimbus 4, 5 or 6 TAP file.
+        - lazy; a boolean - True only decodes each data record when it is first used (see Data) (default=False)
+        - time_range; a (t0, t1) window in seconds since 1970/01/01 00:00:00 - only the swaths in it are read
+          (default=None, i.e. every swath)
+        - bbox; a (min_lat, max_lat, min_lon, max_lon) box in degrees north and east - only the swaths whose
+          subsatellite point is in it are read (default=None, i.e. every swath). A box with min_lon greater than
+          max_lon crosses the dateline (see Data4to6_new.in_bbox)
+        - full_coords; a boolean - False does not interpolate the full coordinates of the swaths (default=True)
+        - stats; the instrument.Stats object to time the reading in and count the bad data in (default=None, i.e.
+          a new one, kept as the stats of the Data object)
+        - use_index; a boolean - True reads the record positions and times from the sidecar index of the file,
+          building it first if it is missing or out of date (see Data) (default=False)
     Opens the file in read binary mode. Reads the file and writes it as a NetCDF."""
     if 'Nimbus4' in filename:
-        data = Data(filename)
+        data = Data(filename, lazy=lazy, time_range=time_range, bbox=bbox, full_coords=full_coords,
+                    stats=stats, use_index=use_index)
     elif 'Nimbus5' in filename:
-        data = Data2(filename)
+        data = Data2(filename, lazy=lazy, time_range=time_range, bbox=bbox, full_coords=full_coords,
+                     stats=stats, use_index=use_index)
     elif 'Nimbus6' in filename:
-        data = Data2(filename)
+        data = Data2(filename, lazy=lazy, time_range=time_range, bbox=bbox, full_coords=full_coords,
+                     stats=stats, use_index=use_index)
     else:
         raise ValueError('Not an N4-6 file')
     return data
 
-def write_NC_file(filename, output_filename=None):
+def scan_TAP_file(filename, track=False):
+    """Inputs:
+        - filename; a string corresponding to the complete path to a Nimbus 4, 5 or 6 TAP file.
+        - track; a boolean - True also finds the bounding box of the subsatellite track (default=False)
+    Outputs:
+        - summary; a dictionary of metadata for the file, holding
+            - filename, nimbus ('N4', 'N5' or 'N6'), channel (see channel_of) and dref
+            - orbit_no, station_code, mirror_rot
+            - start_datetime, end_datetime; the start and end of the file according to the orbit doc
+            - first_time, last_time; the datetimes of the first and last swaths with a time (None if no swath
+              has one)
+            - n_records; the number of data records in the file, including skipped records
+            - min_subsat_lat, max_subsat_lat, min_subsat_lon, max_subsat_lon; with track only, the box around the
+              subsatellite points of every swath, in degrees north and east (None if no swath has one). A track
+              crossing the dateline gives min_subsat_lon greater than max_subsat_lon (see find_track_box)
+    Only the record framing and the orbit doc are read, along with the time words of the first and last data
+    records which hold a swath time (see Data.get_swath_times). With track, the first two words of every swath are
+    read as well (see Data.get_swath_track). No record is decoded in full, so this is much faster than a full read,
+    for cataloguing. The swath times are the same as those in Fields.get_swath_times, without
+    the Nimbus 5 correction."""
+    data = read_TAP_file(filename, lazy=True)
+    inds = data.dr.record_numbers
+    first = find_swath_times(data, inds)
+    last = find_swath_times(data, inds[::-1])
+    od = data.od
+    name = filename.split('/')[-1]
+    summary = {'filename': filename, 'nimbus': name[0] + name[6], 'channel': channel_of(od.dref),
+               'dref': od.dref, 'orbit_no': od.orbit_no, 'station_code': od.station_code,
+               'mirror_rot': od.mirror_rot, 'start_datetime': od.start_datetime, 'end_datetime': od.end_datetime,
+               'first_time': None, 'last_time': None, 'n_records': len(data.records) - 1}
+    if len(first):
+        summary['first_time'] = dt.datetime(1970, 01, 01) + dt.timedelta(seconds=first[0])
+        summary['last_time'] = dt.datetime(1970, 01, 01) + dt.timedelta(seconds=last[-1])
+    if track:
+        summary.update(find_track_box(data, inds))
+    return summary
+
+def find_track_box(data, inds):
+    """Inputs:
+        - data; a Data object
+        - inds; the indices in data.records of the data records to use
+    Outputs:
+        - box; a dictionary of the min_subsat_lat, max_subsat_lat, min_subsat_lon and max_subsat_lon of the swaths
+          in those records, in degrees north and east (each None if no swath has a subsatellite point)
+    The longitudes are the shortest range holding them all (see lon_range), which runs across the dateline
+    (min_subsat_lon greater than max_subsat_lon) when the track does."""
+    lats = [np.array([])]
+    lons = [np.array([])]
+    for i in inds:
+        times, subsat_lats, subsat_lons = data.get_swath_track(i)
+        subsat_lats = geographic_lats(subsat_lats)
+        subsat_lons = geographic_lons(subsat_lons)
+        lats.append(subsat_lats[subsat_lats != -999])
+        lons.append(subsat_lons[subsat_lons != -999])
+    lats = np.concatenate(lats)
+    lons = np.concatenate(lons)
+    box = {'min_subsat_lat': None, 'max_subsat_lat': None, 'min_subsat_lon': None, 'max_subsat_lon': None}
+    if len(lats):
+        box['min_subsat_lat'] = float(min(lats))
+        box['max_subsat_lat'] = float(max(lats))
+    if len(lons):
+        box['min_subsat_lon'], box['max_subsat_lon'] = lon_range(lons)
+    return box
+
+def lon_range(lons):
+    """Inputs:
+        - lons; an array of longitudes, in degrees east from -180 to 180
+    Outputs:
+        - min_lon, max_lon; the ends of the shortest range of longitudes, running east from min_lon to max_lon,
+          which holds all of lons. It crosses the dateline if min_lon is greater than max_lon
+    The range is the circle less the widest gap between neighbouring longitudes."""
+    lons = np.unique(lons)
+    gaps = np.append(np.diff(lons), lons[0] + 360 - lons[-1]) # the last gap runs east across the dateline
+    widest = np.argmax(gaps)
+    if widest == len(lons) - 1:
+        return float(lons[0]), float(lons[-1])
+    return float(lons[widest + 1]), float(lons[widest])
+
+def find_swath_times(data, inds):
+    """Inputs:
+        - data; a Data object
+        - inds; the indices in data.records of the data records to try, in order
+    Outputs:
+        - times; the swath times (in seconds since 1970/01/01 00:00:00) of the first of those records to have any,
+          or an empty array if none of them do"""
+    for i in inds:
+        times = data.get_swath_times(i)
+        times = times[times != -999]
+        if len(times):
+            return times
+    return np.array([])
+
+# the variables written by write_NC_file, in the order they are created, as
+# (name, dtype, units, full_name, the Fields attribute holding the values):
+Y_VARIABLES = (
+    ('time', 'd', 'seconds', 'time since 1970/01/01 00:00:00', 'truetime'),
+    ('cell_temp', 'i', 'K', 'detector_cell_temperature', 'cell_temps'),
+    ('electronics_temp', 'i', 'K', 'electronics_temperature', 'electro_temps'),
+    ('ref_temp_A', 'i', 'K', 'housing_temperature', 'ref_temps_a'),
+    ('ref_temp_B', 'i', 'K', 'housing_temperature', 'ref_temps_b'),
+    ('ref_temp_C', 'i', 'K', 'housing_temperature', 'ref_temps_c'),
+    ('ref_temp_D', 'i', 'K', 'housing_temperature', 'ref_temps_d'),
+    ('roll_error', 'f', 'degrees', 'roll_axis_error', 'roll_errors'),
+    ('pitch_error', 'f', 'degrees', 'pitch_axis_error', 'pitch_errors'),
+    ('yaw_error', 'f', 'degrees', 'yaw_axis_error', 'yaw_errors'),
+    ('height', 'i', 'km', 'spacecraft_altitude', 'heights'),
+    ('data_population', 'i', None, 'scanline pixel number', 'dpops'),
+    ('subsat_lat', 'f', 'degrees_north', 'latitude', 'sub_satellite_lats'),
+    ('subsat_lon', 'f', 'degrees_east', 'longitude', 'sub_satellite_lons'),
+    ('flag_1', 'i', None, 'summary flag: at least one other flag is on', 'flag1'),
+    ('flag_2', 'i', None, 'bad consistency check between sample rate, vehicle time and ground time', 'flag2'),
+    ('flag_3', 'i', None, 'bad vehicle time', 'flag3'),
+    ('flag_4', 'i', None, 'vehicle time inserted by flywheel', 'flag4'),
+    ('flag_5', 'i', None, 'vehicle time carrier is absent', 'flag5'),
+    ('flag_6', 'i', None, 'vehicle time has skipped', 'flag6'),
+    ('flag_8', 'i', None, 'bad sync pulse recognition', 'flag8'),
+    ('flag_9', 'i', None, 'dropout of data signal', 'flag9'),
+    ('flag_12', 'i', None, 'bad swath size', 'flag12'),
+)
+ANCHOR_VARIABLES = (
+    ('anchor_nadang', 'f', 'degrees', 'satellite_viewing_angle_at_anchor_points', 'nadangs'),
+    ('anchor_lats', 'f', 'degrees_north', 'latitude_of_anchor_points', 'anchor_lats'), # remember to add 90
+    ('anchor_lons', 'f', 'degrees_east', 'longitude_of_anchor_points', 'anchor_lons'), # remember to change positive direction
+)
+SCENE_VARIABLES = (
+    ('BBT', 'f', 'K', 'brightness_temperature', 'data'),
+    ('lats_lagrange', 'f', 'degrees_north', 'latitude from interpolation', 'lats'),
+    ('lons_lagrange', 'f', 'degrees_east', 'longitude from interpolation', 'lons'),
+    ('lats_pyorb', 'f', 'degrees_north', 'latitude from pyorbital', 'lats2'),
+    ('lons_pyorb', 'f', 'degrees_east', 'longitude from pyorbital', 'lons2'),
+    ('solzen', 'f', 'degrees', 'solar zenith angle', 'sol_zen'),
+    ('satzen', 'f', 'degrees', 'satellite zenith angle', 'sat_zen'),
+    ('solaz', 'f', 'degrees', 'solar azimuth angle', 'sol_az'),
+    ('sataz', 'f', 'degrees', 'satellite azimuth angle', 'sat_az'),
+)
+
+def write_NC_file(filename, output_filename=None, block_size=None, profile='default', workers=None, time_range=None,
+                  bbox=None, products=None, tie_points=None, tie_points_only=False, stats=None, stats_attributes=False,
+                  use_index=False):
     """Inputs:
         - filename; a string corresponding to the complete path to a Nimbus 4, 5 or 6 TAP file
+        - output_filename; the path of the NetCDF4 file to write (default: see below)
+        - block_size; the number of scanlines to make and write at a time, or None to make the whole file before
+          writing it (default=None)
+        - profile; the name of the OUTPUT_PROFILES entry used to store the variables (default='default')
+        - workers; the number of processes to geolocate the scene with (default=None, i.e. this process only)
+        - time_range, bbox; only write the swaths in this time window and subsatellite box (see read_TAP_file)
+          (default=None)
+        - products; the scene variables to write, named by their Fields attribute (the last entry of each
+          SCENE_VARIABLES row) - e.g. ('data', 'lats', 'lons') for the brightness temperatures and the interpolated
+          coordinates (default=None, i.e. all of them)
+        - tie_points; a (line_step, pixel_step) pair - the pyorbital coordinates and the angles are only worked out
+          on every line_step-th scanline and pixel_step-th pixel, and interpolated to the rest (default=None, i.e.
+          at every pixel)
+        - tie_points_only; a boolean - True writes the pyorbital coordinates and the angles at the tie points only,
+          on the dimensions Y_tie and X_tie, instead of interpolating them (default=False)
+        - stats; the instrument.Stats object to time the stages and count the bad data in (default=None, i.e. a
+          new one) - pass one in to read the summary afterwards
+        - stats_attributes; a boolean - True writes the summary of stats to the output as global attributes,
+          named stats_* (default=False)
+        - use_index; a boolean - True reads the TAP file with its sidecar index (see read_TAP_file), so that the
+          record framing is only scanned the first time and a time_range skips the records outside it without
+          decoding them (default=False)
     Reads the TAP file into a Data object, before writing the output to a NetCDF4 file.
-    The NetCDF4 file name will be identical to the TAP file name, but with .TAP replaced by .nc"""
-    file_data = read_TAP_file(filename)
-    data_fields = Fields(file_data)
+    The NetCDF4 file name will be identical to the TAP file name, but with .TAP replaced by .nc
+    If a block_size is given, the Y dimension is unlimited and the (Y, X) scene variables (data, coordinates and
+    angles) are made and written block_size scanlines at a time, each block being freed before the next is made.
+    The file is then read lazily, and only the records holding the swaths of a block are decoded and interpolated
+    in full, so the scene only takes memory in proportion to the block size. The per-scanline and per-swath arrays
+    (times, temperatures, anchor points etc.) still grow with the length of the file.
+    The 'archive' profile compresses the output and rounds angles and coordinates to 0.001 degrees, for long
+    term storage. The 'fast-read' profile stores the variables uncompressed in chunks of a few whole scanlines,
+    so that reading a scanline only touches one small chunk.
+    With a time_range or bbox the other swaths are dropped as the file is read, so they are never interpolated or
+    geolocated, and the output only runs from the first to the last swath kept.
+    Only the stages needed for the products are run (see Data4to6_new.needed_stages): pyorbital is only called for
+    the pyorbital coordinates and the angles, and the anchor points are only interpolated for the interpolated
+    coordinates.
+    With tie_points the pyorbital calls are cut by about the product of the two steps. The error this brings can be
+    checked with report_tie_points. With tie_points_only the variables Y_tie and X_tie hold the scanline and pixel
+    indices of the tie points, so that a reader can interpolate them back to the scene."""
+    if profile not in OUTPUT_PROFILES:
+        raise ValueError('Output profile not recognised')
+    if tie_points_only and (tie_points is None or block_size is not None):
+        raise ValueError('Writing only the tie points needs tie_points, and no block_size')
+    if products is None:
+        products = [field for name, dtype, units, full_name, field in SCENE_VARIABLES]
+    tied = []
+    if tie_points_only:
+        tied = [name for name in products if 'scanlines' not in needed_stages([name])]
+        products = [name for name in products if name not in tied]
+    full_coords = 'full_coords' in needed_stages(products)
+    file_data = read_TAP_file(filename, lazy=block_size is not None, time_range=time_range, bbox=bbox,
+                              full_coords=full_coords, stats=stats, use_index=use_index)
+    data_fields = Fields(file_data, scene=block_size is None, workers=workers, products=products,
+                         tie_points=tie_points)
+    tie_grid = None
+    if tied:
+        tie_grid = data_fields.tie_point_grid(file_data, tied, workers=workers)
     if output_filename == None:
-        nc_filename = filename.replace('.TAP','_new.nc')
-        nc = Dataset(nc_filename,'w')
-    else:
-        nc = Dataset(output_filename, 'w')
+        output_filename = filename.replace('.TAP','_new.nc')
+    write_fields(file_data, data_fields, output_filename, block_size, profile, workers, tie_grid, stats_attributes)
+
+def write_fields(file_data, data_fields, output_filename, block_size=None, profile='default', workers=None,
+                 tie_grid=None, stats_attributes=False):
+    """Inputs:
+        - file_data; the Data (or Data2) object for the file
+        - data_fields; the Fields object made from file_data (made with scene=False if a block_size is given)
+        - output_filename; the path of the NetCDF4 file to write
+        - block_size, profile, workers; as in write_NC_file
+        - tie_grid; the (rows, cols, grid) tie points made by Fields.tie_point_grid, to be written on the Y_tie and
+          X_tie dimensions (default=None, i.e. no tie points)
+        - stats_attributes; a boolean - True writes the summary of data_fields.stats as global attributes
+          (default=False)
+    Writes the variables of data_fields to a NetCDF4 file (see write_NC_file). Only the scene variables among the
+    products of data_fields (and in tie_grid) are written. The time taken is added to the 'netcdf' stage of the
+    stats, less that of the scene blocks made while streaming."""
+    streaming = block_size is not None
+    timer = data_fields.stats.start('netcdf')
+    nc = Dataset(output_filename, 'w')
     nc.mirror_rotation = file_data.od.mirror_rot
     nc.sample_frequency= file_data.od.sample_freq
     nc.orbit_number = file_data.od.orbit_no
@@ -35,99 +259,179 @@ def write_NC_file(filename, output_filename=None):
     nc.swath_block = file_data.od.swath_block
     nc.swaths_per_record = file_data.od.swaths_per_rec
     nc.locator_number = file_data.od.locator_no
-    Y_dim = nc.createDimension('Y', data_fields.data.shape[0])
-    X_dim = nc.createDimension('X', data_fields.data.shape[1])
+    if data_fields.tie_points is not None:
+        nc.tie_point_line_step, nc.tie_point_pixel_step = data_fields.tie_points
+    n_Y = len(data_fields.truetime)
+    n_X = data_fields.swath_width
+    if streaming:
+        Y_dim = nc.createDimension('Y', None)
+    else:
+        Y_dim = nc.createDimension('Y', n_Y)
+    X_dim = nc.createDimension('X', n_X)
     x_dim = nc.createDimension('x', data_fields.nadangs.shape[1])
-    Y_var = create_variable(nc, ['Y'], 'Y', 'i')
-    X_var = create_variable(nc, ['X'], 'X', 'i')
-    x_var = create_variable(nc, ['x'], 'x', 'i')
-    time_var = create_variable(nc, ['Y'], 'time', 'd', 'seconds', 'time since 1970/01/01 00:00:00')
-    cell_var = create_variable(nc, ['Y'], 'cell_temp', 'i', 'K', 'detector_cell_temperature')
-    elec_var = create_variable(nc, ['Y'], 'electronics_temp', 'i', 'K', 'electronics_temperature')
-    refa_var = create_variable(nc, ['Y'], 'ref_temp_A', 'i', 'K', 'housing_temperature')
-    refb_var = create_variable(nc, ['Y'], 'ref_temp_B', 'i', 'K', 'housing_temperature')
-    refc_var = create_variable(nc, ['Y'], 'ref_temp_C', 'i', 'K', 'housing_temperature')
-    refd_var = create_variable(nc, ['Y'], 'ref_temp_D', 'i', 'K', 'housing_temperature')
-    roll_var = create_variable(nc, ['Y'], 'roll_error', 'f', 'degrees', 'roll_axis_error')
-    pitch_var = create_variable(nc, ['Y'], 'pitch_error', 'f', 'degrees', 'pitch_axis_error')
-    yaw_var = create_variable(nc, ['Y'], 'yaw_error', 'f', 'degrees', 'yaw_axis_error')
-    height_var = create_variable(nc, ['Y'], 'height', 'i', 'km', 'spacecraft_altitude')
-    dpop_var = create_variable(nc, ['Y'], 'data_population', 'i', full_name='scanline pixel number')
-    sublat_var = create_variable(nc, ['Y'], 'subsat_lat', 'f', 'degrees_north', 'latitude')
-    sublon_var = create_variable(nc, ['Y'], 'subsat_lon', 'f', 'degrees_east', 'longitude')
-    flag1_var = create_variable(nc, ['Y'], 'flag_1', 'i', full_name='summary flag: at least one other flag is on')
-    flag2_var = create_variable(nc, ['Y'], 'flag_2', 'i', full_name='bad consistency check between sample rate, vehicle time and ground time')
-    flag3_var = create_variable(nc, ['Y'], 'flag_3', 'i', full_name='bad vehicle time')
-    flag4_var = create_variable(nc, ['Y'], 'flag_4', 'i', full_name='vehicle time inserted by flywheel')
-    flag5_var = create_variable(nc, ['Y'], 'flag_5', 'i', full_name='vehicle time carrier is absent')
-    flag6_var = create_variable(nc, ['Y'], 'flag_6', 'i', full_name='vehicle time has skipped')
-    flag8_var = create_variable(nc, ['Y'], 'flag_8', 'i', full_name='bad sync pulse recognition')
-    flag9_var = create_variable(nc, ['Y'], 'flag_9', 'i', full_name='dropout of data signal')
-    flag12_var = create_variable(nc, ['Y'], 'flag_12', 'i', full_name='bad swath size')
-    anchor_nads_var = create_variable(nc, ['x','Y'], 'anchor_nadang', 'f', 'degrees', 'satellite_viewing_angle_at_anchor_points')
-    anchor_lats_var = create_variable(nc, ['x','Y'], 'anchor_lats', 'f', 'degrees_north', 'latitude_of_anchor_points') # remember to add 90
-    anchor_lons_var = create_variable(nc, ['x','Y'], 'anchor_lons', 'f', 'degrees_east', 'longitude_of_anchor_points') # remember to change positive direction
-    data_var = create_variable(nc, ['X','Y'], 'BBT', 'f', 'K', 'brightness_temperature')
-    lats_var = create_variable(nc, ['X','Y'], 'lats_lagrange', 'f', 'degrees_north', 'latitude from interpolation')
-    lons_var = create_variable(nc, ['X','Y'], 'lons_lagrange', 'f', 'degrees_east', 'longitude from interpolation')
-    lats_var2 = create_variable(nc, ['X','Y'], 'lats_pyorb', 'f', 'degrees_north', 'latitude from pyorbital')
-    lons_var2 = create_variable(nc, ['X','Y'], 'lons_pyorb', 'f', 'degrees_east', 'longitude from pyorbital')
-    solzen_var = create_variable(nc, ['X','Y'], 'solzen', 'f', 'degrees', 'solar zenith angle')
-    satzen_var = create_variable(nc, ['X','Y'], 'satzen', 'f', 'degrees', 'satellite zenith angle')
-    solaz_var = create_variable(nc, ['X','Y'], 'solaz', 'f', 'degrees', 'solar azimuth angle')
-    sataz_var = create_variable(nc, ['X','Y'], 'sataz', 'f', 'degrees', 'satellite azimuth angle')
-    Y_var[:] = np.arange(data_fields.data.shape[0])
-    X_var[:] = np.arange(data_fields.data.shape[1])
-    time_var[:] = data_fields.truetime
-    cell_var[:] = data_fields.cell_temps
-    elec_var[:] = data_fields.electro_temps
-    refa_var[:] = data_fields.ref_temps_a
-    refb_var[:] = data_fields.ref_temps_b
-    refc_var[:] = data_fields.ref_temps_c
-    refd_var[:] = data_fields.ref_temps_d
-    roll_var[:] = data_fields.roll_errors
-    pitch_var[:] = data_fields.pitch_errors
-    yaw_var[:] = data_fields.yaw_errors
-    height_var[:] = data_fields.heights
-    dpop_var[:] = data_fields.dpops 
-    sublat_var[:] = data_fields.sub_satellite_lats
-    sublon_var[:] = data_fields.sub_satellite_lons
-    flag1_var[:] = data_fields.flag1
-    flag2_var[:] = data_fields.flag2
-    flag3_var[:] = data_fields.flag3
-    flag4_var[:] = data_fields.flag4
-    flag5_var[:] = data_fields.flag5
-    flag6_var[:] = data_fields.flag6
-    flag8_var[:] = data_fields.flag8
-    flag9_var[:] = data_fields.flag9
-    flag12_var[:] = data_fields.flag12
-    anchor_nads_var[:] = data_fields.nadangs
-    anchor_lats_var[:] = data_fields.anchor_lats
-    anchor_lons_var[:] = data_fields.anchor_lons
-    data_var[:] = data_fields.data
-    lats_var[:] = data_fields.lats
-    lons_var[:] = data_fields.lons
-    lats_var2[:] = data_fields.lats2
-    lons_var2[:] = data_fields.lons2
-    solzen_var[:] = data_fields.sol_zen
-    satzen_var[:] = data_fields.sat_zen
-    solaz_var[:] = data_fields.sol_az
-    sataz_var[:] = data_fields.sat_az
+    Y_var = create_variable(nc, ['Y'], 'Y', 'i', profile=profile, block_size=block_size)
+    X_var = create_variable(nc, ['X'], 'X', 'i', profile=profile)
+    x_var = create_variable(nc, ['x'], 'x', 'i', profile=profile)
+    scene_variables = [row for row in SCENE_VARIABLES if row[4] in data_fields.products]
+    variables = {}
+    for name, dtype, units, full_name, field in Y_VARIABLES:
+        variables[field] = create_variable(nc, ['Y'], name, dtype, units, full_name, profile, block_size)
+    for name, dtype, units, full_name, field in ANCHOR_VARIABLES:
+        variables[field] = create_variable(nc, ['x','Y'], name, dtype, units, full_name, profile, block_size)
+    for name, dtype, units, full_name, field in scene_variables:
+        variables[field] = create_variable(nc, ['X','Y'], name, dtype, units, full_name, profile, block_size)
+    Y_var[:] = np.arange(n_Y)
+    X_var[:] = np.arange(n_X)
+    if tie_grid is not None:
+        rows, cols, grid = tie_grid
+        nc.createDimension('Y_tie', len(rows))
+        nc.createDimension('X_tie', len(cols))
+        Y_tie_var = create_variable(nc, ['Y_tie'], 'Y_tie', 'i', None, 'scanline index of tie points', profile)
+        X_tie_var = create_variable(nc, ['X_tie'], 'X_tie', 'i', None, 'pixel index of tie points', profile)
+        Y_tie_var[:] = rows
+        X_tie_var[:] = cols
+        for name, dtype, units, full_name, field in SCENE_VARIABLES:
+            if field in grid:
+                variable = create_variable(nc, ['X_tie','Y_tie'], name, dtype, units, full_name, profile)
+                variable[:] = grid[field]
+    for name, dtype, units, full_name, field in Y_VARIABLES + ANCHOR_VARIABLES:
+        variables[field][:] = getattr(data_fields, field)
+    if streaming:
+        for start in range(0, n_Y, block_size):
+            stop = min(start + block_size, n_Y)
+            data_fields.stats.stop(timer)
+            block = data_fields.scene_block(file_data, start, stop, workers=workers)
+            timer = data_fields.stats.start('netcdf')
+            for name, dtype, units, full_name, field in scene_variables:
+                variables[field][start:stop] = block[field]
+            del block
+            nc.sync()
+    else:
+        for name, dtype, units, full_name, field in scene_variables:
+            variables[field][:] = getattr(data_fields, field)
+    data_fields.stats.stop(timer)
+    if stats_attributes:
+        data_fields.stats.write_attributes(nc)
     nc.close()
 
-def create_variable(dataset, dims, name, dtype, units=None, full_name=None):
+# the scene products geolocated by report_tie_points:
+TIE_POINT_PRODUCTS = ('lats2', 'lons2', 'sol_zen', 'sol_az', 'sat_zen', 'sat_az')
+
+def report_tie_points(filename, steps=((2, 4), (4, 8), (8, 16), (16, 32)), ellipsoid=True, workers=None,
+                      logger=None):
+    """Inputs:
+        - filename; a string corresponding to the complete path to a Nimbus 4, 5 or 6 TAP file
+        - steps; the (line_step, pixel_step) tie points to try (default=((2, 4), (4, 8), (8, 16), (16, 32)))
+        - ellipsoid, workers; passed to Fields (default=True, None)
+        - logger; the logging.Logger the report is logged to, at INFO (default: the 'tap_reader' logger)
+    Outputs:
+        - report; a dictionary keyed by 'full' and each of the steps, holding the 'seconds' taken to geolocate the
+          scene and (for the steps) the 'errors' of each product against the full computation (see
+          geolocation.tie_point_errors)
+    Geolocates the file at every pixel and then from each set of tie points, to choose a tie point spacing which
+    is accurate enough. The time taken and the errors are logged as they are found (see format_tie_point_report,
+    and tie_point_report.py to print them)."""
+    if logger is None:
+        logger = logging.getLogger('tap_reader')
+    products = TIE_POINT_PRODUCTS
+    file_data = read_TAP_file(filename, full_coords=False)
+    data_fields = Fields(file_data, ellipsoid, scene=False, workers=workers, products=products)
+    n_Y = len(data_fields.truetime)
+    t = time.time()
+    full = data_fields.scene_block(file_data, 0, n_Y, ellipsoid, workers)
+    report = {'full': {'seconds': time.time() - t}}
+    logger.info(format_tie_point_report(report, ['full'])[0])
+    for step in steps:
+        data_fields.tie_points = step
+        t = time.time()
+        tied = data_fields.scene_block(file_data, 0, n_Y, ellipsoid, workers)
+        report[step] = {'seconds': time.time() - t, 'errors': tie_point_errors(full, tied, ('lons2', 'sol_az',
+                                                                                           'sat_az'))}
+        for line in format_tie_point_report(report, [step]):
+            logger.info(line)
+    return report
+
+def format_tie_point_report(report, keys=None):
+    """Inputs:
+        - report; a report made by report_tie_points
+        - keys; the entries of the report to format (default: 'full' and then every step)
+    Outputs:
+        - lines; the lines of text describing each entry - the time taken, and for the steps the maximum and RMS
+          error and the number of pixels lost for each product"""
+    if keys is None:
+        keys = ['full'] + sorted([key for key in report if key != 'full'])
+    lines = []
+    for key in keys:
+        if key == 'full':
+            lines.append('full: %.2f s' % report[key]['seconds'])
+            continue
+        lines.append('%d x %d: %.2f s' % (key[0], key[1], report[key]['seconds']))
+        for name in TIE_POINT_PRODUCTS:
+            errors = report[key]['errors'][name]
+            lines.append('    %-8s max %.5f rms %.5f lost %d' % (name, errors['max'], errors['rms'], errors['lost']))
+    return lines
+
+# named sets of storage options for the output variables:
+#   - zlib, shuffle, complevel; compression, as in netCDF4.Dataset.createVariable
+#   - digits; the least_significant_digit kept in the angle and coordinate variables (those in degrees)
+#   - scanlines; the number of whole scanlines in each chunk
+OUTPUT_PROFILES = {
+    'default': {},
+    'archive': {'zlib': True, 'shuffle': True, 'complevel': 4, 'digits': 3, 'scanlines': 512},
+    'fast-read': {'scanlines': 16},
+}
+DEGREE_UNITS = ('degrees', 'degrees_north', 'degrees_east')
+
+def profile_options(dataset, dims, units, profile, block_size=None):
+    """Inputs:
+        - dataset; the netCDF4 Dataset the variable belongs to
+        - dims; the dimensions of the variable, in the order they are created
+        - units; the units of the variable
+        - profile; the name of one of the OUTPUT_PROFILES
+        - block_size; the number of scanlines written at a time to an unlimited Y dimension (default=None)
+    Outputs:
+        - options; the keyword arguments for createVariable that put the profile into effect
+    Chunks are aligned to whole scanlines: they cover every element of the other dimensions and the number of
+    scanlines given by the profile. A profile without a number of scanlines is chunked by block_size scanlines
+    along an unlimited Y, as the netCDF library would otherwise store it a scanline to a chunk, and hold an index
+    entry for every one of them in memory."""
+    if profile not in OUTPUT_PROFILES:
+        raise ValueError('Output profile not recognised')
+    settings = OUTPUT_PROFILES[profile]
+    options = {}
+    for key in ('zlib', 'shuffle', 'complevel'):
+        if key in settings:
+            options[key] = settings[key]
+    if 'digits' in settings and units in DEGREE_UNITS:
+        options['least_significant_digit'] = settings['digits']
+    scanlines = settings.get('scanlines')
+    if scanlines is None and 'Y' in dims and dataset.dimensions['Y'].isunlimited():
+        scanlines = block_size
+    if scanlines is not None and 'Y' in dims:
+        chunks = []
+        for dim in dims:
+            size = len(dataset.dimensions[dim])
+            if dim == 'Y':
+                chunks.append(scanlines if dataset.dimensions[dim].isunlimited() else max(1, min(scanlines, size)))
+            else:
+                chunks.append(max(1, size))
+        options['chunksizes'] = tuple(chunks)
+    return options
+
+def create_variable(dataset, dims, name, dtype, units=None, full_name=None, profile='default', block_size=None):
     if len(dims)==1:
-        var = dataset.createVariable(name, dtype, ((dims[0]),), fill_value=-999)
+        dims = (dims[0],)
     elif len(dims)==2:
-        var = dataset.createVariable(name, dtype, (dims[1],dims[0],), fill_value=-999)
+        dims = (dims[1],dims[0],)
     else:
         raise ValueError('Not expecting this many dimensions')
+    var = dataset.createVariable(name, dtype, dims, fill_value=-999,
+                                 **profile_options(dataset, dims, units, profile, block_size))
     if units!=None:
         var.units = units
     if full_name!=None:
         var.standard_name = full_name
     return var
 
-
 if __name__ == '__main__':
     write_NC_file('/glusterfs/surft/data/T_Eldridge_data/Nimbus_4_data/window/1970/110/Nimbus4-THIRCH115_1970m0420t003837_o00159_DD15397.TAP')
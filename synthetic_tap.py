@@ -0,0 +1,178 @@
+import os
+import datetime as dt
+import numpy as np
+
+# the start time written into synthetic files, for each satellite (inside the span of its TLE file):
+DEFAULT_STARTS = {'N4': dt.datetime(1970, 4, 20, 0, 38, 37), 'N5': dt.datetime(1973, 4, 20, 0, 38, 37),
+                  'N6': dt.datetime(1976, 4, 20, 0, 38, 37)}
+SIX_BIT_PARITY = np.array([0b1000000 if bin(six).count('1') % 2 == 0 else 0 for six in range(64)], dtype=np.int64)
+ORBIT_PERIOD = 6480. # seconds, for the subsatellite track of synthetic files
+
+def half_word(wordD, wordA):
+    """Returns the 36 bit TAP word made from the 18 bit half words wordD (most significant) and wordA (least
+    significant), the reverse of tap_words.split_half_words. Both may be arrays."""
+    return ((np.asarray(wordD, dtype=np.int64) & 0x3FFFF) << 18) | (np.asarray(wordA, dtype=np.int64) & 0x3FFFF)
+
+def encode_words_n4(words):
+    """Inputs:
+        - words; an array of 36 bit TAP words
+    Outputs:
+        - the_bytes; an int8 array of six bytes for every word, as written by the Nimbus 4 machine
+    The reverse of tap_words.read_words_n4: each byte holds six bits of the word, most significant first, with the
+    parity bit (0b1000000) on when an even number of those six bits are on, so every byte passes Data.parity."""
+    words = np.asarray(words, dtype=np.int64)
+    sixes = np.empty((len(words), 6), dtype=np.int64)
+    for i in range(6):
+        sixes[:, i] = (words >> (6*(5-i))) & 0b111111
+    return (sixes | SIX_BIT_PARITY[sixes]).astype(np.int8).ravel()
+
+def encode_words_n56(words):
+    """Inputs:
+        - words; an array of 36 bit TAP words (an odd number is padded with a zero word)
+    Outputs:
+        - the_bytes; an int8 array of nine bytes for every pair of words, as written by the Nimbus 5 and 6 machines
+    The reverse of tap_words.read_words_n56: each pair of words is packed into 72 bits, the first word taking the
+    most significant 36."""
+    words = np.asarray(words, dtype=np.int64)
+    if len(words) % 2:
+        words = np.append(words, 0)
+    high = words[0::2]
+    low = words[1::2]
+    pairs = np.empty((len(high), 9), dtype=np.int64)
+    for i in range(4):
+        pairs[:, i] = high >> (28 - 8*i)
+        pairs[:, 5+i] = low >> (24 - 8*i)
+    pairs[:, 4] = ((high & 0b1111) << 4) | (low >> 32)
+    return (pairs & 0b11111111).astype(np.uint8).view(np.int8).ravel()
+
+def synthetic_filename(directory, nimbus='N4', start=None, orbit_no=159, tag='synthetic'):
+    """Inputs:
+        - directory; the directory the file is to be written in
+        - nimbus; the satellite ('N4', 'N5' or 'N6') (default='N4')
+        - start; the start datetime of the file (default: DEFAULT_STARTS for the satellite)
+        - orbit_no; the orbit number in the name (default=159)
+        - tag; the last part of the name, in place of the tape number (default='synthetic')
+    Outputs:
+        - filename; a path named like the archive's TAP files, which is how the reader tells the satellite and the
+          year of a file (see main.read_TAP_file and Orbit_Doc.make_start_datetime)"""
+    if start is None:
+        start = DEFAULT_STARTS[nimbus]
+    name = 'Nimbus%s-THIRCH115_%s_o%05d_%s.TAP' % (nimbus[1], start.strftime('%Ym%m%dt%H%M%S'), orbit_no, tag)
+    return os.path.join(directory, name)
+
+def write_record(out, the_bytes, skip=False):
+    """Writes one record to the open file out: a 32 bit header holding the length of the_bytes (with the sign bit
+    on if the record is to be skipped), the bytes, and a footer repeating the length (see tap_records.read_header)."""
+    header = len(the_bytes) | (0x80000000 if skip else 0)
+    np.array([header], dtype=np.uint32).tofile(out)
+    np.asarray(the_bytes, dtype=np.int8).tofile(out)
+    np.array([len(the_bytes)], dtype=np.uint32).tofile(out)
+
+def swath_words(seconds, data_pop, subsat_lat, subsat_lon, anchor_lats, anchor_lons, temps, swath_block):
+    """Inputs:
+        - seconds; the swath seconds (the second of the data record plus the time since it)
+        - data_pop; the data population of the swath (0 for a fill swath)
+        - subsat_lat, subsat_lon; the subsatellite point, in degrees
+        - anchor_lats, anchor_lons; the anchor point coordinates, in degrees
+        - temps; the data_pop brightness temperatures, in K
+        - swath_block; the number of words in the swath
+    Outputs:
+        - words; the swath_block words of the swath, laid out as in tap_words.make_swath_words and scaled as in
+          Swath_Data. Latitudes are stored plus 90, and longitudes positive to the west from 0 to 360 (as undone
+          in Fields.set_big_arrays)"""
+    words = np.zeros(swath_block, dtype=np.int64)
+    temps = np.append(np.round(np.asarray(temps)*8), np.zeros(len(temps) % 2))
+    full_words = np.concatenate(([half_word(int(round(seconds*512)), data_pop),
+                                  half_word(int(round((subsat_lat + 90)*64)), int(round((-subsat_lon % 360)*64))),
+                                  0],
+                                 half_word(np.round((anchor_lats + 90)*64), np.round((-anchor_lons % 360)*64)),
+                                 half_word(temps[0::2], temps[1::2])))
+    if len(full_words) > swath_block:
+        raise ValueError('Swath does not fit in its swath block')
+    words[:len(full_words)] = full_words
+    return words
+
+def write_synthetic_TAP_file(filename, n_records=100, data_pop=400, locator_no=31, swaths_per_rec=6,
+                             mirror_rot=288., bad_parity=0, skip_records=(), gaps=(), gap_seconds=60.,
+                             fill_swaths=(), seed=0):
+    """Inputs:
+        - filename; the path of the file to write, named as by synthetic_filename (the satellite and the start time
+          are taken from the name)
+        - n_records; the number of data records (default=100)
+        - data_pop; the data population of every swath (default=400)
+        - locator_no; the number of anchor points in each swath (default=31)
+        - swaths_per_rec; the number of swaths in each data record (even for Nimbus 5 and 6) (default=6)
+        - mirror_rot; the scan mirror rotation rate, in degrees per second (default=288., i.e. 1.25 s per swath)
+        - bad_parity; the number of bytes in each data record (chosen at random) with a wrong parity bit. Only
+          Nimbus 4 files have parity bits (default=0)
+        - skip_records; the indices (from 0) of the data records to write with the skip flag on (default=())
+        - gaps; the indices of the data records to start gap_seconds late, leaving a gap in time before them
+          (default=())
+        - gap_seconds; the length of each gap (default=60.)
+        - fill_swaths; (record, swath) index pairs of swaths to write with a data population of 0 (default=())
+        - seed; the seed of the random brightness temperatures and parity errors (default=0)
+    Outputs:
+        - filename; the path of the file written
+    Writes a valid TAP file of the size asked for, with an orbit doc and n_records data records framed by headers
+    and footers and ended by two zero headers. Nimbus 4 words are written six bits to a byte with parity bits, and
+    Nimbus 5 and 6 words packed two to nine bytes, following the layouts read by Data and Data2. The satellite
+    follows a circular polar track, with the anchor points spread across it by their nadir angles, and the
+    brightness temperatures are random. The files are for testing and benchmarking the reader: the values are
+    plausible, not physical."""
+    name = os.path.basename(filename)
+    nimbus = name[0] + name[6]
+    start = dt.datetime.strptime(name.split('_')[1], '%Ym%m%dt%H%M%S')
+    if bad_parity and nimbus != 'N4':
+        raise ValueError('Parity errors can only be injected into Nimbus 4 files')
+    if nimbus != 'N4' and swaths_per_rec % 2:
+        raise ValueError('Nimbus 5 and 6 swaths come in pairs')
+    rng = np.random.RandomState(seed)
+    rot = 360./mirror_rot
+    swath_block = 3 + locator_no + -(-data_pop // 2)
+    if nimbus == 'N4':
+        encode = encode_words_n4
+        head_length = 7 + locator_no
+    else:
+        encode = encode_words_n56
+        swath_block += 1 - (swath_block % 2) # so that the second swath of a pair starts on a word pair boundary
+        head_length = 2*(4 + max(0, -(-(locator_no-1) // 2)))
+    duration = n_records*swaths_per_rec*rot + len(gaps)*gap_seconds
+    end = start + dt.timedelta(seconds=duration)
+    nadir_angles = np.linspace(-55, 55, locator_no)
+    spread = nadir_angles/55.
+    out = open(filename, 'wb')
+    try:
+        od_words = [115, 0, start.timetuple().tm_yday, start.hour, start.minute, start.second,
+                    end.timetuple().tm_yday, end.hour, end.minute, end.second, int(round(mirror_rot*512)), 1000,
+                    int(name.split('_')[2][1:]), 7, swath_block, swaths_per_rec, locator_no]
+        write_record(out, encode(od_words))
+        elapsed = 0.
+        for i in range(n_records):
+            if i in gaps:
+                elapsed += gap_seconds
+            rec_time = start + dt.timedelta(seconds=int(elapsed))
+            head = np.zeros(head_length, dtype=np.int64)
+            head[:7] = [half_word(rec_time.timetuple().tm_yday, rec_time.hour),
+                        half_word(rec_time.minute, rec_time.second), half_word(720, 721), half_word(719, 1100),
+                        half_word(250, 280), half_word(300, 301), half_word(302, 303)]
+            head[7:7+locator_no] = np.round(abs(nadir_angles)*64).astype(np.int64) | np.where(nadir_angles < 0,
+                                                                                             2**35, 0)
+            words = [head]
+            for j in range(swaths_per_rec):
+                t = elapsed + j*rot
+                phase = 2*np.pi*t/ORBIT_PERIOD
+                lat = 80*np.sin(phase)
+                lon = 100 - 360*t/86400. + 20*np.cos(phase)
+                pop = 0 if (i, j) in fill_swaths else data_pop
+                words.append(swath_words(rec_time.second + (elapsed - int(elapsed)) + j*rot, pop, lat, lon,
+                                         np.clip(lat + 2*spread, -89, 89), lon + 25*spread,
+                                         200 + 80*rng.rand(pop), swath_block))
+            the_bytes = encode(np.concatenate(words))
+            if bad_parity:
+                the_bytes[rng.randint(0, len(the_bytes), bad_parity)] ^= 0b1000000
+            write_record(out, the_bytes, i in skip_records)
+            elapsed += swaths_per_rec*rot
+        np.zeros(2, dtype=np.int32).tofile(out)
+    finally:
+        out.close()
+    return filename
@@ -0,0 +1,150 @@
+import os
+import mmap
+import warnings
+import numpy as np
+
+RECORD_DTYPE = np.dtype([('offset', np.int64), ('length', np.int64), ('skip', bool), ('time', np.float64)])
+
+def load_file(the_file, use_mmap=True):
+    """Inputs:
+        - the_file; a string representing a path to a .TAP file
+        - use_mmap; a boolean - True memory-maps the file, False reads it in one bulk call (default=True)
+    Outputs:
+        - buf; a read-only int8 array holding every byte in the file
+    Slices of buf are views, so records can be handed to the decoders without copying. Reading the file in one
+    bulk call may be faster than memory-mapping it on some network filesystems."""
+    pointer = open(the_file, 'rb')
+    try:
+        if use_mmap:
+            try:
+                the_map = mmap.mmap(pointer.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty files cannot be mapped
+                return np.zeros(0, dtype=np.int8)
+            return np.frombuffer(the_map, dtype=np.int8)
+        return np.fromfile(pointer, dtype=np.int8)
+    finally:
+        pointer.close()
+
+def read_header(buf, pos):
+    """Inputs:
+        - buf; the int8 array of bytes in the file
+        - pos; the index in buf at which the header starts
+    Outputs:
+        - header; an integer representing the length of the next block to be read (None at the end of the file)
+        - pos; the index in buf just after the header
+        - EOF; a boolean - True stops the reader, False carries on
+        - skip; a boolean - True skips the upcoming data record (including the swath data blocks), False doesn't
+    Reads 32 bits from the file as a header (headers are not written on tape, so no endian-ness). Checks the signbit
+    of the header - if this is on then the upcoming block is bad and should be skipped. If the header is zero valued
+    (sometimes happens at the start of the file) then another should be read. If two headers are consecutively zero
+    valued then the EOF has been reached. EOF can also be reached within a scan block. If this happens, fewer than
+    four bytes are left for the header. This is another EOF condition."""
+    for prev in range(2):
+        if len(buf) - pos < 4:
+            return None, pos, True, False
+        raw_header = int(buf[pos:pos+4].view(np.int32)[0])
+        pos += 4
+        header = raw_header & ((2**31)-1)
+        skip = header != raw_header
+        if header != 0:
+            return header, pos, False, skip
+    return header, pos, True, skip
+
+def scan_records(buf, stats=None):
+    """Inputs:
+        - buf; the int8 array of bytes in the file
+        - stats; an instrument.Stats object to count the header/footer mismatches in (default=None)
+    Outputs:
+        - records; an array of (offset, length, skip, time) record descriptors, one for each record in the file
+          (the first is the orbit documentation record). The time is left as -999 (see Data.set_record_times)
+    Walks the header/footer framing of the file once. Each record is preceded by a header giving its length
+    and followed by a footer which should match that header - if this is not the case the user is warned.
+    A record cut short by the end of the file is kept, with the length of the bytes that are there.
+    The scan stops when one of the end conditions in read_header is met."""
+    records = []
+    header, pos, end, skip = read_header(buf, 0)
+    while not end:
+        length = min(header, len(buf) - pos)
+        records.append((pos, length, skip, -999))
+        pos += length
+        footer, pos, end, footer_skip = read_header(buf, pos)
+        if footer is not None and footer != header:
+            warnings.warn('header and footer do not match')
+            if stats is not None:
+                stats.count('header_footer_mismatches')
+        if not end:
+            header, pos, end, skip = read_header(buf, pos)
+    return np.array(records, dtype=RECORD_DTYPE)
+
+def record_bytes(buf, records, i):
+    """Inputs:
+        - buf; the int8 array of bytes in the file
+        - records; the array of record descriptors made by scan_records
+        - i; the index of the record
+    Outputs:
+        - the_bytes; a view of the bytes in record i"""
+    offset = records['offset'][i]
+    return buf[offset:offset+records['length'][i]]
+
+def index_path(the_file):
+    """Returns the path of the sidecar index file for the_file."""
+    return the_file + '.idx.npz'
+
+def file_key(the_file):
+    """Returns the (size, mtime) of the_file. An index is only reused while these are unchanged."""
+    stat = os.stat(the_file)
+    return np.array([stat.st_size, stat.st_mtime], dtype=np.float64)
+
+def load_index(the_file, stats=None):
+    """Inputs:
+        - the_file; a string representing a path to a .TAP file
+        - stats; an instrument.Stats object to count the header/footer mismatches found when the index was made
+          in (default=None)
+    Outputs:
+        - records; the array of record descriptors saved by save_index, or None if there is no index, it was made
+          from a different version of the file, or it does not hold the number of mismatches"""
+    try:
+        index = np.load(index_path(the_file))
+        try:
+            key = index['key']
+            records = index['records']
+            mismatches = int(index['mismatches'])
+        finally:
+            index.close()
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+    if not np.array_equal(key, file_key(the_file)) or records.dtype != RECORD_DTYPE:
+        return None
+    if stats is not None:
+        stats.count('header_footer_mismatches', mismatches)
+    return records
+
+def save_index(the_file, records, mismatches=0):
+    """Inputs:
+        - the_file; a string representing a path to a .TAP file
+        - records; the array of record descriptors for the_file (with times filled in)
+        - mismatches; the number of header/footer mismatches scan_records found in the_file (default=0)
+    Saves the record descriptors beside the_file, keyed by its size and mtime, with the number of mismatches so
+    that they are still counted when the file is read from the index. If the index cannot be written (e.g. the
+    archive is read-only) the user is warned and the index is not kept."""
+    try:
+        np.savez(index_path(the_file), key=file_key(the_file), records=records, mismatches=mismatches)
+    except (IOError, OSError) as e:
+        warnings.warn('could not save record index: ' + str(e))
+
+def find_records(records, t0, t1):
+    """Inputs:
+        - records; an array of record descriptors with times filled in
+        - t0, t1; the start and end of a time window, in seconds since 1970/01/01 00:00:00
+    Outputs:
+        - inds; the indices in records of the data records that overlap the window
+    A data record is taken to run from the time of its first swath until the time of the next readable record, or
+    without end if the time goes back there. Skipped records and records whose time could not be read are never
+    returned."""
+    good = (~records['skip']) & (records['time'] != -999)
+    good[0] = False # the orbit doc
+    inds = np.nonzero(good)[0]
+    starts = records['time'][inds]
+    ends = np.append(starts[1:], np.inf)
+    ends[ends < starts] = np.inf
+    return inds[(starts <= t1) & (ends > t0)]
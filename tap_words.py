@@ -0,0 +1,123 @@
+import numpy as np
+
+def read_words_n4(the_bytes, goodness, count=None):
+    """Inputs:
+        - the_bytes; the array of bytes for a whole record (or any part of one)
+        - goodness; the boolean array of goodness, parallel to the_bytes
+        - count; the number of words to return (default: as many as the bytes hold)
+    Outputs:
+        - words; an int64 array of TAP words made from the bytes
+    The THIR recorded data in a six-bit-native-byte machine - hence when read by a modern
+    (eight-bit-native-byte) machine two bits are extraneous. These bits are utilised as a check- and parity
+    bit, and were handled in the get_bytes_and_goodness method of Data. The bytes are reshaped to (n_words, 6)
+    and the six least significant bits from each byte are shifted into place, so that every 36 bit word in the
+    record is made in one go. Any word containing a bad byte is set to -999.
+    A trailing word with fewer than six bytes is made from the bytes that are there (without the missing shifts),
+    and words past the end of the bytes are zero. This is how the word-at-a-time reader behaved.
+    NOTE: During this process, the endianness of the word is also changed. This is because the THIR machine was
+    of opposite endianness to the machine on which this code was written. If this is not the case for the machine
+    you are using, this function may need replacing."""
+    n_bytes = len(the_bytes)
+    n_words = -(-n_bytes // 6)
+    if count is None:
+        count = n_words
+    padded = np.zeros(n_words * 6, dtype=np.int64)
+    padded[:n_bytes] = np.asarray(the_bytes) & 0b111111
+    good = np.ones(n_words * 6, dtype=bool)
+    good[:n_bytes] = goodness
+    padded = padded.reshape(n_words, 6)
+    words = np.zeros(max(count, n_words), dtype=np.int64)
+    for i in range(6):
+        words[:n_words] = (words[:n_words] << 6) | padded[:, i]
+    if n_bytes % 6 != 0: # the last word did not get all of its shifts
+        words[n_words-1] >>= 6 * (6 - (n_bytes % 6))
+    words[:n_words][~good.reshape(n_words, 6).all(axis=1)] = -999
+    return words[:count]
+
+def split_half_words(words):
+    """Inputs:
+        - words; an array of 36 bit TAP words
+    Outputs:
+        - wordA; the least significant 18 bits of each word
+        - wordD; the most significant 18 bits of each word
+    Splits every word into its two 18 bit (A/D) halves at once. Where a word is -999 both halves are -999."""
+    words = np.asarray(words, dtype=np.int64)
+    bad = words == -999
+    wordA = words & 0x3FFFF
+    wordD = words >> 18
+    wordA[bad] = -999
+    wordD[bad] = -999
+    return wordA, wordD
+
+def interleave_half_words(words):
+    """Inputs:
+        - words; an array of 36 bit TAP words
+    Outputs:
+        - halves; an array twice as long as words, holding the D then A half of each word in turn
+    This is the order in which the half words are assigned to attributes throughout the reader."""
+    wordA, wordD = split_half_words(words)
+    halves = np.empty(2 * len(wordA), dtype=np.int64)
+    halves[0::2] = wordD
+    halves[1::2] = wordA
+    return halves
+
+def read_words_n56(the_bytes, count=None):
+    """Inputs:
+        - the_bytes; the array of bytes for a whole record (or any part of one)
+        - count; the number of words to return (default: two for every nine bytes, rounded up)
+    Outputs:
+        - words; an int64 array of TAP words made from the bytes
+    Each word is made from 36 bits (4.5 bytes). Contrary to the Nimbus 4 TAP files, all bits are
+    used for data storage in Nimbus 5 and 6 (hence there is no 'goodness' check). Because 4.5 bytes
+    cannot be read, the bytes are reshaped to (n_pairs, 9) and every pair of words is unpacked at once: the first
+    word is the 36 most significant bits of the first five bytes, and the second word is the 36 least significant
+    bits of the last five bytes. Words from a pair that is cut short by the end of the bytes, and words past the
+    end of the bytes, are -999.
+    NOTE: During this process, the endianness of the word is also changed. This is because the THIR machine was
+    of opposite endianness to the machine on which this code was written. If this is not the case for the machine
+    you are using, this function may need replacing."""
+    the_bytes = np.asarray(the_bytes)
+    n_pairs = len(the_bytes) // 9
+    if count is None:
+        count = 2 * (-(-len(the_bytes) // 9))
+    pairs = the_bytes[:9*n_pairs].astype(np.int64).reshape(n_pairs, 9) & 0b11111111
+    high = pairs[:, 0]
+    for i in range(1, 5):
+        high = (high << 8) | pairs[:, i]
+    low = pairs[:, 4] & 0b1111
+    for i in range(5, 9):
+        low = (low << 8) | pairs[:, i]
+    words = np.empty(max(count, 2*n_pairs), dtype=np.int64)
+    words.fill(-999)
+    words[0:2*n_pairs:2] = high >> 4
+    words[1:2*n_pairs:2] = low
+    return words[:count]
+
+def make_swath_words(full_words):
+    """Inputs:
+        - full_words; an array of the 36 bit TAP words belonging to one swath
+    Outputs:
+        - words; the swath words in the order they are assigned to attributes
+    The first two words of a swath hold half words (time and data population, then the subsatellite point),
+    the third is a full word (the flags) and every word after that holds two half words (anchor points, then
+    data). This layout is the same for all three satellites."""
+    return np.concatenate((interleave_half_words(full_words[:2]), full_words[2:3],
+                           interleave_half_words(full_words[3:])))
+
+def read_swath_words_n56(the_bytes, locator_no, offset=0):
+    """Inputs:
+        - the_bytes; the array of bytes for the upcoming swath, starting at a word pair boundary
+        - locator_no; the number of anchor points in each swath
+        - offset; 1 if the swath starts with the second word of the first pair (as odd numbered swaths do),
+          0 otherwise
+    Outputs:
+        - words; the swath words, laid out as in make_swath_words
+    The data population is read from the first swath word, and then whole word pairs are read until there are
+    enough swath words (counting half words singly) for the header words, the anchor points and the data. Pairs
+    that run past the end of the bytes give -999."""
+    first_word = read_words_n56(the_bytes[:9], 2)[offset]
+    data_pop = split_half_words([first_word])[0][0]
+    n_needed = 5 + 2*locator_no + data_pop
+    n_pairs = max(2, -(-(n_needed + 2*offset + 1) // 4))
+    full_words = read_words_n56(the_bytes, 2*n_pairs)
+    return make_swath_words(full_words[offset:])
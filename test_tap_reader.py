@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from main import *
+from synthetic_tap import *
+from netCDF4 import Dataset
+
+# the size of the synthetic files the tests are run on:
+N_RECORDS = 20
+DATA_POP = 120
+SWATHS_PER_REC = 6
+MIRROR_ROT = 288.
+
+def expected_swaths(n_records=N_RECORDS, data_pop=DATA_POP, seed=0):
+    """Outputs:
+        - seconds; the time of each swath since the start of the file
+        - lats, lons; the subsatellite point of each swath, in degrees north and east
+        - temps; the (n_swaths, data_pop) brightness temperatures
+    The values written by synthetic_tap.write_synthetic_TAP_file for a file without gaps, fill swaths or errors,
+    worked out again from its description of the track."""
+    rng = np.random.RandomState(seed)
+    rot = 360./MIRROR_ROT
+    seconds = np.arange(n_records*SWATHS_PER_REC)*rot
+    phase = 2*np.pi*seconds/ORBIT_PERIOD
+    lats = 80*np.sin(phase)
+    lons = 100 - 360*seconds/86400. + 20*np.cos(phase)
+    temps = np.array([200 + 80*rng.rand(data_pop) for k in range(len(seconds))])
+    return seconds, lats, lons, temps
+
+def read_lazy(filename, cache_size):
+    """Returns a lazy Data (or Data2) object for filename, keeping cache_size decoded records."""
+    if 'Nimbus4' in filename:
+        return Data(filename, lazy=True, cache_size=cache_size)
+    return Data2(filename, lazy=True, cache_size=cache_size)
+
+def nc_variables(filename):
+    """Returns a dictionary of the variables of the NetCDF4 file filename, filled with -999."""
+    nc = Dataset(filename)
+    try:
+        return dict([(name, np.ma.filled(nc.variables[name][:], -999)) for name in nc.variables])
+    finally:
+        nc.close()
+
+class SyntheticFileTest(unittest.TestCase):
+    """Writes a synthetic Nimbus 4 and Nimbus 5 file to a temporary directory for the tests to read. The TLE files
+    are found relative to the working directory, so the tests are run from the directory of this file."""
+    @classmethod
+    def setUpClass(cls):
+        warnings.simplefilter('ignore')
+        cls.cwd = os.getcwd()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        cls.directory = tempfile.mkdtemp()
+        cls.filenames = {}
+        for nimbus in ('N4', 'N5'):
+            cls.filenames[nimbus] = write_synthetic_TAP_file(synthetic_filename(cls.directory, nimbus), N_RECORDS,
+                                                             DATA_POP, swaths_per_rec=SWATHS_PER_REC,
+                                                             mirror_rot=MIRROR_ROT)
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        os.chdir(cls.cwd)
+        warnings.resetwarnings()
+
+class TestDecoding(SyntheticFileTest):
+    def test_words(self):
+        words = np.random.RandomState(1).randint(0, 2**36, 101).astype(np.int64)
+        the_bytes = encode_words_n4(words)
+        self.assertTrue(np.all(PARITY_TABLE[the_bytes.view(np.uint8)]))
+        self.assertTrue(np.array_equal(read_words_n4(the_bytes & 0b111111, np.ones(len(the_bytes), dtype=bool)),
+                                       words))
+        self.assertTrue(np.array_equal(read_words_n56(encode_words_n56(words))[:len(words)], words))
+    def test_orbit_doc(self):
+        for nimbus in ('N4', 'N5'):
+            od = read_TAP_file(self.filenames[nimbus], lazy=True).od
+            self.assertEqual(od.swaths_per_rec, SWATHS_PER_REC)
+            self.assertEqual(od.locator_no, 31)
+            self.assertEqual(od.mirror_rot, MIRROR_ROT)
+            self.assertEqual(od.start_datetime, DEFAULT_STARTS[nimbus])
+    def test_records(self):
+        seconds, lats, lons, temps = expected_swaths()
+        for nimbus in ('N4', 'N5'):
+            data = read_TAP_file(self.filenames[nimbus])
+            self.assertEqual(len(data.records), N_RECORDS + 1)
+            cols = data.columns
+            self.assertTrue(np.all(cols.swath_exists()))
+            self.assertTrue(np.all(abs(geographic_lats(cols.subsat_lat) - lats) <= 1/128.))
+            self.assertTrue(np.all(abs(geographic_lons(cols.subsat_lon) - lons) <= 1/128.))
+            self.assertTrue(np.all(cols.data_pop == DATA_POP))
+            self.assertTrue(np.all(abs(cols.data[:, :DATA_POP] - temps) <= 1/16.))
+            nads = np.linspace(-55, 55, 31)
+            self.assertTrue(np.all(abs(cols.anchor_nadir_angles - nads) <= 1/128.))
+    def test_lazy_records(self):
+        for nimbus in ('N4', 'N5'):
+            eager = read_TAP_file(self.filenames[nimbus])
+            lazy = read_lazy(self.filenames[nimbus], 1)
+            for i in [0, 5, len(lazy.dr) - 1, 5]:
+                for j in range(SWATHS_PER_REC):
+                    for name in ('data', 'full_lats', 'full_lons', 'anchor_lats', 'anchor_lons'):
+                        self.assertTrue(np.array_equal(getattr(lazy.dr[i].sds[j], name),
+                                                       getattr(eager.dr[i].sds[j], name)))
+    def test_counted_once(self):
+        filename = write_synthetic_TAP_file(synthetic_filename(self.directory, 'N4', tag='faults'), 10, DATA_POP,
+                                            bad_parity=3, fill_swaths=((1, 2), (4, 0)))
+        eager = read_TAP_file(filename)
+        lazy = read_lazy(filename, 1)
+        for repeat in range(3):
+            for i in range(len(lazy.dr)):
+                lazy.dr[i]
+        for name in ('bad_parity_bytes', 'bad_pop_swaths'):
+            self.assertEqual(lazy.stats.counters[name], eager.stats.counters[name])
+        # the two fill swaths, and any whose data population word has a parity error:
+        self.assertTrue(eager.stats.counters['bad_pop_swaths'] >= 2)
+        self.assertTrue(eager.stats.counters['bad_parity_bytes'] > 0)
+
+class TestFields(SyntheticFileTest):
+    def test_scanlines(self):
+        seconds, lats, lons, temps = expected_swaths()
+        for nimbus in ('N4', 'N5'):
+            data = read_TAP_file(self.filenames[nimbus])
+            fields = Fields(data, products=('data', 'lats', 'lons'))
+            self.assertEqual(fields.data.shape, (N_RECORDS*SWATHS_PER_REC, DATA_POP))
+            self.assertTrue(np.all(abs(fields.data - temps) <= 1/16.))
+            self.assertTrue(np.all(abs(fields.sub_satellite_lats - 90 - lats) <= 1/128.))
+            for k in range(0, len(seconds), 7):
+                sd = data.dr[k // SWATHS_PER_REC].sds[k % SWATHS_PER_REC]
+                self.assertTrue(np.array_equal(fields.lats[k], geographic_lats(sd.full_lats)))
+                self.assertTrue(np.array_equal(fields.lons[k], geographic_lons(sd.full_lons)))
+    def test_lazy_fields(self):
+        products = ('data', 'lats', 'lons')
+        for nimbus in ('N4', 'N5'):
+            eager = Fields(read_TAP_file(self.filenames[nimbus]), products=products)
+            lazy_data = read_lazy(self.filenames[nimbus], 2)
+            lazy = Fields(lazy_data, products=products)
+            self.assertTrue(lazy_data.columns.data is None)
+            for name in products + ('truetime', 'nadangs', 'anchor_lats', 'anchor_lons', 'dpops'):
+                self.assertTrue(np.array_equal(getattr(lazy, name), getattr(eager, name)))
+    def test_bbox(self):
+        data = read_TAP_file(self.filenames['N4'], bbox=(-5, 30, 110, 120), full_coords=False)
+        lats = geographic_lats(data.columns.subsat_lat)[data.columns.swath_exists()]
+        self.assertTrue(np.all((lats >= -5) & (lats <= 30)))
+        wrapped = read_TAP_file(self.filenames['N4'], bbox=(-5, 30, 170, 120), full_coords=False)
+        self.assertTrue(np.array_equal(wrapped.columns.subsat_lat, data.columns.subsat_lat))
+        self.assertRaises(ValueError, read_TAP_file, self.filenames['N4'], bbox=(-5, 30, 170, 110))
+    def test_index_window(self):
+        seconds = expected_swaths()[0]
+        for nimbus in ('N4', 'N5'):
+            start = (DEFAULT_STARTS[nimbus] - dt.datetime(1970, 1, 1)).total_seconds()
+            time_range = (start + seconds[20], start + seconds[50])
+            plain = read_TAP_file(self.filenames[nimbus], time_range=time_range, full_coords=False)
+            for repeat in range(2): # building the index, then reading it
+                indexed = read_TAP_file(self.filenames[nimbus], time_range=time_range, full_coords=False,
+                                        use_index=True)
+                self.assertEqual(sorted(indexed.swath_keep), sorted(plain.swath_keep))
+                self.assertTrue(np.array_equal(indexed.columns.kept, plain.columns.kept))
+            self.assertTrue(len(find_records(indexed.records, *time_range)) < N_RECORDS)
+
+class TestOutput(SyntheticFileTest):
+    def test_streaming(self):
+        for nimbus in ('N4', 'N5'):
+            whole = os.path.join(self.directory, nimbus + '_whole.nc')
+            streamed = os.path.join(self.directory, nimbus + '_streamed.nc')
+            write_NC_file(self.filenames[nimbus], whole)
+            write_NC_file(self.filenames[nimbus], streamed, block_size=25)
+            whole = nc_variables(whole)
+            streamed = nc_variables(streamed)
+            self.assertEqual(sorted(whole), sorted(streamed))
+            for name in whole:
+                self.assertTrue(np.array_equal(whole[name], streamed[name]), name)
+    def test_tie_points(self):
+        products = ('lats2', 'lons2', 'sol_zen', 'sol_az', 'sat_zen', 'sat_az')
+        for nimbus in ('N4', 'N5'):
+            data = read_TAP_file(self.filenames[nimbus], full_coords=False)
+            full = Fields(data, products=products)
+            tied = Fields(data, products=products, tie_points=(4, 8))
+            rows, cols, grid = tied.tie_point_grid(data, products)
+            for name in products:
+                at_ties = getattr(tied, name)[rows][:, cols]
+                self.assertTrue(np.allclose(grid[name], getattr(full, name)[rows][:, cols], atol=1e-6), name)
+                self.assertTrue(np.allclose(at_ties, grid[name], atol=1e-6), name)
+                good = getattr(full, name) != -999
+                self.assertTrue(np.array_equal(getattr(tied, name) != -999, good), name)
+            self.assertTrue(np.any(tied.sol_az < 0) and np.all(tied.sol_az >= -180))
+    def test_bad_tie_points(self):
+        values = np.array([[1., 2., -999, 4., -999], [-999, -999, -999, -999, -999]])
+        filled, valid = fill_ties(values, values != -999, np.arange(5))
+        self.assertTrue(np.array_equal(filled[0, :4], [1, 2, 3, 4]))
+        self.assertTrue(np.array_equal(valid, [[True, True, True, True, False], [False]*5]))
+
+if __name__ == '__main__':
+    unittest.main()
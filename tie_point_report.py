@@ -0,0 +1,26 @@
+import sys
+import argparse
+from main import *
+
+def parse_steps(text):
+    """Returns the (line_step, pixel_step) pair written as text, e.g. '4x8'."""
+    line_step, pixel_step = text.lower().split('x')
+    return int(line_step), int(pixel_step)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Compare tie point geolocation of TAP files against every pixel.')
+    parser.add_argument('paths', nargs='+', help='TAP files to report on')
+    parser.add_argument('-s', '--steps', nargs='+', type=parse_steps, default=[(2, 4), (4, 8), (8, 16), (16, 32)],
+                        help='tie point steps to try, as LINESxPIXELS (default: 2x4 4x8 8x16 16x32)')
+    parser.add_argument('--spherical', action='store_true',
+                        help='work out the satellite angles on a sphere rather than the ellipsoid')
+    parser.add_argument('-j', '--workers', type=int, help='number of processes to geolocate with')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    for filename in args.paths:
+        report = report_tie_points(filename, args.steps, not args.spherical, args.workers)
+        print filename
+        for line in format_tie_point_report(report):
+            print line